@@ -0,0 +1,166 @@
+"""
+Record a corpus of COA requests against the real providers, then replay it offline as a
+performance and cost regression run.
+
+Each corpus case is a folder with a `request.json` (the /extract/coa request - the folder name
+is the request id when it has none) and its documents. The server app runs in-process with the
+model cassette (MODEL_CASSETTE_* settings): `record` calls the providers and writes every model
+call to the cassette, `replay` answers the model calls from the cassette (with the recorded
+latency, scaled by `--latency-scale`). Extraction cache and mapping memory are off.
+
+Replay results are compared with a baseline results file - latency, estimated cost and the
+extracted batches per case.
+
+Usage:
+    python -m benchmarks.cassette_replay corpus/ --mode record --cassette cassettes/corpus.jsonl --results baseline.json
+    python -m benchmarks.cassette_replay corpus/ --mode replay --cassette cassettes/corpus.jsonl \\
+        --baseline baseline.json --results candidate.json --match request --concurrency 4
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+
+from benchmarks.extraction_load import get_percentile
+
+# Provider clients are still created on replay - without being called
+REPLAY_PLACEHOLDER_KEYS = ["ANTHROPIC_API_KEY", "OPENAI_API_KEY", "GOOGLE_API_KEY"]
+
+
+def load_corpus(corpus_dir: Path) -> list[dict]:
+    cases = []
+    for case_dir in sorted(path for path in corpus_dir.iterdir() if path.is_dir()):
+        request = json.loads((case_dir / "request.json").read_text())
+        request["id"] = request.get("id") or case_dir.name
+        documents = sorted(path for path in case_dir.iterdir() if path.name != "request.json" and path.is_file())
+        cases.append({"case": case_dir.name, "request": request, "documents": documents})
+    return cases
+
+
+def configure_environment(args: argparse.Namespace):
+    # Before the server modules are imported - settings are read on import
+    os.environ.update(
+        {
+            "MODEL_CASSETTE_MODE": args.mode,
+            "MODEL_CASSETTE_PATH": args.cassette,
+            "MODEL_CASSETTE_MATCH": args.match,
+            "MODEL_CASSETTE_REPLAY_LATENCY_SCALE": str(args.latency_scale),
+            "EXTRACTION_CACHE_ENABLED": "false",
+            "MAPPING_MEMORY_ENABLED": "false",
+            "DISABLE_AUTHENTICATION": "true",
+            "MOCK_MODE": "false",
+        }
+    )
+    if args.mode == "replay":
+        for key_name in REPLAY_PLACEHOLDER_KEYS:
+            os.environ.setdefault(key_name, "cassette-replay")
+
+
+async def run_corpus(cases: list[dict], concurrency: int) -> list[dict]:
+    import httpx
+
+    import server
+
+    async def run_case(client: httpx.AsyncClient, case: dict) -> dict:
+        start_time = time.perf_counter()
+        response = await client.post(
+            "/extract/coa",
+            files=[("files", (doc.name, doc.read_bytes())) for doc in case["documents"]],
+            data={"request": json.dumps(case["request"])},
+        )
+        latency = time.perf_counter() - start_time
+        result = {"case": case["case"], "status_code": response.status_code, "latency_s": latency}
+        if response.status_code == 200:
+            result["response"] = response.json()
+        else:
+            result["error"] = response.text
+        return result
+
+    async with server.app.router.lifespan_context(server.app):
+        # Server errors (cassette misses included) are reported per case
+        transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=None) as client:
+            case_slots = asyncio.Semaphore(concurrency)
+
+            async def limited_run_case(case: dict) -> dict:
+                async with case_slots:
+                    return await run_case(client, case)
+
+            return await asyncio.gather(*[limited_run_case(case) for case in cases])
+
+
+def get_extracted_content(result: dict) -> dict | None:
+    # What the regression compares - cost and timing are reported separately
+    response = result.get("response")
+    if response is None:
+        return None
+    return {"order_number": response["order_number"], "batches": response["batches"]}
+
+
+def summarize(results: list[dict]) -> dict:
+    latencies = [r["latency_s"] for r in results if r["status_code"] == 200]
+    return {
+        "cases": len(results),
+        "failed": sum(1 for r in results if r["status_code"] != 200),
+        "latency_p50_s": get_percentile(latencies, 50),
+        "latency_p95_s": get_percentile(latencies, 95),
+        "latency_total_s": sum(latencies),
+        "estimated_cost": sum(r["response"]["estimated_cost"] for r in results if "response" in r),
+    }
+
+
+def print_comparison(results: list[dict], baseline_results: list[dict] | None):
+    summary = summarize(results)
+    header = f"{'Run':<10}{'Cases':>7}{'Failed':>8}{'p50 (s)':>9}{'p95 (s)':>9}{'Total (s)':>11}{'Est. cost':>11}"
+    print(header)
+    print("=" * len(header))
+    runs = [("current", summary)]
+    if baseline_results is not None:
+        runs.insert(0, ("baseline", summarize(baseline_results)))
+    for name, s in runs:
+        print(
+            f"{name:<10}{s['cases']:>7}{s['failed']:>8}{s['latency_p50_s']:>9.2f}{s['latency_p95_s']:>9.2f}"
+            f"{s['latency_total_s']:>11.2f}{s['estimated_cost']:>11.4f}"
+        )
+    if baseline_results is None:
+        return
+
+    baseline_by_case = {r["case"]: r for r in baseline_results}
+    changed_cases = [
+        r["case"]
+        for r in results
+        if r["case"] in baseline_by_case
+        and get_extracted_content(r) != get_extracted_content(baseline_by_case[r["case"]])
+    ]
+    print(f"\nCases with a different extraction: {len(changed_cases)}")
+    for case in changed_cases:
+        print(f"- {case}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record / replay a COA corpus with model cassettes")
+    parser.add_argument("corpus", help="Folder of cases - request.json and documents per case folder")
+    parser.add_argument("--mode", choices=["record", "replay"], required=True)
+    parser.add_argument("--cassette", default="cassettes/model_calls.jsonl", help="Cassette file (JSONL)")
+    parser.add_argument("--match", choices=["prompt", "request"], default="prompt", help="Replay match of model calls")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Replayed latency scale, 0 answers at once")
+    parser.add_argument("--concurrency", type=int, default=1, help="Cases run concurrently")
+    parser.add_argument("--results", help="Write the per case results (JSON) - a baseline for later runs")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    configure_environment(args)
+    cases = load_corpus(Path(args.corpus))
+    results = asyncio.run(run_corpus(cases, args.concurrency))
+
+    if args.results:
+        Path(args.results).write_text(json.dumps(results, indent=2))
+    baseline_results = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print_comparison(results, baseline_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Offline load and latency benchmark of the /extract/coa pipeline - no provider is called.
+
+The real server app (uploads, rendering, page filter, experts, consolidation, mapping) runs
+in-process with stand-in models (benchmarks/stand_in_llm.py) in the expert and supervisor
+slots. Each concurrency level runs in a fresh process (peak RSS only grows): `--requests`
+extractions are sent by `concurrency` concurrent clients, while a probe measures the event
+loop lag and the RSS of the process and its rasterization workers is sampled.
+
+Extraction cache, page cache and mapping memory are off - every request does the full work.
+Without documents a synthetic image-only PDF of `--pages` pages is generated.
+
+Usage:
+    python -m benchmarks.extraction_load [path/to/coa.pdf ...] --concurrency 1 2 4 8 --requests 32 \\
+        --expert-latency lognormal:8:0.4 --supervisor-latency lognormal:3:0.3 --failure-rate 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.image_memory_peak_rss import create_synthetic_pdf
+from benchmarks.rasterization_event_loop_lag import PROBE_INTERVAL_SECONDS, probe_loop_lag
+
+BENCHMARK_ENV = {
+    "DISABLE_AUTHENTICATION": "true",
+    "MOCK_MODE": "false",
+    "EXTRACTION_CACHE_ENABLED": "false",
+    "RASTER_CACHE_ENABLED": "false",
+    "MAPPING_MEMORY_ENABLED": "false",
+    "MODEL_CLIENTS_WARMUP_ENABLED": "false",
+}
+
+RSS_SAMPLE_INTERVAL_SECONDS = 0.1
+
+# Request measurements - most match the stand-in report names, the rest go to the mapping stand-in
+BENCHMARK_MEASUREMENTS = [
+    ("1", "Appearance", True),
+    ("2", "Density at 20°C", False),
+    ("3", "pH (10% solution)", False),
+    ("4", "Viscosity @ 25°C (cP)", False),
+    ("5", "Water content %", False),
+    ("6", "Assay %", False),
+]
+
+
+def get_process_tree_pids(pid: int) -> list[int]:
+    pids = [pid]
+    try:
+        for task_dir in Path(f"/proc/{pid}/task").iterdir():
+            for child_pid in (task_dir / "children").read_text().split():
+                pids += get_process_tree_pids(int(child_pid))
+    except OSError:
+        pass
+    return pids
+
+
+def get_process_tree_rss_mb() -> float:
+    # This process and its rasterization workers
+    rss_pages = 0
+    for pid in get_process_tree_pids(os.getpid()):
+        try:
+            rss_pages += int(Path(f"/proc/{pid}/statm").read_text().split()[1])
+        except OSError:
+            pass
+    return rss_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+async def sample_rss(stop_event: asyncio.Event, samples: list[float]):
+    while not stop_event.is_set():
+        samples.append(await asyncio.to_thread(get_process_tree_rss_mb))
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL_SECONDS)
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    # Nearest rank
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))]
+
+
+def create_coa_request(idx: int) -> str:
+    return json.dumps(
+        {
+            "id": f"bench-{idx}",
+            "order_number": "PO-4711",
+            "measurements": [
+                {"id": m_id, "name": name, "qualitative": qualitative}
+                for m_id, name, qualitative in BENCHMARK_MEASUREMENTS
+            ],
+        }
+    )
+
+
+def install_benchmark_models(args: argparse.Namespace):
+    from benchmarks.stand_in_llm import (
+        StandInBehavior,
+        create_stand_in_expert_llm,
+        create_stand_in_supervisor_llm,
+        install_stand_in_models,
+        parse_latency_distribution,
+        stand_in_consolidation,
+        stand_in_mapping,
+    )
+
+    def create_behavior(latency_spec: str, output_tokens: int, seed_offset: int) -> StandInBehavior:
+        return StandInBehavior(
+            latency=parse_latency_distribution(latency_spec),
+            output_tokens=output_tokens,
+            failure_rate=args.failure_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            time_scale=args.time_scale,
+            seed=None if args.seed is None else args.seed + seed_offset,
+        )
+
+    expert_llms = {
+        f"stand-in-{model_name}": create_stand_in_expert_llm(
+            model_name,
+            create_behavior(args.expert_latency, args.expert_output_tokens, idx),
+            disagreement_rate=args.disagreement_rate,
+        )
+        for idx, model_name in enumerate(args.experts)
+    }
+    consolidator_llm = create_stand_in_supervisor_llm(
+        "gpt-4o", create_behavior(args.supervisor_latency, args.supervisor_output_tokens, 100), stand_in_consolidation
+    )
+    mapper_llm = create_stand_in_supervisor_llm(
+        "gpt-4o", create_behavior(args.supervisor_latency, args.supervisor_output_tokens, 200), stand_in_mapping
+    )
+
+    install_stand_in_models(expert_llms, consolidator_llm, mapper_llm)
+
+
+async def run_level(args: argparse.Namespace, documents_paths: list[Path], concurrency: int) -> dict:
+    import httpx
+
+    import server
+
+    install_benchmark_models(args)
+    documents = [(doc.name, doc.read_bytes()) for doc in documents_paths]
+
+    async def extract(client: httpx.AsyncClient, idx: int) -> tuple[float, int]:
+        start_time = time.perf_counter()
+        response = await client.post(
+            "/extract/coa",
+            files=[("files", (name, content, "application/pdf")) for name, content in documents],
+            data={"request": create_coa_request(idx)},
+        )
+        return time.perf_counter() - start_time, response.status_code
+
+    async with server.app.router.lifespan_context(server.app):
+        # Server errors are counted as failed requests - not raised in the client
+        transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+            # Process pool startup and first imports are not part of the measurement
+            for idx in range(args.warmup):
+                await extract(client, -1 - idx)
+
+            stop_event = asyncio.Event()
+            lags: list[float] = []
+            rss_samples: list[float] = []
+            monitors = [
+                asyncio.create_task(probe_loop_lag(stop_event, lags)),
+                asyncio.create_task(sample_rss(stop_event, rss_samples)),
+            ]
+            await asyncio.sleep(PROBE_INTERVAL_SECONDS * 5)
+
+            client_slots = asyncio.Semaphore(concurrency)
+
+            async def limited_extract(idx: int) -> tuple[float, int]:
+                async with client_slots:
+                    return await extract(client, idx)
+
+            start_time = time.perf_counter()
+            outcomes = await asyncio.gather(*[limited_extract(idx) for idx in range(args.requests)])
+            wall_time = time.perf_counter() - start_time
+
+            stop_event.set()
+            await asyncio.gather(*monitors)
+
+    latencies = [latency for latency, status_code in outcomes if status_code == 200]
+    lags_ms = [lag * 1000 for lag in lags]
+    return {
+        "concurrency": concurrency,
+        "requests": args.requests,
+        "failed": sum(1 for _, status_code in outcomes if status_code != 200),
+        "wall_time_s": wall_time,
+        "requests_per_s": len(latencies) / wall_time if wall_time else 0.0,
+        "latency_p50_s": get_percentile(latencies, 50),
+        "latency_p95_s": get_percentile(latencies, 95),
+        "latency_p99_s": get_percentile(latencies, 99),
+        "loop_lag_p99_ms": get_percentile(lags_ms, 99),
+        "loop_lag_max_ms": max(lags_ms, default=0.0),
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_tree_rss_mb": max(rss_samples, default=0.0),
+    }
+
+
+def get_level_command(args: argparse.Namespace, concurrency: int, documents_paths: list[Path]) -> list[str]:
+    command = [sys.executable, "-m", "benchmarks.extraction_load", "--run-level", str(concurrency)]
+    command += ["--requests", str(args.requests), "--warmup", str(args.warmup)]
+    command += ["--experts", *args.experts]
+    command += ["--expert-latency", args.expert_latency, "--supervisor-latency", args.supervisor_latency]
+    command += ["--expert-output-tokens", str(args.expert_output_tokens)]
+    command += ["--supervisor-output-tokens", str(args.supervisor_output_tokens)]
+    command += ["--failure-rate", str(args.failure_rate), "--rate-limit-rate", str(args.rate_limit_rate)]
+    command += ["--disagreement-rate", str(args.disagreement_rate), "--time-scale", str(args.time_scale)]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    return command + [str(doc) for doc in documents_paths]
+
+
+def run_level_process(args: argparse.Namespace, concurrency: int, documents_paths: list[Path]) -> dict:
+    env = {**os.environ, **BENCHMARK_ENV}
+    command = get_level_command(args, concurrency, documents_paths)
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Concurrency level {concurrency} failed:\n{completed.stderr}")
+    # The result is the last output line - logs go to stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def print_results(results: list[dict]):
+    header = (
+        f"{'Concurrency':>11}{'Requests':>10}{'Failed':>8}{'Req/s':>8}{'p50 (s)':>9}{'p95 (s)':>9}{'p99 (s)':>9}"
+        f"{'Loop lag p99 (ms)':>19}{'Loop lag max (ms)':>19}{'Peak RSS (MB)':>15}{'Peak tree RSS (MB)':>20}"
+    )
+    print(header)
+    print("=" * len(header))
+    for r in results:
+        print(
+            f"{r['concurrency']:>11}{r['requests']:>10}{r['failed']:>8}{r['requests_per_s']:>8.2f}"
+            f"{r['latency_p50_s']:>9.2f}{r['latency_p95_s']:>9.2f}{r['latency_p99_s']:>9.2f}"
+            f"{r['loop_lag_p99_ms']:>19.1f}{r['loop_lag_max_ms']:>19.1f}{r['peak_rss_mb']:>15.1f}"
+            f"{r['peak_tree_rss_mb']:>20.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load and latency of /extract/coa with stand-in models")
+    parser.add_argument("documents", nargs="*", help="PDF documents of each request - a synthetic PDF when omitted")
+    parser.add_argument("--pages", type=int, default=3, help="Pages of the synthetic PDF")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrent clients sweep")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured requests before each level")
+    parser.add_argument(
+        "--experts",
+        nargs="+",
+        default=["claude-3-7-sonnet-20250219", "gemini-2.0-flash-lite"],
+        help="Model names of the stand-in experts",
+    )
+    parser.add_argument(
+        "--expert-latency",
+        default="lognormal:8:0.4",
+        help="Seconds - fixed:s / uniform:a:b / normal:mean:std / lognormal:median:sigma",
+    )
+    parser.add_argument("--supervisor-latency", default="lognormal:3:0.3", help="Same forms as --expert-latency")
+    parser.add_argument("--expert-output-tokens", type=int, default=600)
+    parser.add_argument("--supervisor-output-tokens", type=int, default=400)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of model calls failing")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of model calls answered with 429")
+    parser.add_argument("--disagreement-rate", type=float, default=0.0, help="Share of expert values perturbed")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiplies all stand-in latencies")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    parser.add_argument("--run-level", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_level:
+        result = asyncio.run(run_level(args, [Path(doc) for doc in args.documents], args.run_level))
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="comprendo-bench-") as bench_dir:
+        documents_paths = [Path(doc) for doc in args.documents]
+        if not documents_paths:
+            documents_paths = [Path(bench_dir) / "synthetic.pdf"]
+            create_synthetic_pdf(documents_paths[0], args.pages)
+        results = [run_level_process(args, concurrency, documents_paths) for concurrency in args.concurrency]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Measure the peak RSS of a request's page images - rendering, optimization and expert messages.
+
+Each scenario runs in a fresh process (peak RSS only grows): the documents are rendered
+(page cache off), optimized per expert provider and turned into the expert message content
+blocks, all kept alive as they are while the experts run concurrently - then released, as
+when the experts are done. Scenarios compare keeping images in memory with spilling them
+to memory mapped temp files.
+
+Without documents a synthetic image-only PDF of `--pages` pages is generated.
+
+Usage:
+    python -m benchmarks.image_memory_peak_rss [path/to/coa.pdf ...] --pages 50 --providers anthropic google openai
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCENARIOS = {
+    "in_memory": {"IMAGE_SPILL_MIN_KB": "0"},
+    "spill": {"IMAGE_SPILL_MIN_KB": "64"},
+}
+
+
+def get_peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def create_synthetic_pdf(pdf_path: Path, pages: int):
+    # Scanned like pages - A4 at 200 dpi with some text lines
+    from PIL import Image, ImageDraw
+
+    page_images = []
+    for page in range(pages):
+        page_image = Image.new("L", (1654, 2339), color=255)
+        draw = ImageDraw.Draw(page_image)
+        for line in range(60):
+            draw.text((120, 120 + line * 35), f"Page {page + 1} measurement {line}: {line * 1.7:.2f} % Accept", fill=0)
+        page_images.append(page_image)
+    page_images[0].save(pdf_path, save_all=True, append_images=page_images[1:], resolution=200)
+
+
+async def run_scenario(documents_paths: list[Path], providers: list[str]) -> dict:
+    from comprendo.extraction.experts.experts import to_message_content_block
+    from comprendo.preprocess.optimize import ProviderImageOptimizer
+    from comprendo.preprocess.rasterize import rasterization_engine
+
+    stages = {}
+    start_time = time.perf_counter()
+    document_artifacts = await rasterization_engine.render_documents(documents_paths)
+    stages["render"] = {"peak_rss_mb": get_peak_rss_mb(), "rss_mb": get_current_rss_mb()}
+
+    image_optimizer = ProviderImageOptimizer(document_artifacts)
+    expert_messages = []
+    for provider in providers:
+        images = await image_optimizer.get_images(provider)
+        # As extract_from_images_using_expert builds the expert message
+        expert_messages.append([to_message_content_block(image) for image in images])
+    stages["expert_messages"] = {"peak_rss_mb": get_peak_rss_mb(), "rss_mb": get_current_rss_mb()}
+
+    # The experts are done - what the page images still hold (e.g. cached base64 encodings)
+    del expert_messages
+    gc.collect()
+    stages["after_experts"] = {"rss_mb": get_current_rss_mb()}
+
+    rasterization_engine.shutdown()
+    return {
+        "pages": len(document_artifacts),
+        "image_bytes": sum(len(artifact) for artifact in document_artifacts),
+        "spilled_pages": sum(1 for artifact in document_artifacts if artifact.is_spilled),
+        "time_s": time.perf_counter() - start_time,
+        "stages": stages,
+    }
+
+
+def run_scenario_process(scenario: str, documents_paths: list[Path], providers: list[str]) -> dict:
+    env = {**os.environ, **SCENARIOS[scenario], "RASTER_CACHE_ENABLED": "false"}
+    command = [sys.executable, "-m", "benchmarks.image_memory_peak_rss", "--run-scenario", scenario]
+    # Documents first - --providers takes all the arguments following it
+    command += [*[str(doc) for doc in documents_paths], "--providers", *providers]
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Scenario {scenario} failed:\n{completed.stderr}")
+    # The result is the last output line - logs go to stderr
+    return {"scenario": scenario, **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+
+def print_results(results: list[dict]):
+    header = (
+        f"{'Scenario':<12}{'Pages':>7}{'Image MB':>10}{'Spilled':>9}{'Time (s)':>10}"
+        f"{'Render peak (MB)':>18}{'Messages peak (MB)':>20}{'Messages RSS (MB)':>19}{'After RSS (MB)':>16}"
+    )
+    print(header)
+    print("=" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<12}{r['pages']:>7}{r['image_bytes'] / (1024 * 1024):>10.1f}{r['spilled_pages']:>9}"
+            f"{r['time_s']:>10.2f}{r['stages']['render']['peak_rss_mb']:>18.1f}"
+            f"{r['stages']['expert_messages']['peak_rss_mb']:>20.1f}{r['stages']['expert_messages']['rss_mb']:>19.1f}"
+            f"{r['stages']['after_experts']['rss_mb']:>16.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of the page images of a request")
+    parser.add_argument("documents", nargs="*", help="PDF or image documents - a synthetic PDF when omitted")
+    parser.add_argument("--pages", type=int, default=50, help="Pages of the synthetic PDF")
+    parser.add_argument("--providers", nargs="+", default=["anthropic", "google", "openai"], help="Expert providers")
+    parser.add_argument("--run-scenario", choices=list(SCENARIOS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        result = asyncio.run(run_scenario([Path(doc) for doc in args.documents], args.providers))
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="comprendo-bench-") as bench_dir:
+        documents_paths = [Path(doc) for doc in args.documents]
+        if not documents_paths:
+            documents_paths = [Path(bench_dir) / "synthetic.pdf"]
+            create_synthetic_pdf(documents_paths[0], args.pages)
+        print_results([run_scenario_process(scenario, documents_paths, args.providers) for scenario in SCENARIOS])
+
+
+if __name__ == "__main__":
+    main()
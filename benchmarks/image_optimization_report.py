@@ -0,0 +1,60 @@
+"""
+Report bytes and estimated image tokens saved per page by the image optimization profiles.
+
+Documents are rendered as they would be for an extraction, then optimized with the
+profile of each provider (IMAGE_OPTIMIZATION_PROFILES overrides apply) - whether the
+optimization stage is enabled or not.
+
+Usage:
+    python -m benchmarks.image_optimization_report path/to/coa.pdf [more docs...] --providers anthropic google
+"""
+
+import argparse
+from pathlib import Path
+
+from comprendo.preprocess.document import get_document_as_images
+from comprendo.preprocess.optimize import (
+    get_image_optimization_report,
+    get_provider_image_optimization_profile,
+    optimize_images,
+)
+
+
+def print_provider_report(provider: str, report: list[dict]):
+    print(f"=== {provider}: {get_provider_image_optimization_profile(provider)} ===")
+    header = f"{'Page':<6}{'Bytes before':>14}{'Bytes after':>14}{'Saved %':>9}{'Tokens before':>15}{'Tokens after':>14}"
+    print(header)
+    print("=" * len(header))
+    for r in report:
+        saved_pct = 100 * r["bytes_saved"] / r["bytes_before"] if r["bytes_before"] else 0
+        print(
+            f"{str(r['page']):<6}{r['bytes_before']:>14}{r['bytes_after']:>14}{saved_pct:>8.1f}%"
+            f"{r['tokens_before']:>15}{r['tokens_after']:>14}"
+        )
+    total_before = sum(r["bytes_before"] for r in report)
+    total_after = sum(r["bytes_after"] for r in report)
+    print(
+        f"{'Total':<6}{total_before:>14}{total_after:>14}"
+        f"{(100 * (total_before - total_after) / total_before if total_before else 0):>8.1f}%"
+        f"{sum(r['tokens_before'] for r in report):>15}{sum(r['tokens_after'] for r in report):>14}"
+    )
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image optimization savings per page")
+    parser.add_argument("documents", nargs="+", help="PDF or image documents")
+    parser.add_argument("--providers", nargs="+", default=["anthropic", "google", "vertexai", "openai"])
+    args = parser.parse_args()
+
+    image_artifacts = [
+        image for doc in args.documents for image in get_document_as_images(Path(doc), use_raster_cache=False)
+    ]
+    for provider in args.providers:
+        # Reported whether the stage is enabled or not (IMAGE_OPTIMIZATION_ENABLED) - to decide on enabling it
+        optimized_images = optimize_images(image_artifacts, get_provider_image_optimization_profile(provider))
+        print_provider_report(provider, get_image_optimization_report(provider, image_artifacts, optimized_images))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Measure the logging overhead per request on the caller (event loop) thread.
+
+Each request logs what an extraction logs: the request, the expert reports, the
+consolidation and mapping prompts and responses and the final result - through the
+comprendo logger and `format_log_payload`, with the console and file handlers attached.
+Every logging setup runs in a fresh interpreter (settings are read on import):
+
+- sync-full: handlers on the caller thread, full payloads (The behavior before the logging queue)
+- queue-full: handlers behind the logging queue, full payloads
+- queue-truncate / queue-blob: payloads cut or moved to the blob store beyond LOG_PAYLOAD_MAX_CHARS
+- queue-sampled: full payloads for --sample-rate of the requests
+
+Reports the caller thread time per request (mean / p95), the process CPU time per request
+(background logging and blob threads included) and the time the logging thread took to
+drain the queue after the last request.
+
+Usage:
+    python -m benchmarks.logging_overhead --requests 200 --experts 3 --report-kb 8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.extraction_load import create_coa_request, get_percentile
+
+LOGGING_SETUPS = {
+    "sync-full": {"LOG_QUEUE_ENABLED": "false", "LOG_PAYLOAD_MODE": "full"},
+    "queue-full": {"LOG_QUEUE_ENABLED": "true", "LOG_PAYLOAD_MODE": "full"},
+    "queue-truncate": {"LOG_QUEUE_ENABLED": "true", "LOG_PAYLOAD_MODE": "truncate"},
+    "queue-blob": {"LOG_QUEUE_ENABLED": "true", "LOG_PAYLOAD_MODE": "blob"},
+    "queue-sampled": {"LOG_QUEUE_ENABLED": "true", "LOG_PAYLOAD_MODE": "full"},
+}
+
+
+def create_expert_report(idx: int, report_kb: int) -> str:
+    # Expert Markdown of about report_kb - distinct per request, as model outputs are
+    lines = ["# General details", f"- Purchase order no.: PO-{idx}", "", f"## Batch no. B-{idx}", "### Batch results"]
+    line_idx = 0
+    while sum(len(line) + 1 for line in lines) < report_kb * 1024:
+        lines.append(f"- Measurement {line_idx} of request {idx} (USP <{line_idx}>): {line_idx * 0.37:.3f}, Accept")
+        line_idx += 1
+    return "\n".join(lines)
+
+
+def log_request(idx: int, args: argparse.Namespace) -> float:
+    # The payload log lines of one extraction - returns the caller thread time
+    import logging
+
+    from langchain_core.load import dumps
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    from comprendo.app_logging import ctx_task
+    from comprendo.log_payloads import format_log_payload
+    from comprendo.server.types.extract_coa_input import COARequest
+    from comprendo.types.task import Task
+
+    logger = logging.getLogger("comprendo.benchmark")
+    task = Task(request=COARequest(**json.loads(create_coa_request(idx))))
+    ctx_task.set(task)
+    expert_reports = [create_expert_report(idx * 100 + expert, args.report_kb) for expert in range(args.experts)]
+    system_message = SystemMessage(content="You are a supervisor")
+    consolidation_prompt = [system_message, HumanMessage(content="\n".join(expert_reports))]
+    mapping_prompt = [system_message, HumanMessage(content=expert_reports[0][:2048])]
+
+    start_time = time.perf_counter()
+    logger.info(f"Processing task with payload: {format_log_payload(lambda: task.model_dump_json())}")
+    for expert_report in expert_reports:
+        logger.info(f"Extracted content: model=bench, payload={format_log_payload(lambda: json.dumps(expert_report))}")
+    logger.info(f"Invoking supervisor consolidator: payload={format_log_payload(lambda: dumps(consolidation_prompt))}")
+    logger.info(f"Supervisor consolidation response: payload={format_log_payload(lambda: json.dumps(expert_reports[0]))}")
+    logger.info(f"Supervisor mapping prompt: payload={format_log_payload(lambda: dumps(mapping_prompt))}")
+    logger.info(f"Supervisor mapping llm response: payload={format_log_payload(lambda: expert_reports[-1][:1024])}")
+    logger.info(f"Final extraction results: payload={format_log_payload(lambda: json.dumps(expert_reports[0]))}")
+    return time.perf_counter() - start_time
+
+
+def run_setup(args: argparse.Namespace) -> dict:
+    # In the subprocess - settings are in the environment already
+    import comprendo  # noqa: F401 - sets up the logging handlers
+    from comprendo.app_logging import stop_log_queue
+
+    cpu_start_time = time.process_time()
+    caller_times = [log_request(idx, args) for idx in range(args.requests)]
+    drain_start_time = time.perf_counter()
+    stop_log_queue()
+    drain_time = time.perf_counter() - drain_start_time
+    # Includes building the synthetic payloads - the same in every setup
+    cpu_time = time.process_time() - cpu_start_time
+    return {
+        "caller_mean_ms": sum(caller_times) / len(caller_times) * 1000,
+        "caller_p95_ms": get_percentile(caller_times, 95) * 1000,
+        "caller_total_s": sum(caller_times),
+        "cpu_per_request_ms": cpu_time / len(caller_times) * 1000,
+        "drain_s": drain_time,
+    }
+
+
+def run_setup_subprocess(setup: str, args: argparse.Namespace, work_dir: Path) -> dict:
+    setup_dir = work_dir / setup
+    env = {
+        **os.environ,
+        **LOGGING_SETUPS[setup],
+        "LOG_TO_FOLDER": str(setup_dir / "logs"),
+        "LOG_PAYLOAD_MAX_CHARS": str(args.max_chars),
+        "LOG_PAYLOAD_BLOB_DIR": str(setup_dir / "blobs"),
+        "LOG_PAYLOAD_SAMPLE_RATE": str(args.sample_rate if setup == "queue-sampled" else 1.0),
+    }
+    command = [sys.executable, "-m", "benchmarks.logging_overhead", "--run-setup", setup]
+    command += ["--requests", str(args.requests), "--experts", str(args.experts), "--report-kb", str(args.report_kb)]
+    setup_dir.mkdir(parents=True, exist_ok=True)
+    # Console handler output goes to a file - as a container log would
+    with open(setup_dir / "console.log", "w") as console:
+        completed = subprocess.run(command, env=env, stdout=subprocess.PIPE, stderr=console, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Logging setup {setup} failed - see {setup_dir / 'console.log'}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Logging overhead per request on the caller thread")
+    parser.add_argument("--requests", type=int, default=200, help="Requests logged per setup")
+    parser.add_argument("--experts", type=int, default=3, help="Expert reports per request")
+    parser.add_argument("--report-kb", type=int, default=8, help="Size of each expert report")
+    parser.add_argument("--max-chars", type=int, default=2000, help="LOG_PAYLOAD_MAX_CHARS of truncate / blob")
+    parser.add_argument("--sample-rate", type=float, default=0.1, help="LOG_PAYLOAD_SAMPLE_RATE of queue-sampled")
+    parser.add_argument("--setups", nargs="+", choices=list(LOGGING_SETUPS), default=list(LOGGING_SETUPS))
+    parser.add_argument("--run-setup", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_setup:
+        print(json.dumps(run_setup(args)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="logging-overhead-") as work_dir:
+        results = {setup: run_setup_subprocess(setup, args, Path(work_dir)) for setup in args.setups}
+
+    header = (
+        f"{'Setup':<16}{'Mean (ms)':>11}{'p95 (ms)':>10}{'Caller total (s)':>18}{'CPU/req (ms)':>14}{'Drain (s)':>11}"
+    )
+    print(header)
+    print("=" * len(header))
+    for setup, r in results.items():
+        print(
+            f"{setup:<16}{r['caller_mean_ms']:>11.3f}{r['caller_p95_ms']:>10.3f}"
+            f"{r['caller_total_s']:>18.3f}{r['cpu_per_request_ms']:>14.3f}{r['drain_s']:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
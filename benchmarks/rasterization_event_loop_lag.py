@@ -0,0 +1,117 @@
+"""
+Measure event loop lag while documents are rasterized.
+
+Compares rendering inline on the event loop (the pre-engine behavior) with the
+rasterization engine process pool. Each document is rendered `--concurrency` times
+concurrently, while a probe coroutine measures how late the loop wakes it up.
+
+Usage:
+    python -m benchmarks.rasterization_event_loop_lag path/to/coa.pdf [more docs...] --concurrency 4
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+
+from comprendo.preprocess.document import get_document_as_images
+from comprendo.preprocess.rasterize import RasterizationEngine
+
+PROBE_INTERVAL_SECONDS = 0.01
+
+
+async def probe_loop_lag(stop_event: asyncio.Event, lags: list[float]):
+    while not stop_event.is_set():
+        expected_wakeup = time.perf_counter() + PROBE_INTERVAL_SECONDS
+        await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - expected_wakeup))
+
+
+async def render_inline(documents_paths: list[Path]):
+    # What process_task did before the engine - blocking calls on the event loop
+    async def render_one(doc: Path):
+        return get_document_as_images(doc, use_raster_cache=False)
+
+    return await asyncio.gather(*[render_one(doc) for doc in documents_paths])
+
+
+async def render_with_engine(engine: RasterizationEngine, documents_paths: list[Path]):
+    return await engine.render_documents(documents_paths)
+
+
+async def run_scenario(name: str, render_coro_factory, documents_paths: list[Path]) -> dict:
+    stop_event = asyncio.Event()
+    lags: list[float] = []
+    probe = asyncio.create_task(probe_loop_lag(stop_event, lags))
+    await asyncio.sleep(PROBE_INTERVAL_SECONDS * 5)
+
+    start_time = time.perf_counter()
+    await render_coro_factory(documents_paths)
+    total_time = time.perf_counter() - start_time
+
+    stop_event.set()
+    await probe
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "scenario": name,
+        "documents": len(documents_paths),
+        "wall_time_s": total_time,
+        "lag_p50_ms": statistics.median(lags_ms),
+        "lag_p95_ms": lags_ms[int(len(lags_ms) * 0.95) - 1] if len(lags_ms) > 1 else lags_ms[0],
+        "lag_max_ms": lags_ms[-1],
+        "probe_samples": len(lags),
+    }
+
+
+def print_results(results: list[dict]):
+    header = f"{'Scenario':<12}{'Docs':>6}{'Wall (s)':>10}{'Lag p50 (ms)':>14}{'Lag p95 (ms)':>14}{'Lag max (ms)':>14}"
+    print(header)
+    print("=" * len(header))
+    for r in results:
+        print(
+            f"{r['scenario']:<12}{r['documents']:>6}{r['wall_time_s']:>10.2f}"
+            f"{r['lag_p50_ms']:>14.1f}{r['lag_p95_ms']:>14.1f}{r['lag_max_ms']:>14.1f}"
+        )
+
+
+async def main_async(args):
+    documents_paths = [Path(doc) for doc in args.documents]
+    engine = RasterizationEngine(
+        pool_size=args.pool_size,
+        queue_depth=args.queue_depth,
+        pages_per_job=args.pages_per_job,
+        start_method=args.start_method,
+        # Measure actual rendering - never served from the page cache
+        use_raster_cache=False,
+    )
+    results = []
+    benchmark_docs = documents_paths * args.concurrency
+    try:
+        results.append(await run_scenario("inline", render_inline, benchmark_docs))
+
+        # Warm the pool so worker startup is not measured as render time
+        await engine.render_documents(documents_paths[:1])
+
+        results.append(await run_scenario("engine", lambda docs: render_with_engine(engine, docs), benchmark_docs))
+    finally:
+        engine.shutdown()
+
+    print_results(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop lag during document rasterization")
+    parser.add_argument("documents", nargs="+", help="PDF or image documents to render")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent renders of each document")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--queue-depth", type=int, default=16)
+    parser.add_argument("--pages-per-job", type=int, default=4)
+    parser.add_argument("--start-method", type=str, default="forkserver")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
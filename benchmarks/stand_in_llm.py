@@ -0,0 +1,265 @@
+"""
+Local stand-in models for offline benchmarks - no provider is called.
+
+Stand-in experts are chat models answering with a synthetic COA report in the expert Markdown
+format, stand-in supervisors answer the consolidation and mapping calls with the structured
+output the real supervisors produce. Latency, token usage and failures are sampled per call.
+
+Stand-ins take the model names of the models they replace - so the per provider image
+optimization, call limits and cost tables apply as they would in production.
+"""
+
+import asyncio
+import difflib
+import functools
+import random
+import re
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
+
+from attrs import Factory, define, field
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from comprendo.extraction.expert_report_parsing import ExpertReportParsingError, parse_expert_report
+from comprendo.extraction.rate_limits import estimate_prompt_tokens
+from comprendo.types.consolidated_report import ConsolidatedReport
+from comprendo.types.measurement_mapping import MeasurementMappingEntry, MeasurementMappingTable
+
+STAND_IN_MEASUREMENTS = [
+    ("Appearance", "Clear liquid", True),
+    ("Density @ 20°C (g/cm³)", "1.021", False),
+    ("pH (10% solution)", "6.8", False),
+    ("Viscosity @ 25°C (cP)", "420", False),
+    ("Water content (KF) %", "0.12", False),
+    ("Assay (HPLC) %", "99.4", False),
+    ("Color (APHA)", "15", False),
+    ("Residue on ignition %", "0.02", False),
+]
+
+# Chunks a streamed response is split to
+STAND_IN_STREAM_CHUNKS = 20
+
+
+class StandInModelError(RuntimeError):
+    pass
+
+
+class StandInRateLimitError(StandInModelError):
+    # Looks like a provider 429 to the call limiter
+    def __init__(self, retry_after_seconds: float):
+        super().__init__(f"Stand-in rate limited: retry_after={retry_after_seconds}s")
+        self.status_code = 429
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after_seconds)})
+
+
+@define
+class LatencyDistribution:
+    kind: str
+    a: float
+    b: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.a
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "normal":
+            return max(0.0, rng.normalvariate(self.a, self.b))
+        # lognormal - median and sigma, long right tail like model calls
+        return rng.lognormvariate(0, self.b) * self.a
+
+
+def parse_latency_distribution(spec: str) -> LatencyDistribution:
+    # fixed:2 / uniform:1:3 / normal:mean:std / lognormal:median:sigma (seconds)
+    kind, *params = spec.split(":")
+    if kind not in ("fixed", "uniform", "normal", "lognormal") or not 1 <= len(params) <= 2:
+        raise ValueError(f"Invalid latency distribution: {spec}")
+    return LatencyDistribution(kind, *[float(param) for param in params])
+
+
+@define
+class StandInBehavior:
+    latency: LatencyDistribution
+    output_tokens: int = 600
+    failure_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_seconds: float = 1.0
+    # Multiplies the sampled latencies - < 1 runs a sweep faster with the same shape
+    time_scale: float = 1.0
+    seed: int | None = None
+    rng: random.Random = field(init=False, default=Factory(lambda self: random.Random(self.seed), takes_self=True))
+
+    def sample_latency(self) -> float:
+        return self.latency.sample(self.rng) * self.time_scale
+
+    def sample_failure(self) -> StandInModelError | None:
+        draw = self.rng.random()
+        if draw < self.rate_limit_rate:
+            return StandInRateLimitError(self.retry_after_seconds)
+        if draw < self.rate_limit_rate + self.failure_rate:
+            return StandInModelError("Stand-in model failure")
+        return None
+
+    def get_usage_metadata(self, prompt: list[BaseMessage]) -> dict:
+        input_tokens = estimate_prompt_tokens(prompt)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": input_tokens + self.output_tokens,
+        }
+
+
+def create_stand_in_expert_report(rng: random.Random, disagreement_rate: float) -> str:
+    # The expert Markdown format (See the expert query prompt) - values vary with the disagreement rate
+    measurement_lines = []
+    for name, value, qualitative in STAND_IN_MEASUREMENTS:
+        if not qualitative and rng.random() < disagreement_rate:
+            value = f"{float(value) * rng.uniform(0.9, 1.1):.3f}"
+        measurement_lines.append(f"- {name}: {value}, Accept")
+    return "\n".join(
+        [
+            "# General details",
+            "- Purchase order no.: PO-4711",
+            "",
+            "## Batch no. B-2024-118",
+            "- Expiration date: 2026-12-31",
+            "",
+            "### Batch results",
+            *measurement_lines,
+        ]
+    )
+
+
+class StandInChatModel(BaseChatModel):
+    model_name: str
+    behavior: Any
+    respond: Callable[[], str]
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    def _create_message(self, messages: list[BaseMessage]) -> AIMessage:
+        return AIMessage(content=self.respond(), usage_metadata=self.behavior.get_usage_metadata(messages))
+
+    def _generate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        latency = self.behavior.sample_latency()
+        if error := self.behavior.sample_failure():
+            time.sleep(latency / 2)
+            raise error
+        time.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=self._create_message(messages))])
+
+    async def _agenerate(self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        latency = self.behavior.sample_latency()
+        if error := self.behavior.sample_failure():
+            # Failures come back faster than answers
+            await asyncio.sleep(latency / 2)
+            raise error
+        await asyncio.sleep(latency)
+        return ChatResult(generations=[ChatGeneration(message=self._create_message(messages))])
+
+    async def _astream(
+        self, messages: list[BaseMessage], stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        latency = self.behavior.sample_latency()
+        if error := self.behavior.sample_failure():
+            await asyncio.sleep(latency / 2)
+            raise error
+        message = self._create_message(messages)
+        chunk_size = max(1, len(message.content) // STAND_IN_STREAM_CHUNKS)
+        chunks = [message.content[idx : idx + chunk_size] for idx in range(0, len(message.content), chunk_size)]
+        # Time to first token is a fifth of the call, the rest is spread over the chunks
+        await asyncio.sleep(latency / 5)
+        for idx, chunk in enumerate(chunks):
+            is_last = idx == len(chunks) - 1
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content=chunk, usage_metadata=message.usage_metadata if is_last else None)
+            )
+            await asyncio.sleep(latency * 4 / 5 / len(chunks))
+
+
+def create_stand_in_expert_llm(model_name: str, behavior: StandInBehavior, disagreement_rate: float = 0.0) -> Runnable:
+    expert_llm = StandInChatModel(
+        model_name=model_name,
+        behavior=behavior,
+        respond=lambda: create_stand_in_expert_report(behavior.rng, disagreement_rate),
+    )
+    return expert_llm.with_config({"model": model_name})
+
+
+def get_prompt_text(prompt: list[BaseMessage]) -> str:
+    return "\n".join(message.content for message in prompt if isinstance(message.content, str))
+
+
+def stand_in_consolidation(prompt_text: str) -> ConsolidatedReport:
+    # The first expert report of the prompt, parsed - disagreements are flagged on the first measurement
+    expert_reports = re.split(r"^# Expert \d+$", prompt_text.split("# Your Task")[0], flags=re.MULTILINE)[1:]
+    try:
+        consolidated_report = parse_expert_report(expert_reports[0])
+    except (IndexError, ExpertReportParsingError) as e:
+        raise StandInModelError(f"Stand-in consolidation got no parsable expert report: {e}")
+    if len(expert_reports) > 1 and len(set(expert_reports)) > 1:
+        consolidated_report.batches[0].results[0].flag_disagreement = True
+    return consolidated_report
+
+
+def get_prompt_section_lines(prompt_text: str, section: str) -> list[str]:
+    section_text = prompt_text.split(f"# {section}\n", 1)[-1]
+    return [line for line in section_text.split("\n\n# ", 1)[0].splitlines() if line.strip()]
+
+
+def stand_in_mapping(prompt_text: str) -> MeasurementMappingTable:
+    # Closest canonical name - "?" when nothing is close, as the prompt asks
+    canonical_lines = get_prompt_section_lines(prompt_text, "Canonical Measurements")
+    canonical_ids = {name: canonical_id for canonical_id, name in (line.split(": ", 1) for line in canonical_lines)}
+    entries = []
+    for raw_description in get_prompt_section_lines(prompt_text, "Raw Measurement Descriptions"):
+        close_names = difflib.get_close_matches(raw_description, canonical_ids.keys(), n=1, cutoff=0.5)
+        entries.append(
+            MeasurementMappingEntry(
+                raw_description=raw_description,
+                mapped_to_canonical_id=canonical_ids[close_names[0]] if close_names else "?",
+            )
+        )
+    return MeasurementMappingTable(entries=entries)
+
+
+def create_stand_in_supervisor_llm(
+    model_name: str, behavior: StandInBehavior, answer: Callable[[str], ConsolidatedReport | MeasurementMappingTable]
+) -> Runnable:
+    # Same output as with_structured_output(..., include_raw=True)
+    async def ainvoke_structured(prompt: list[BaseMessage]) -> dict:
+        latency = behavior.sample_latency()
+        if error := behavior.sample_failure():
+            await asyncio.sleep(latency / 2)
+            raise error
+        await asyncio.sleep(latency)
+        parsed = answer(get_prompt_text(prompt))
+        raw = AIMessage(content=parsed.model_dump_json(), usage_metadata=behavior.get_usage_metadata(prompt))
+        return {"raw": raw, "parsed": parsed, "parsing_error": None}
+
+    return RunnableLambda(ainvoke_structured).with_config({"run_name": f"stand_in_{model_name}", "model": model_name})
+
+
+def install_stand_in_models(expert_llms: dict[str, Runnable], consolidator_llm: Runnable, mapper_llm: Runnable):
+    # Replaces the enabled experts and the supervisor clients - before the server starts
+    from comprendo.extraction import experts
+    from comprendo.extraction.supervisors import consolidator_gpt4o, mapper_gpt4o, supervisors
+
+    experts.available_coa_experts.update(
+        {expert_name: functools.partial(lambda llm: llm, expert_llm) for expert_name, expert_llm in expert_llms.items()}
+    )
+    experts.enabled_coa_expert_names[:] = list(expert_llms)
+    experts.get_enabled_coa_experts.cache_clear()
+
+    get_consolidator_llm = functools.cache(lambda: consolidator_llm)
+    get_mapper_llm = functools.cache(lambda: mapper_llm)
+    consolidator_gpt4o.get_supervisor_consolidator_llm = get_consolidator_llm
+    supervisors.get_supervisor_consolidator_llm = get_consolidator_llm
+    mapper_gpt4o.get_supervisor_mapper_llm = get_mapper_llm
+    supervisors.get_supervisor_mapper_llm = get_mapper_llm
@@ -0,0 +1,102 @@
+"""
+Report process startup time and import time per module.
+
+Runs a fresh interpreter with `-X importtime` importing the given modules (the server
+app by default), and reports the wall time and the slowest imports - cumulative time
+includes the nested imports. Optionally times the creation of the enabled expert and
+supervisor clients, which happens on the first extraction.
+
+Usage:
+    python -m benchmarks.startup_import_time [server] [--top 25] [--with-clients]
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+import time
+
+# import time:       self [us] |  cumulative | imported package
+import_time_line_re = re.compile(r"^import time:\s*(?P<self>\d+)\s*\|\s*(?P<cumulative>\d+)\s*\|(?P<module>\s*\S+)\s*$")
+
+create_clients_script = """
+import time
+start_time = time.perf_counter()
+from comprendo.extraction.experts import get_enabled_coa_experts
+from comprendo.extraction.supervisors.consolidator_gpt4o import get_supervisor_consolidator_llm
+from comprendo.extraction.supervisors.mapper_gpt4o import get_supervisor_mapper_llm
+get_enabled_coa_experts()
+get_supervisor_consolidator_llm()
+get_supervisor_mapper_llm()
+print(f"clients_creation_s={time.perf_counter() - start_time}")
+"""
+
+
+def run_python(code: str, import_time: bool = False) -> tuple[float, str, str]:
+    command = [sys.executable] + (["-X", "importtime"] if import_time else []) + ["-c", code]
+    start_time = time.perf_counter()
+    completed = subprocess.run(command, capture_output=True, text=True)
+    wall_time = time.perf_counter() - start_time
+    if completed.returncode != 0:
+        raise RuntimeError(f"Command failed: {' '.join(command)}\n{completed.stderr}")
+    return wall_time, completed.stdout, completed.stderr
+
+
+def parse_import_times(importtime_output: str) -> list[dict]:
+    import_times = []
+    for line in importtime_output.splitlines():
+        import_time_line_match = import_time_line_re.match(line)
+        if not import_time_line_match:
+            continue
+        module = import_time_line_match.group("module")
+        import_times.append(
+            {
+                "module": module.strip(),
+                # Nesting level as indented by -X importtime
+                "depth": (len(module) - len(module.lstrip())) // 2,
+                "self_ms": int(import_time_line_match.group("self")) / 1000,
+                "cumulative_ms": int(import_time_line_match.group("cumulative")) / 1000,
+            }
+        )
+    return import_times
+
+
+def print_import_times(title: str, import_times: list[dict], top: int):
+    print(f"=== {title} ===")
+    header = f"{'Module':<60}{'Self (ms)':>12}{'Cumulative (ms)':>18}"
+    print(header)
+    print("=" * len(header))
+    for r in sorted(import_times, key=lambda r: r["cumulative_ms"], reverse=True)[:top]:
+        print(f"{r['module']:<60}{r['self_ms']:>12.1f}{r['cumulative_ms']:>18.1f}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process startup and import time per module")
+    parser.add_argument("modules", nargs="*", default=["server"], help="Modules to import")
+    parser.add_argument("--top", type=int, default=25, help="Slowest imports to list")
+    parser.add_argument("--with-clients", action="store_true", help="Also time the model clients creation")
+    args = parser.parse_args()
+
+    import_code = "; ".join(f"import {module}" for module in args.modules)
+    baseline_wall_time, _, _ = run_python("pass")
+    wall_time, _, importtime_output = run_python(import_code, import_time=True)
+    import_times = parse_import_times(importtime_output)
+
+    print(f"Interpreter startup: {baseline_wall_time:.2f}s")
+    print(f"Import of {', '.join(args.modules)}: {wall_time - baseline_wall_time:.2f}s (Including -X importtime overhead)")
+    print(f"Modules imported: {len(import_times)}")
+    print()
+    print_import_times("Slowest imports", import_times, args.top)
+    print_import_times(
+        "Project modules", [r for r in import_times if r["module"].split(".")[0] == "comprendo"], args.top
+    )
+    print_import_times("Top level packages", [r for r in import_times if r["depth"] == 0], args.top)
+
+    if args.with_clients:
+        _, clients_output, _ = run_python(import_code + "\n" + create_clients_script)
+        print(clients_output.strip())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,30 @@
+import atexit
 import logging
+import queue
 from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
 
+from opentelemetry import context as otel_context
 from opentelemetry import trace
 
 from comprendo import __version__
+from comprendo.configuration import app_config
 from comprendo.server.security import ClientCredentials
 from comprendo.types.task import Task
 
 ctx_task: Task = ContextVar("task")
 ctx_client: ClientCredentials | None = ContextVar("client")
 
+# Handlers (console, file, Azure Monitor) run on a logging thread - the caller only puts the record on a queue
+log_queue_enabled = app_config.bool("LOG_QUEUE_ENABLED", True)
+log_queue_listener: QueueListener | None = None
+
 
 class ContextFilter(logging.Filter):
     def filter(self, record):
+        if hasattr(record, "request_id"):
+            # Set by the queue handler on the logging thread - the context variables are not set here
+            return True
         task: Task = ctx_task.get(None)
         client: ClientCredentials | None = ctx_client.get(None)
         if task is None:
@@ -30,6 +42,28 @@ class ContextFilter(logging.Filter):
         return True
 
 
+class ContextQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # In process queue - the record is passed as is (exc_info kept for Azure Monitor) with the message merged,
+        # the OTel context (trace / span ids of the log line) travels with it
+        record.msg = record.getMessage()
+        record.args = None
+        record.otel_context = otel_context.get_current()
+        return record
+
+
+class ContextQueueListener(QueueListener):
+    def handle(self, record):
+        # Removed before the handlers see it - exporters take record attributes as log attributes
+        record_otel_context = record.__dict__.pop("otel_context", None)
+        token = otel_context.attach(record_otel_context) if record_otel_context is not None else None
+        try:
+            super().handle(record)
+        finally:
+            if token is not None:
+                otel_context.detach(token)
+
+
 def init_logging(app_name):
     app_logger = logging.getLogger(app_name)
     app_logger.setLevel(logging.INFO)
@@ -41,6 +75,29 @@ def init_logging(app_name):
         )
     )
     app_logger.addHandler(sh)
+    if not log_queue_enabled:
+        return
+
+    # Handlers added before (Azure Monitor, file logging - see monitoring) move behind the queue too
+    handlers = list(app_logger.handlers)
+    for handler in handlers:
+        app_logger.removeHandler(handler)
+    queue_handler = ContextQueueHandler(queue.SimpleQueue())
+    # The request context is read on the logging caller side
+    queue_handler.addFilter(ContextFilter())
+    app_logger.addHandler(queue_handler)
+    global log_queue_listener
+    log_queue_listener = ContextQueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    log_queue_listener.start()
+    atexit.register(stop_log_queue)
+
+
+def stop_log_queue():
+    # Handles the records still queued, then stops the logging thread
+    global log_queue_listener
+    if log_queue_listener is not None:
+        log_queue_listener.stop()
+        log_queue_listener = None
 
 
 def set_logging_context(task: Task, client: ClientCredentials | None):
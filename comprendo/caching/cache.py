@@ -1,38 +1,125 @@
 import hashlib
 import os
 import pathlib
-import shutil
+import threading
+from collections import Counter, OrderedDict
 
+from comprendo.configuration import app_config
 
-class SimpleFileCache:
-    def __init__(self, cache_dir: str, context: list[str]):
+# Relative cache folders are placed under this folder
+cache_root_dir = app_config.str("CACHE_ROOT_DIR", "cache")
+
+
+def content_hash(*parts: str | bytes) -> str:
+    # Length prefixed so different splits of the same content never collide
+    hasher = hashlib.sha256()
+    for part in parts:
+        part_bytes = part.encode() if isinstance(part, str) else part
+        hasher.update(len(part_bytes).to_bytes(8, "big"))
+        hasher.update(part_bytes)
+    return hasher.hexdigest()
+
+
+def get_cache_dir(cache_dir: str) -> pathlib.Path:
+    # Absolute folders are kept as they are
+    return pathlib.Path(cache_root_dir) / cache_dir
+
+
+# File based cache where keys are content hashes of the cached work inputs.
+# Total size is capped - least recently used entries are evicted first.
+# The cache dir may be shared between processes (eviction is best effort per process).
+class ContentAddressedCache:
+    def __init__(self, cache_dir: str | pathlib.Path, max_size_bytes: int):
         self.cache_dir = pathlib.Path(cache_dir)
-        self.context_hash = self._generate_hash_from_inputs(context)
-        self.context_hash_filename = f"{self.context_hash}.ctx.hash"
+        self.max_size_bytes = max_size_bytes
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_size = 0
+        self._load_index()
 
-        if not (self.cache_dir / self.context_hash_filename).exists():
-            # different hash or no cache - remove the cache folder and recreate
-            shutil.rmtree(self.cache_dir, ignore_errors=True)
-            os.makedirs(self.cache_dir, exist_ok=True)
+    def _load_index(self):
+        # The cache folder is created on first write (See put_bytes) - not on import
+        existing = []
+        for entry_path in self.cache_dir.glob("*/*.content"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            existing.append((stat.st_mtime, entry_path.stem, stat.st_size))
+        # Oldest access first
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self._total_size += size
 
-            # touch the cache hash file - this cache folder is not hashed to this input set
-            pathlib.Path(self.cache_dir / self.context_hash_filename).touch()
+    def _get_content_path(self, key: str) -> pathlib.Path:
+        return self.cache_dir / key[:2] / f"{key}.content"
 
-    def _generate_hash_from_inputs(self, context_strs: list[str]):
-        # concat in order and return the digest MD5
-        all_context = "".join(context_strs)
-        return hashlib.md5(all_context.encode()).hexdigest()
+    def get_bytes(self, key: str, namespace: str = "default") -> bytes | None:
+        content_path = self._get_content_path(key)
+        try:
+            content = content_path.read_bytes()
+            # mtime is the last access time - keeps LRU order across restarts
+            os.utime(content_path)
+        except FileNotFoundError:
+            with self._lock:
+                self.counters[f"{namespace}.miss"] += 1
+                self._forget(key)
+            return None
 
-    def _get_content_filename(self, key: str) -> str:
-        return f"{key}.content"
+        with self._lock:
+            self.counters[f"{namespace}.hit"] += 1
+            # Re-index - the entry may have been written by another process
+            self._forget(key)
+            self._entries[key] = len(content)
+            self._total_size += len(content)
+        return content
 
-    def get(self, key: str) -> str:
-        cached_content_filename = self._get_content_filename(key)
-        if pathlib.Path(self.cache_dir / cached_content_filename).exists():
-            with open(self.cache_dir / cached_content_filename, "r") as f:
-                return f.read()
-        return None
+    def put_bytes(self, key: str, content: bytes) -> None:
+        if len(content) > self.max_size_bytes:
+            return
 
-    def put(self, key: str, content: str) -> None:
-        with open(self.cache_dir / self._get_content_filename(key), "w") as f:
+        content_path = self._get_content_path(key)
+        content_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename so readers never see partial content
+        tmp_path = content_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
             f.write(content)
+        os.replace(tmp_path, content_path)
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = len(content)
+            self._total_size += len(content)
+            self._evict()
+
+    def get(self, key: str, namespace: str = "default") -> str | None:
+        content = self.get_bytes(key, namespace)
+        return content.decode() if content is not None else None
+
+    def put(self, key: str, content: str) -> None:
+        self.put_bytes(key, content.encode())
+
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_size -= size
+
+    def _evict(self) -> None:
+        while self._total_size > self.max_size_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._total_size -= size
+            self.counters["evictions"] += 1
+            try:
+                self._get_content_path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "size_bytes": self._total_size,
+                "max_size_bytes": self.max_size_bytes,
+            }
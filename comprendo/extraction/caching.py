@@ -1,10 +1,44 @@
-import pathlib
+import asyncio
 
-from comprendo.types.task import Task
+from comprendo.caching.cache import ContentAddressedCache, content_hash, get_cache_dir
+from comprendo.configuration import app_config
+from comprendo.extraction.cassettes import model_cassette
 
 
-base_cache_dir = pathlib.Path("extraction_cache")
+# Always off with a model cassette - a cached stage output skips its model calls, on record or on replay only
+extraction_cache_enabled = app_config.bool("EXTRACTION_CACHE_ENABLED", True) and model_cassette is None
+extraction_cache_dir = app_config.str("EXTRACTION_CACHE_DIR", "extraction_cache")
+extraction_cache_max_mb = app_config.int("EXTRACTION_CACHE_MAX_MB", 256)
 
+# Stage outputs are keyed by a hash of the stage inputs - identical work is shared across requests
+extraction_cache = (
+    ContentAddressedCache(
+        get_cache_dir(extraction_cache_dir), max_size_bytes=extraction_cache_max_mb * 1024 * 1024
+    )
+    if extraction_cache_enabled
+    else None
+)
 
-def get_namespace_cache_dir(task: Task, namespace: str) -> pathlib.Path:
-    return base_cache_dir / task.request.id / namespace
+
+def get_stage_cache_key(namespace: str, *stage_inputs: str | bytes) -> str:
+    return content_hash(namespace, *stage_inputs)
+
+
+async def get_cached_stage_output(namespace: str, cache_key: str) -> str | None:
+    if extraction_cache is None:
+        return None
+    # File reads and the access time update - off the event loop
+    return await asyncio.to_thread(extraction_cache.get, cache_key, namespace=namespace)
+
+
+async def put_cached_stage_output(cache_key: str, content: str) -> None:
+    if extraction_cache is None:
+        return
+    # File writes and LRU eviction - off the event loop
+    await asyncio.to_thread(extraction_cache.put, cache_key, content)
+
+
+def get_extraction_cache_stats() -> dict:
+    if extraction_cache is None:
+        return {}
+    return extraction_cache.stats()
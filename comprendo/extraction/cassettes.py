@@ -0,0 +1,205 @@
+import asyncio
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from langchain_core.load import dumpd, dumps, load
+from langchain_core.messages import AIMessage, BaseMessage
+from pydantic import BaseModel
+
+from comprendo.app_logging import ctx_task
+from comprendo.caching.cache import content_hash
+from comprendo.configuration import app_config
+
+logger = logging.getLogger(__name__)
+
+# Model calls recorded to / replayed from a JSONL cassette - off / record / replay
+model_cassette_mode = app_config.str("MODEL_CASSETTE_MODE", "off")
+model_cassette_path = app_config.str("MODEL_CASSETTE_PATH", "cassettes/model_calls.jsonl")
+# Replayed calls are matched by their exact prompt, or by request id, stage and model (Prompts may differ)
+model_cassette_match = app_config.str("MODEL_CASSETTE_MATCH", "prompt")
+# Recorded call latency is slept on replay - scaled, 0 answers at once
+model_cassette_replay_latency_scale = app_config.float("MODEL_CASSETTE_REPLAY_LATENCY_SCALE", 1.0)
+
+# Parsed structured outputs are restored to their (pydantic) types from these packages only
+replay_parsed_type_packages = ("comprendo.",)
+
+
+# Shard index of a sharded expert call - shard calls share the request, stage and model
+ctx_model_call_shard: ContextVar[int | None] = ContextVar("model_call_shard", default=None)
+
+
+class ModelCassetteMiss(LookupError):
+    pass
+
+
+def get_prompt_key(stage: str, provider: str, model: str, prompt: list[BaseMessage]) -> str:
+    return content_hash("prompt", stage, provider, model, dumps(prompt))
+
+
+def get_request_key(stage: str, provider: str, model: str) -> str:
+    task = ctx_task.get(None)
+    shard = ctx_model_call_shard.get()
+    return content_hash(
+        "request", task.request.id if task else "", stage, provider, model, "" if shard is None else str(shard)
+    )
+
+
+def dump_model_response(response: AIMessage | dict) -> dict:
+    if not isinstance(response, dict):
+        return {"message": dumpd(response)}
+    # Structured output with include_raw - {"raw": AIMessage, "parsed": ..., "parsing_error": ...}
+    parsed: BaseModel | None = response["parsed"]
+    return {
+        "raw": dumpd(response["raw"]),
+        "parsed": parsed.model_dump(mode="json") if parsed is not None else None,
+        "parsed_type": f"{type(parsed).__module__}:{type(parsed).__qualname__}" if parsed is not None else None,
+        "parsing_error": str(response["parsing_error"]) if response["parsing_error"] else None,
+    }
+
+
+def load_parsed_type(parsed_type: str) -> type[BaseModel]:
+    module_name, _, type_name = parsed_type.partition(":")
+    if not module_name.startswith(replay_parsed_type_packages):
+        raise ValueError(f"Cassette parsed type not allowed: {parsed_type}")
+    return getattr(importlib.import_module(module_name), type_name)
+
+
+def load_model_response(dumped_response: dict) -> AIMessage | dict:
+    if "message" in dumped_response:
+        return load(dumped_response["message"])
+    parsed = None
+    if dumped_response["parsed"] is not None:
+        parsed = load_parsed_type(dumped_response["parsed_type"]).model_validate(dumped_response["parsed"])
+    parsing_error = dumped_response["parsing_error"]
+    return {
+        "raw": load(dumped_response["raw"]),
+        "parsed": parsed,
+        "parsing_error": ValueError(parsing_error) if parsing_error else None,
+    }
+
+
+def get_response_text(response: AIMessage | dict) -> str:
+    message = response["raw"] if isinstance(response, dict) else response
+    return message.content if isinstance(message.content, str) else ""
+
+
+class ModelCassette:
+    def __init__(self, path: str, mode: str, match: str, replay_latency_scale: float):
+        self.path = Path(path)
+        self.mode = mode
+        self.match = match
+        self.replay_latency_scale = replay_latency_scale
+        self._lock = threading.Lock()
+        self._load_lock = asyncio.Lock()
+        self._entries: dict[str, list[dict]] | None = None
+        # Next entry to replay per key - repeated calls get the recorded answers in order
+        self._replay_positions: dict[str, int] = defaultdict(int)
+
+    def _append(self, entry: dict) -> None:
+        with self._lock:
+            os.makedirs(self.path.parent, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _load_entries(self) -> dict[str, list[dict]]:
+        entries: dict[str, list[dict]] = defaultdict(list)
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries[entry[f"{self.match}_key"]].append(entry)
+        logger.info(f"Loaded model cassette: path={self.path}, calls={sum(len(e) for e in entries.values())}")
+        return entries
+
+    async def _get_entries(self) -> dict[str, list[dict]]:
+        async with self._load_lock:
+            if self._entries is None:
+                self._entries = await asyncio.to_thread(self._load_entries)
+        return self._entries
+
+    async def _record(
+        self, stage: str, provider: str, model: str, prompt: list[BaseMessage], invoke: Callable[[], Awaitable]
+    ) -> AIMessage | dict:
+        start_time = time.perf_counter()
+        response = await invoke()
+        latency = time.perf_counter() - start_time
+        task = ctx_task.get(None)
+        entry = {
+            "prompt_key": get_prompt_key(stage, provider, model, prompt),
+            "request_key": get_request_key(stage, provider, model),
+            "request_id": task.request.id if task else None,
+            "stage": stage,
+            "shard": ctx_model_call_shard.get(),
+            "provider": provider,
+            "model": model,
+            "latency": latency,
+            "recorded_at": time.time(),
+            "response": dump_model_response(response),
+        }
+        await asyncio.to_thread(self._append, entry)
+        return response
+
+    async def _replay(
+        self,
+        stage: str,
+        provider: str,
+        model: str,
+        prompt: list[BaseMessage],
+        on_delta: Callable[[str], None] | None,
+    ) -> AIMessage | dict:
+        if self.match == "request":
+            key = get_request_key(stage, provider, model)
+        else:
+            key = get_prompt_key(stage, provider, model, prompt)
+        key_entries = (await self._get_entries()).get(key)
+        if not key_entries:
+            raise ModelCassetteMiss(f"Model call not in cassette: stage={stage}, model={model}, match={self.match}")
+        entry = key_entries[self._replay_positions[key] % len(key_entries)]
+        self._replay_positions[key] += 1
+
+        if self.replay_latency_scale > 0:
+            await asyncio.sleep(entry["latency"] * self.replay_latency_scale)
+        response = load_model_response(entry["response"])
+        if on_delta is not None and (response_text := get_response_text(response)):
+            on_delta(response_text)
+        return response
+
+    async def ainvoke(
+        self,
+        stage: str,
+        provider: str,
+        model: str,
+        prompt: list[BaseMessage],
+        invoke: Callable[[], Awaitable],
+        on_delta: Callable[[str], None] | None = None,
+    ) -> AIMessage | dict:
+        if self.mode == "replay":
+            return await self._replay(stage, provider, model, prompt, on_delta)
+        return await self._record(stage, provider, model, prompt, invoke)
+
+
+def create_model_cassette() -> ModelCassette | None:
+    if model_cassette_mode not in ("record", "replay"):
+        return None
+    if model_cassette_match not in ("prompt", "request"):
+        raise ValueError(f"Invalid MODEL_CASSETTE_MATCH: {model_cassette_match}")
+    logger.info(
+        f"Model cassette active: mode={model_cassette_mode}, path={model_cassette_path}, match={model_cassette_match}"
+    )
+    return ModelCassette(
+        model_cassette_path,
+        mode=model_cassette_mode,
+        match=model_cassette_match,
+        replay_latency_scale=model_cassette_replay_latency_scale,
+    )
+
+
+model_cassette = create_model_cassette()
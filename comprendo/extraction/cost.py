@@ -1,15 +1,7 @@
+import functools
 import re
 
 from langchain_core.messages.ai import UsageMetadata
-from langchain_community.callbacks.openai_info import (
-    get_openai_token_cost_for_model,
-    MODEL_COST_PER_1K_TOKENS as OPENAI_MODEL_COST_PER_1K_TOKENS,
-    TokenType,
-)
-from langchain_community.callbacks.bedrock_anthropic_callback import (
-    MODEL_COST_PER_1K_INPUT_TOKENS as BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_INPUT_TOKENS,
-    MODEL_COST_PER_1K_OUTPUT_TOKENS as BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_OUTPUT_TOKENS,
-)
 
 
 def standardize_anthropic_model_name(model_name: str) -> str:
@@ -17,13 +9,23 @@ def standardize_anthropic_model_name(model_name: str) -> str:
     return re.sub("-v\d+$", "", model_name.split(":")[0].removeprefix("anthropic."))
 
 
-# Remove the bedrock part from the model name
-ANTHROPIC_MODEL_COST_PER_1K_INPUT_TOKENS = {
-    standardize_anthropic_model_name(k): v for k, v in BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_INPUT_TOKENS.items()
-}
-ANTHROPIC_MODEL_COST_PER_1K_OUTPUT_TOKENS = {
-    standardize_anthropic_model_name(k): v for k, v in BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_OUTPUT_TOKENS.items()
-}
+@functools.cache
+def get_anthropic_model_costs() -> tuple[dict, dict]:
+    # Price tables of langchain_community - the callbacks package is slow to import, loaded on first cost
+    from langchain_community.callbacks.bedrock_anthropic_callback import (
+        MODEL_COST_PER_1K_INPUT_TOKENS as BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_INPUT_TOKENS,
+        MODEL_COST_PER_1K_OUTPUT_TOKENS as BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_OUTPUT_TOKENS,
+    )
+
+    # Remove the bedrock part from the model name
+    anthropic_model_cost_per_1k_input_tokens = {
+        standardize_anthropic_model_name(k): v for k, v in BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_INPUT_TOKENS.items()
+    }
+    anthropic_model_cost_per_1k_output_tokens = {
+        standardize_anthropic_model_name(k): v for k, v in BEDROCK_ANTHROPIC_MODEL_COST_PER_1K_OUTPUT_TOKENS.items()
+    }
+    return anthropic_model_cost_per_1k_input_tokens, anthropic_model_cost_per_1k_output_tokens
+
 
 GEMINI_MODEL_COST_PER_1K_INPUT_TOKENS = {
     "gemini-1.5-flash": 0.075 / 1000,
@@ -74,6 +76,14 @@ def usage_metadata_to_cost(
         reasoning_tokens = usage_metadata["output_token_details"]["reasoning"]
     uncached_prompt_tokens = prompt_tokens - prompt_tokens_cached
 
+    from langchain_community.callbacks.openai_info import (
+        get_openai_token_cost_for_model,
+        MODEL_COST_PER_1K_TOKENS as OPENAI_MODEL_COST_PER_1K_TOKENS,
+        TokenType,
+    )
+
+    anthropic_model_cost_per_1k_input_tokens, anthropic_model_cost_per_1k_output_tokens = get_anthropic_model_costs()
+
     if cost_lookup_key in OPENAI_MODEL_COST_PER_1K_TOKENS:
         uncached_prompt_cost = get_openai_token_cost_for_model(
             cost_lookup_key, uncached_prompt_tokens, token_type=TokenType.PROMPT
@@ -87,10 +97,10 @@ def usage_metadata_to_cost(
         )
         return prompt_cost + completion_cost
 
-    elif cost_lookup_key in ANTHROPIC_MODEL_COST_PER_1K_INPUT_TOKENS:
-        return (prompt_tokens / 1000) * ANTHROPIC_MODEL_COST_PER_1K_INPUT_TOKENS[cost_lookup_key] + (
+    elif cost_lookup_key in anthropic_model_cost_per_1k_input_tokens:
+        return (prompt_tokens / 1000) * anthropic_model_cost_per_1k_input_tokens[cost_lookup_key] + (
             completion_tokens / 1000
-        ) * ANTHROPIC_MODEL_COST_PER_1K_OUTPUT_TOKENS[cost_lookup_key]
+        ) * anthropic_model_cost_per_1k_output_tokens[cost_lookup_key]
 
     elif cost_lookup_key in GEMINI_MODEL_COST_PER_1K_INPUT_TOKENS:
         return (prompt_tokens / 1000) * GEMINI_MODEL_COST_PER_1K_INPUT_TOKENS[cost_lookup_key] + (
@@ -0,0 +1,364 @@
+import datetime
+import re
+
+from comprendo.types.consolidated_report import (
+    ConsolidatedBatch,
+    ConsolidatedMeasurementResult,
+    ConsolidatedReport,
+)
+
+# Expert reports are Markdown (See the expert query prompt):
+# - measurement: result, Accept/Reject
+# or tables - | measurement | specification | result |
+bullet_line_re = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(?P<name>[^:|]+?)\s*:\s*(?P<value>.*)$")
+table_row_re = re.compile(r"^\s*\|(?P<cells>.+)\|\s*$")
+table_separator_re = re.compile(r"^\s*\|?\s*:?-{3,}")
+markdown_emphasis_re = re.compile(r"[*_`]+")
+
+# Identification details reported along the measurements - not measurement descriptions
+identification_fields = {
+    "batch",
+    "batch no",
+    "batch number",
+    "lot",
+    "lot no",
+    "lot number",
+    "expiration date",
+    "expiry date",
+    "exp date",
+    "manufacturing date",
+    "manufacture date",
+    "production date",
+    "retest date",
+    "purchase order",
+    "purchase order no",
+    "purchase order number",
+    "po number",
+    "order number",
+    "product",
+    "product name",
+    "material",
+    "batch results",
+    "measurement",
+    "test",
+    "parameter",
+    "specification",
+    "result",
+    "results",
+}
+
+
+def clean_markdown_text(text: str) -> str:
+    return " ".join(markdown_emphasis_re.sub("", text).split())
+
+
+def is_identification_field(name: str) -> bool:
+    return name.lower().rstrip(".:#").strip() in identification_fields
+
+
+def extract_candidate_measurement_descriptions(expert_reports: list[str]) -> list[str]:
+    # Measurement names as reported by the experts - a light parse, misses are expected
+    candidate_descriptions: set[str] = set()
+    for expert_report in expert_reports:
+        in_table_body = False
+        for line in expert_report.splitlines():
+            if table_separator_re.match(line):
+                # Rows after the header separator are the table body
+                in_table_body = True
+                continue
+            table_row_match = table_row_re.match(line)
+            if table_row_match:
+                if in_table_body:
+                    name = clean_markdown_text(table_row_match.group("cells").split("|")[0])
+                    if name and not is_identification_field(name):
+                        candidate_descriptions.add(name)
+                continue
+            in_table_body = False
+
+            bullet_line_match = bullet_line_re.match(line)
+            if bullet_line_match and bullet_line_match.group("value").strip():
+                name = clean_markdown_text(bullet_line_match.group("name"))
+                if name and not is_identification_field(name):
+                    candidate_descriptions.add(name)
+    return sorted(candidate_descriptions)
+
+
+# Structured parse of a whole expert report (See parse_expert_report)
+heading_re = re.compile(r"^\s*#{1,6}\s+(?P<text>.*?)\s*#*\s*$")
+key_value_line_re = re.compile(r"^\s*(?:(?:[-+]|\d+[.)])\s+)?(?P<name>[^:|]+?)\s*:\s*(?P<value>.*)$")
+batch_title_re = re.compile(r"\b(?:batch|lot)\b\s*(?:(?:no\.?|number|#)\s*:?|:)\s*(?P<number>\S.*)$", re.I)
+field_name_separators_re = re.compile(r"[.:#]")
+plain_number_re = re.compile(r"^-?\d+(?:\.\d+)?$")
+
+accept_words = r"accept(?:ed)?|pass(?:ed)?|conforms?|conforming|complies|compliant|ok|meets specifications?"
+reject_words = (
+    r"reject(?:ed)?|fail(?:ed)?|does not conform|non[- ]?conform(?:ing|ant)?|does not comply|not compliant|"
+    r"out of specifications?|oos"
+)
+accept_status_re = re.compile(rf"^(?:{accept_words})$", re.I)
+reject_status_re = re.compile(rf"^(?:{reject_words})$", re.I)
+# "<result>, Accept" / "<result> (Accept)" / "<result> - Accept"
+status_suffix_re = re.compile(
+    rf"^(?P<result>.*?)\s*(?:[,;]|\s[-–]|\()\s*(?P<status>{reject_words}|{accept_words})\s*\)?\.?$", re.I
+)
+
+order_number_fields = {
+    "purchase order",
+    "purchase order no",
+    "purchase order number",
+    "order no",
+    "order number",
+    "po",
+    "po no",
+    "po number",
+    "p o no",
+    "p o number",
+}
+product_name_fields = {"product", "product name", "material", "material name"}
+batch_number_fields = {"batch", "batch no", "batch number"}
+lot_number_fields = {"lot", "lot no", "lot number"}
+expiration_date_fields = {"expiration date", "expiry date", "exp date", "expiration", "expiry", "best before", "use by"}
+# Report details the consolidated report has no place for
+ignored_report_fields = identification_fields | {
+    "general details",
+    "manufacturer",
+    "supplier",
+    "customer",
+    "quantity",
+    "date",
+    "report date",
+    "analysis date",
+    "release date",
+    "storage",
+    "storage conditions",
+    "shelf life",
+    "country of origin",
+    "note",
+    "notes",
+    "comments",
+    "remarks",
+}
+
+table_result_headers = ("result", "value", "found", "observ")
+table_status_headers = ("accept", "status", "conclusion", "conform", "complian", "pass", "verdict", "evaluation")
+
+# Day / month order is ambiguous for these - both are tried
+ambiguous_date_formats = [("%d/%m/%Y", "%m/%d/%Y"), ("%d-%m-%Y", "%m-%d-%Y")]
+date_formats = ["%Y-%m-%d", "%Y/%m/%d", "%d.%m.%Y", "%d %B %Y", "%d %b %Y", "%B %d, %Y", "%b %d, %Y", "%d-%b-%Y"]
+missing_values = {"", "n/a", "na", "none", "not reported", "not available", "not provided", "-", "--"}
+
+
+identifier_separators_re = re.compile(r"[\W_]+")
+
+
+class ExpertReportParsingError(ValueError):
+    pass
+
+
+def normalize_identifier(identifier: str | None) -> str | None:
+    # Batch / order numbers - case, whitespace and punctuation insensitive
+    if identifier is None:
+        return None
+    return identifier_separators_re.sub("", identifier.lower()) or None
+
+
+def normalize_field_name(name: str) -> str:
+    return " ".join(field_name_separators_re.sub(" ", name.lower()).split())
+
+
+def parse_report_date(text: str) -> str | None:
+    # ISO 8601 date - the consolidated report format
+    if text.lower() in missing_values:
+        return None
+    for date_format in date_formats:
+        try:
+            return datetime.datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            pass
+    for date_formats_pair in ambiguous_date_formats:
+        parsed_dates = set()
+        for date_format in date_formats_pair:
+            try:
+                parsed_dates.add(datetime.datetime.strptime(text, date_format).date().isoformat())
+            except ValueError:
+                pass
+        if len(parsed_dates) == 1:
+            return parsed_dates.pop()
+        if parsed_dates:
+            raise ExpertReportParsingError(f"Ambiguous date: {text}")
+    raise ExpertReportParsingError(f"Unknown date format: {text}")
+
+
+def parse_status(text: str) -> bool | None:
+    text = clean_markdown_text(text).rstrip(".")
+    if accept_status_re.match(text):
+        return True
+    if reject_status_re.match(text):
+        return False
+    return None
+
+
+def parse_result_value(text: str) -> str | float | bool | None:
+    if text.lower() in missing_values:
+        return None
+    if plain_number_re.match(text):
+        return float(text)
+    # Qualitative results are Boolean (As the consolidation prompt asks)
+    status = parse_status(text)
+    return status if status is not None else text
+
+
+def parse_measurement(description: str, result_text: str, status_text: str | None) -> ConsolidatedMeasurementResult:
+    result_text = clean_markdown_text(result_text)
+    if status_text is not None:
+        accept = parse_status(status_text)
+    else:
+        accept = parse_status(result_text)
+        if accept is None:
+            status_suffix_match = status_suffix_re.match(result_text)
+            if status_suffix_match:
+                result_text = status_suffix_match.group("result")
+                accept = parse_status(status_suffix_match.group("status"))
+        else:
+            result_text = ""
+    if accept is None:
+        raise ExpertReportParsingError(f"No accept / reject status: {description}")
+
+    value = parse_result_value(result_text) if result_text else accept
+    return ConsolidatedMeasurementResult(
+        description=description, value=value, accept=accept, flag_disagreement=False
+    )
+
+
+def find_table_column(header_cells: list[str], header_names: tuple[str, ...]) -> int | None:
+    # First column is the measurement description
+    for idx, cell in enumerate(header_cells[1:], start=1):
+        if any(header_name in cell.lower() for header_name in header_names):
+            return idx
+    return None
+
+
+def merge_repeated_batches(batches: list[ConsolidatedBatch]) -> list[ConsolidatedBatch]:
+    # A batch spanning several pages is reported once per page group by sharded experts
+    merged_batches: dict[str, ConsolidatedBatch] = {}
+    result_batches: list[ConsolidatedBatch] = []
+    for batch in batches:
+        batch_key = normalize_identifier(batch.batch_number)
+        if batch_key is None or batch_key not in merged_batches:
+            if batch_key is not None:
+                merged_batches[batch_key] = batch
+            result_batches.append(batch)
+            continue
+        merged_batch = merged_batches[batch_key]
+        if batch.expiration_date is not None:
+            if merged_batch.expiration_date not in (None, batch.expiration_date):
+                raise ExpertReportParsingError(f"Batch reported with different expiration dates: {batch.batch_number}")
+            merged_batch.expiration_date = batch.expiration_date
+        merged_batch.results += batch.results
+    return result_batches
+
+
+def parse_expert_report(expert_report: str) -> ConsolidatedReport:
+    # Parse the Markdown report the expert query prompt asks for straight into the report schema.
+    # Strict - anything not understood raises ExpertReportParsingError (The consolidation model handles those)
+    order_number: str | None = None
+    product_name: str | None = None
+    batches: list[ConsolidatedBatch] = []
+    # Batch number taken from a batch field / title - a lot number does not replace it
+    batch_number_is_final = False
+
+    def current_batch() -> ConsolidatedBatch:
+        if not batches:
+            batches.append(ConsolidatedBatch(batch_number=None, expiration_date=None, results=[]))
+        return batches[-1]
+
+    def start_batch(batch_number: str | None, from_lot: bool = False) -> None:
+        nonlocal batch_number_is_final
+        if batches and not batches[-1].results:
+            # Details of the batch reported before its section
+            if batch_number is None:
+                return
+            batches[-1].batch_number = batch_number
+        else:
+            batches.append(ConsolidatedBatch(batch_number=batch_number, expiration_date=None, results=[]))
+        batch_number_is_final = batch_number is not None and not from_lot
+
+    def set_batch_number(batch_number: str, from_lot: bool) -> None:
+        if batch_number.lower() in missing_values:
+            return
+        batch = current_batch()
+        if not batch.results and batch.batch_number is not None and from_lot and batch_number_is_final:
+            return
+        start_batch(batch_number, from_lot)
+
+    table_columns: tuple[int, int | None, int] | None = None
+    table_header_row: list[str] | None = None
+    for line in expert_report.splitlines():
+        if not line.strip():
+            continue
+
+        if table_separator_re.match(line) and "|" in line:
+            if table_header_row is None:
+                raise ExpertReportParsingError("Table separator without a header")
+            result_column = find_table_column(table_header_row, table_result_headers)
+            if result_column is None:
+                raise ExpertReportParsingError(f"Table without a result column: {table_header_row}")
+            status_column = find_table_column(table_header_row, table_status_headers)
+            table_columns = (result_column, status_column, len(table_header_row))
+            continue
+        table_row_match = table_row_re.match(line)
+        if table_row_match:
+            cells = [clean_markdown_text(cell) for cell in table_row_match.group("cells").split("|")]
+            if table_columns is None:
+                table_header_row = cells
+                continue
+            result_column, status_column, columns_count = table_columns
+            if len(cells) != columns_count:
+                raise ExpertReportParsingError(f"Table row does not match the header: {cells}")
+            if not cells[0] or is_identification_field(cells[0]):
+                continue
+            status_text = cells[status_column] if status_column is not None else None
+            current_batch().results.append(parse_measurement(cells[0], cells[result_column], status_text))
+            continue
+        table_columns, table_header_row = None, None
+
+        heading_match = heading_re.match(line)
+        if heading_match or (line.lstrip().startswith("**") and ":" not in line):
+            title = clean_markdown_text(heading_match.group("text") if heading_match else line)
+            batch_title_match = batch_title_re.search(title)
+            if batch_title_match:
+                start_batch(batch_title_match.group("number").strip(), title.lower().startswith("lot"))
+            elif re.search(r"\b(?:batch|lot)\b", title, re.I) and not is_identification_field(title):
+                # "Batch 1" - a new batch section, the number follows
+                start_batch(None)
+            continue
+
+        key_value_match = key_value_line_re.match(clean_markdown_text(line))
+        if not key_value_match:
+            # Prose and horizontal rules
+            continue
+        name = key_value_match.group("name")
+        value = key_value_match.group("value")
+        field_name = normalize_field_name(name)
+        if field_name in order_number_fields:
+            order_number = order_number if value.lower() in missing_values else value
+        elif field_name in product_name_fields:
+            product_name = product_name if value.lower() in missing_values else value
+        elif field_name in batch_number_fields or field_name in lot_number_fields:
+            set_batch_number(value, from_lot=field_name in lot_number_fields)
+        elif field_name in expiration_date_fields:
+            current_batch().expiration_date = parse_report_date(value)
+        elif field_name in ignored_report_fields or not value:
+            continue
+        else:
+            current_batch().results.append(parse_measurement(name, value, None))
+
+    batches = merge_repeated_batches([batch for batch in batches if batch.results])
+    if not batches:
+        raise ExpertReportParsingError("No measurement results found")
+    return ConsolidatedReport(
+        batches=batches,
+        order_number=order_number,
+        product_name=product_name,
+        flag_identification_warning=False,
+    )
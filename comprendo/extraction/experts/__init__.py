@@ -1,39 +1,53 @@
+import functools
 import logging
 
+from langchain_core.language_models import BaseChatModel
+
 from comprendo.configuration import app_config
 from comprendo.extraction.experts.coa_claude import (
-    anthropic_legacy_expert_model_name,
-    anthropic_analysis_expert_llm,
+    create_anthropic_legacy_analysis_expert_llm,
+    create_anthropic_analysis_expert_llm,
 )
 from comprendo.extraction.experts.coa_gemini import (
-    gemini_legacy_expert_model_name,
-    gemini_analysis_expert_llm,
-    vertextai_gemini_legacy_analysis_expert_llm,
-    vertextai_gemini_analysis_expert_llm,
+    create_gemini_legacy_analysis_expert_llm,
+    create_gemini_analysis_expert_llm,
+    create_vertexai_gemini_legacy_analysis_expert_llm,
+    create_vertexai_gemini_analysis_expert_llm,
 )
 
 logger = logging.getLogger(__name__)
 
+# Expert name -> client factory. Clients (and their provider SDKs) are created on first use
 available_coa_experts = {
-    "anthropic-claude-3-5-sonnet": anthropic_legacy_expert_model_name,
-    "anthropic-claude-3-7-sonnet": anthropic_analysis_expert_llm,
-    "gemini-1-5-flash": gemini_legacy_expert_model_name,
-    "gemini-2-0-flash-lite": gemini_analysis_expert_llm,
-    "vertexai-gemini-1-5-flash": vertextai_gemini_legacy_analysis_expert_llm,
-    "vertexai-gemini-2-0-flash-lite": vertextai_gemini_analysis_expert_llm,
+    "anthropic-claude-3-5-sonnet": create_anthropic_legacy_analysis_expert_llm,
+    "anthropic-claude-3-7-sonnet": create_anthropic_analysis_expert_llm,
+    "gemini-1-5-flash": create_gemini_legacy_analysis_expert_llm,
+    "gemini-2-0-flash-lite": create_gemini_analysis_expert_llm,
+    "vertexai-gemini-1-5-flash": create_vertexai_gemini_legacy_analysis_expert_llm,
+    "vertexai-gemini-2-0-flash-lite": create_vertexai_gemini_analysis_expert_llm,
 }
 
-_added_coa_experts = set()
-enabled_coa_experts = []
+enabled_coa_expert_names = []
 for coa_expert_idx in range(10):
     coa_expert_name = app_config.str(f"COA_EXPERT_{coa_expert_idx}", None)
     if coa_expert_name is not None:
         if coa_expert_name in available_coa_experts:
-            if coa_expert_name not in _added_coa_experts and available_coa_experts[coa_expert_name]:
-                _added_coa_experts.add(coa_expert_name)
-                enabled_coa_experts.append(available_coa_experts[coa_expert_name])
-                logger.info(f"Enabled COA expert: {coa_expert_name}")
+            if coa_expert_name not in enabled_coa_expert_names:
+                enabled_coa_expert_names.append(coa_expert_name)
             else:
                 logger.warning(f"COA expert {coa_expert_name} already chosen - skipping")
         else:
             logger.warning(f"COA expert {coa_expert_name} not available/configured or not found")
+
+
+@functools.cache
+def get_enabled_coa_experts() -> list[BaseChatModel]:
+    enabled_coa_experts = []
+    for coa_expert_name in enabled_coa_expert_names:
+        expert_llm = available_coa_experts[coa_expert_name]()
+        if expert_llm is None:
+            logger.warning(f"COA expert {coa_expert_name} not available/configured or not found")
+            continue
+        enabled_coa_experts.append(expert_llm)
+        logger.info(f"Enabled COA expert: {coa_expert_name}")
+    return enabled_coa_experts
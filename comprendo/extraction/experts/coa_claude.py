@@ -1,20 +1,54 @@
-from langchain_anthropic import ChatAnthropic
+from functools import cached_property
 
-anthropic_legacy_expert_model_name = "claude-3-5-sonnet-20240620"
-anthropic_claude_3_5_analysis_expert_llm = ChatAnthropic(
-    model=anthropic_legacy_expert_model_name,
-    temperature=0,
-    max_tokens=1024,
-    timeout=None,
-    max_retries=1,
-).with_config({"model": anthropic_legacy_expert_model_name})
+from langchain_core.language_models import BaseChatModel
 
+from comprendo.extraction.model_clients import get_shared_async_http_client
 
+anthropic_legacy_expert_model_name = "claude-3-5-sonnet-20240620"
 anthropic_expert_model_name = "claude-3-7-sonnet-20250219"
-anthropic_analysis_expert_llm = ChatAnthropic(
-    model=anthropic_expert_model_name,
-    temperature=0,
-    max_tokens=1024,
-    timeout=None,
-    max_retries=1,
-).with_config({"model": anthropic_expert_model_name})
+
+# ChatAnthropic internals replaced to share the connection pool (langchain-anthropic 0.3.x - pinned in requirements)
+chat_anthropic_client_attributes = ("_client_params", "_async_client")
+
+
+def check_chat_anthropic_client_attributes(chat_anthropic_class: type) -> None:
+    # Fail loudly on a langchain-anthropic upgrade - silently setting an unused attribute would leave a pool per client
+    missing_attributes = [
+        attribute
+        for attribute in chat_anthropic_client_attributes
+        if not isinstance(getattr(chat_anthropic_class, attribute, None), cached_property)
+    ]
+    if missing_attributes:
+        raise RuntimeError(
+            f"ChatAnthropic client attributes changed - the shared HTTP client cannot be set: "
+            f"missing={missing_attributes}"
+        )
+
+
+def create_anthropic_expert_llm(model_name: str) -> BaseChatModel:
+    # Imported on first use - only when an Anthropic expert is enabled
+    import anthropic
+    from langchain_anthropic import ChatAnthropic
+
+    expert_llm = ChatAnthropic(
+        model=model_name,
+        temperature=0,
+        max_tokens=1024,
+        timeout=None,
+        # Retried by the model call limiter - within the shared limits
+        max_retries=0,
+    )
+    # ChatAnthropic opens a connection pool per instance - use the shared one instead
+    check_chat_anthropic_client_attributes(ChatAnthropic)
+    expert_llm.__dict__["_async_client"] = anthropic.AsyncClient(
+        **expert_llm._client_params, http_client=get_shared_async_http_client("anthropic")
+    )
+    return expert_llm.with_config({"model": model_name})
+
+
+def create_anthropic_legacy_analysis_expert_llm() -> BaseChatModel:
+    return create_anthropic_expert_llm(anthropic_legacy_expert_model_name)
+
+
+def create_anthropic_analysis_expert_llm() -> BaseChatModel:
+    return create_anthropic_expert_llm(anthropic_expert_model_name)
@@ -1,48 +1,62 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_google_vertexai import ChatVertexAI
+import logging
+
+from langchain_core.language_models import BaseChatModel
 
 from comprendo.configuration import app_config
 from comprendo.integration.vertexai.credentials import load_google_auth_credentials, is_google_auth_configured
 
-gemini_legacy_expert_model_name = "gemini-1.5-flash"
-gemini_analysis_expert_llm = ChatGoogleGenerativeAI(
-    model=gemini_legacy_expert_model_name,
-    temperature=0,
-    max_tokens=1024,
-    timeout=None,
-    max_retries=1,
-    api_key=app_config.str("GEMINI_API_KEY", None),
-).with_config({"model": gemini_legacy_expert_model_name})
+logger = logging.getLogger(__name__)
 
+gemini_legacy_expert_model_name = "gemini-1.5-flash"
 gemini_expert_model_name = "gemini-2.0-flash-lite"
-gemini_analysis_expert_llm = ChatGoogleGenerativeAI(
-    model=gemini_expert_model_name,
-    temperature=0,
-    max_tokens=1024,
-    timeout=None,
-    max_retries=1,
-    api_key=app_config.str("GEMINI_API_KEY", None),
-).with_config({"model": gemini_expert_model_name})
-
-vertextai_gemini_legacy_analysis_expert_llm = None
-vertextai_gemini_analysis_expert_llm = None
-# Handle case where credentials are not configured
-if is_google_auth_configured():
-    vertextai_gemini_legacy_analysis_expert_llm = ChatVertexAI(
-        model=gemini_legacy_expert_model_name,
+
+
+def create_gemini_expert_llm(model_name: str) -> BaseChatModel:
+    # Imported on first use - only when a Gemini expert is enabled
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model_name,
         temperature=0,
         max_tokens=1024,
-        max_retries=1,
-        # Credentials loaded from env-var
-        credentials=load_google_auth_credentials(),
-    ).with_config({"model": gemini_legacy_expert_model_name, "provider": "vertexai"})
-    vertextai_gemini_analysis_expert_llm = ChatVertexAI(
-        model=gemini_expert_model_name,
+        timeout=None,
+        # Retried by the model call limiter - within the shared limits
+        # (langchain-google-genai still makes 2 attempts on Google API errors whatever the setting)
+        max_retries=0,
+        api_key=app_config.str("GEMINI_API_KEY", None),
+    ).with_config({"model": model_name})
+
+
+def create_vertexai_gemini_expert_llm(model_name: str) -> BaseChatModel | None:
+    # Handle case where credentials are not configured
+    if not is_google_auth_configured():
+        logger.warning("Google authentication credentials not configured. Disabling VertexAI Gemini expert.")
+        return None
+
+    from langchain_google_vertexai import ChatVertexAI
+
+    return ChatVertexAI(
+        model=model_name,
         temperature=0,
         max_tokens=1024,
-        max_retries=1,
+        # Retried by the model call limiter - within the shared limits
+        max_retries=0,
         # Credentials loaded from env-var
         credentials=load_google_auth_credentials(),
-    ).with_config({"model": gemini_expert_model_name, "provider": "vertexai"})
-else:
-    print("Google authentication credentials not configured. Disabling VertexAI Gemini expert.")
+    ).with_config({"model": model_name, "provider": "vertexai"})
+
+
+def create_gemini_legacy_analysis_expert_llm() -> BaseChatModel:
+    return create_gemini_expert_llm(gemini_legacy_expert_model_name)
+
+
+def create_gemini_analysis_expert_llm() -> BaseChatModel:
+    return create_gemini_expert_llm(gemini_expert_model_name)
+
+
+def create_vertexai_gemini_legacy_analysis_expert_llm() -> BaseChatModel | None:
+    return create_vertexai_gemini_expert_llm(gemini_legacy_expert_model_name)
+
+
+def create_vertexai_gemini_analysis_expert_llm() -> BaseChatModel | None:
+    return create_vertexai_gemini_expert_llm(gemini_expert_model_name)
@@ -1,25 +1,44 @@
 import asyncio
 import json
 import logging
-import pathlib
 import time
 
 from langchain_core.language_models import BaseChatModel
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
 
-from comprendo.caching.cache import SimpleFileCache
-from comprendo.extraction.caching import get_namespace_cache_dir
+from comprendo.configuration import app_config
+from comprendo.extraction.caching import (
+    get_cached_stage_output,
+    get_stage_cache_key,
+    put_cached_stage_output,
+)
 from comprendo.extraction.cost import usage_metadata_to_cost
-from comprendo.extraction.experts import enabled_coa_experts
+from comprendo.extraction.experts import get_enabled_coa_experts
+from comprendo.extraction.cassettes import ctx_model_call_shard
+from comprendo.extraction.rate_limits import get_llm_provider, limited_ainvoke
+from comprendo.log_payloads import format_log_payload
+from comprendo.preprocess.optimize import ProviderImageOptimizer, get_image_optimization_profile
+from comprendo.progress import get_progress_delta_reporter, report_progress
+from comprendo.telemetry import record_model_cost, stage_span
+from comprendo.types.expert_result import ExpertResult
+from comprendo.types.document_artifact import DocumentArtifact
 from comprendo.types.image_artifact import ImageArtifact
 from comprendo.types.task import Task
 
 logger = logging.getLogger(__name__)
 
-
-def get_experts_cache_dir(task: Task) -> pathlib.Path:
-    return get_namespace_cache_dir(task, "experts")
+# Per expert deadline - 0 waits forever
+experts_deadline_seconds = app_config.float("EXPERTS_DEADLINE_SECONDS", 120)
+# Continue once this many experts answered - 0 waits for all enabled experts
+experts_quorum = app_config.int("EXPERTS_QUORUM", 0)
+# Past the deadline - continue if at least this many experts answered
+experts_min_results = app_config.int("EXPERTS_MIN_RESULTS", 1)
+# Expert calls per page group - none (all pages in one call) / document / pages (EXPERT_SHARD_PAGES pages)
+expert_sharding_mode = app_config.str("EXPERT_SHARDING_MODE", "none")
+expert_shard_pages = app_config.int("EXPERT_SHARD_PAGES", 4)
+# Concurrent shard calls per expert - 0 runs all shards at once
+expert_shard_concurrency = app_config.int("EXPERT_SHARD_CONCURRENCY", 4)
 
 
 expert_system_prompt = "You are an expert in the field of material quality analysis and inspection. You output Markdown"
@@ -46,10 +65,45 @@ expert_prompt_template = ChatPromptTemplate(
     ]
 )
 
+experts_cache_namespace = "experts"
 experts_cache_context = ["1", expert_system_prompt, expert_query_prompt]
 
 
-async def extract_from_images_using_expert(expert_llm: BaseChatModel, task: Task, image_artifacts: list[ImageArtifact]):
+def get_expert_cache_key(expert_llm: BaseChatModel, document_artifacts: list[DocumentArtifact]) -> str:
+    # Keyed by the original images and the optimization profile - a cache hit skips the optimization
+    return get_stage_cache_key(
+        experts_cache_namespace,
+        *experts_cache_context,
+        expert_llm.config["model"],
+        expert_llm.config.get("provider", None) or "default",
+        repr(get_image_optimization_profile(get_llm_provider(expert_llm))),
+        *[artifact.content_hash() for artifact in document_artifacts],
+    )
+
+
+def to_message_content_block(document_artifact: DocumentArtifact) -> dict:
+    if isinstance(document_artifact, ImageArtifact):
+        return {
+            "type": "image_url",
+            "image_url": {"url": f"data:{document_artifact.mime_type};base64,{document_artifact.base64}"},
+        }
+    return {
+        "type": "text",
+        "text": f"Document page {document_artifact.page} text (layout preserved):\n{document_artifact.value}",
+    }
+
+
+def get_expert_name(expert_llm: BaseChatModel) -> str:
+    provider = expert_llm.config.get("provider", None)
+    return f"{provider}-{expert_llm.config['model']}" if provider else expert_llm.config["model"]
+
+
+async def extract_from_images_using_expert(
+    expert_llm: BaseChatModel,
+    task: Task,
+    document_artifacts: list[DocumentArtifact],
+    image_optimizer: ProviderImageOptimizer | None = None,
+) -> ExpertResult:
     logger.info(
         f"Extraction started: model={expert_llm.config['model']}",
         extra={
@@ -57,34 +111,36 @@ async def extract_from_images_using_expert(expert_llm: BaseChatModel, task: Task
             "provider": expert_llm.config.get("provider", None),
         },
     )
-    cache = SimpleFileCache(get_experts_cache_dir(task), experts_cache_context)
-    cache_key = f"expert_response_{expert_llm.config['model']}_{expert_llm.config.get('provider', 'default')}"
-    cached_response = cache.get(cache_key)
+    cache_key = get_expert_cache_key(expert_llm, document_artifacts)
+    cached_response = await get_cached_stage_output(experts_cache_namespace, cache_key)
     if cached_response:
-        logger.info(f"Using cached response: model={expert_llm.config['model']}, payload={json.dumps(cached_response)}")
-        return cached_response
-
-    images_message = HumanMessage(
-        content=[
-            {
-                "type": "image_url",
-                "image_url": {"url": f"data:{image_artifact.mime_type};base64,{image_artifact.base64}"},
-            }
-            for image_artifact in image_artifacts
-        ],
-    )
+        logger.info(f"Using cached response: model={expert_llm.config['model']}, payload={format_log_payload(lambda: json.dumps(cached_response))}")
+        return ExpertResult(expert=get_expert_name(expert_llm), content=cached_response, time=0, cached=True)
+
+    provider = get_llm_provider(expert_llm)
+    image_optimizer = image_optimizer or ProviderImageOptimizer(document_artifacts)
+    document_artifacts = await image_optimizer.get_images(provider)
+
+    # Page images and / or page text layers - in document page order
+    with stage_span("image_encoding", provider=provider, step="message"):
+        images_message = HumanMessage(
+            content=[to_message_content_block(artifact) for artifact in document_artifacts],
+        )
 
     prompt = expert_prompt_template.format_messages(
         images=[images_message],
     )
 
+    # Output tokens are streamed to the progress listener (if any) as they arrive
+    on_delta = get_progress_delta_reporter("expert_delta", expert=get_expert_name(expert_llm))
     invoke_start_time = time.time()
-    extraction_message: AIMessage = await expert_llm.ainvoke(prompt)
+    with stage_span("expert", model=expert_llm.config["model"], provider=provider):
+        extraction_message: AIMessage = await limited_ainvoke(expert_llm, prompt, stage="expert", on_delta=on_delta)
     invoke_total_time = time.time() - invoke_start_time
 
-    cache.put(cache_key, extraction_message.content)
+    await put_cached_stage_output(cache_key, extraction_message.content)
     logger.info(
-        f"Extracted content: model={expert_llm.config['model']}, payload={json.dumps(extraction_message.content)}, time={invoke_total_time:.2f}s",
+        f"Extracted content: model={expert_llm.config['model']}, payload={format_log_payload(lambda: json.dumps(extraction_message.content))}, time={invoke_total_time:.2f}s",
         extra={
             "time": invoke_total_time,
             "model": expert_llm.config["model"],
@@ -96,22 +152,175 @@ async def extract_from_images_using_expert(expert_llm: BaseChatModel, task: Task
     logger.info(
         f"Extraction usage metadata: model={expert_llm.config['model']}, payload={json.dumps(extraction_message.usage_metadata)}"
     )
-    cost = usage_metadata_to_cost(
-        expert_llm.config["model"],
-        usage_metadata,
-        input_images_count=len(image_artifacts),
-        model_provider=expert_llm.config.get("provider", None),
-    )
+    if usage_metadata is None:
+        # Streamed responses of some providers carry no usage
+        logger.warning(f"Extraction usage not reported - cost not counted: model={expert_llm.config['model']}")
+        cost = 0.0
+    else:
+        cost = usage_metadata_to_cost(
+            expert_llm.config["model"],
+            usage_metadata,
+            input_images_count=sum(1 for artifact in document_artifacts if isinstance(artifact, ImageArtifact)),
+            model_provider=expert_llm.config.get("provider", None),
+        )
     task.cost += cost
+    record_model_cost("expert", provider, expert_llm.config["model"], cost)
     logger.info(f"Extraction usage cost: model={expert_llm.config['model']}, cost={cost:.7f}")
 
-    return extraction_message.content
+    return ExpertResult(expert=get_expert_name(expert_llm), content=extraction_message.content, time=invoke_total_time)
+
+
+def get_artifact_page_key(document_artifact: DocumentArtifact) -> tuple[str | None, int | None]:
+    return document_artifact.source, document_artifact.page
+
+
+def split_expert_shards(document_artifacts: list[DocumentArtifact]) -> list[list[DocumentArtifact]]:
+    # Consecutive pages of a single document - artifacts of the same page (text and image) stay together
+    if expert_sharding_mode not in ("document", "pages"):
+        return [document_artifacts]
+
+    shards: list[list[DocumentArtifact]] = []
+    shard_pages: set[tuple[str | None, int | None]] = set()
+    for artifact in document_artifacts:
+        page_key = get_artifact_page_key(artifact)
+        is_new_page = page_key not in shard_pages
+        if (
+            not shards
+            or artifact.source != shards[-1][-1].source
+            or (expert_sharding_mode == "pages" and is_new_page and len(shard_pages) >= max(1, expert_shard_pages))
+        ):
+            shards.append([])
+            shard_pages = set()
+        shards[-1].append(artifact)
+        shard_pages.add(page_key)
+    return shards or [document_artifacts]
+
+
+def get_shard_title(document_shard: list[DocumentArtifact], document_idx: int) -> str:
+    pages = sorted({artifact.page for artifact in document_shard if artifact.page is not None})
+    if not pages:
+        return f"Document {document_idx}"
+    return f"Pages {pages[0]}-{pages[-1]} of document {document_idx}"
+
+
+def merge_expert_shard_results(
+    shard_results: list[ExpertResult], document_shards: list[list[DocumentArtifact]]
+) -> ExpertResult:
+    # One report in page order - a title per shard. The same batch may be reported by consecutive shards
+    documents_idx = {source: idx + 1 for idx, source in enumerate(dict.fromkeys(s[0].source for s in document_shards))}
+    content = "\n\n".join(
+        f"# {get_shard_title(document_shard, documents_idx[document_shard[0].source])}\n\n{shard_result.content}"
+        for shard_result, document_shard in zip(shard_results, document_shards)
+    )
+    return ExpertResult(
+        expert=shard_results[0].expert,
+        content=content,
+        # Shards run concurrently
+        time=max(shard_result.time for shard_result in shard_results),
+        cached=all(shard_result.cached for shard_result in shard_results),
+    )
+
+
+async def extract_from_shards_using_expert(
+    expert_llm: BaseChatModel,
+    task: Task,
+    document_shards: list[list[DocumentArtifact]],
+    image_optimizers: list[ProviderImageOptimizer],
+) -> ExpertResult:
+    if len(document_shards) == 1:
+        return await extract_from_images_using_expert(expert_llm, task, document_shards[0], image_optimizers[0])
+
+    shard_slots = asyncio.Semaphore(expert_shard_concurrency) if expert_shard_concurrency > 0 else None
+
+    async def extract_shard(
+        shard_idx: int, document_shard: list[DocumentArtifact], image_optimizer: ProviderImageOptimizer
+    ):
+        # Own task context - tells the shard calls apart in a model cassette
+        ctx_model_call_shard.set(shard_idx)
+        if shard_slots is None:
+            return await extract_from_images_using_expert(expert_llm, task, document_shard, image_optimizer)
+        async with shard_slots:
+            return await extract_from_images_using_expert(expert_llm, task, document_shard, image_optimizer)
+
+    logger.info(
+        f"Sharded extraction: model={expert_llm.config['model']}, shards={len(document_shards)}, "
+        f"concurrency={expert_shard_concurrency}"
+    )
+    shard_tasks = [
+        asyncio.ensure_future(extract_shard(shard_idx, document_shard, image_optimizer))
+        for shard_idx, (document_shard, image_optimizer) in enumerate(zip(document_shards, image_optimizers))
+    ]
+    try:
+        shard_results = await asyncio.gather(*shard_tasks)
+    except BaseException:
+        # A failed shard fails the expert - the other shards are not needed anymore
+        for shard_task in shard_tasks:
+            shard_task.cancel()
+        await asyncio.gather(*shard_tasks, return_exceptions=True)
+        raise
+    return merge_expert_shard_results(shard_results, document_shards)
+
+
+async def expert_extraction_from_images(
+    task: Task, document_artifacts: list[DocumentArtifact]
+) -> list[ExpertResult]:
+    enabled_coa_experts = get_enabled_coa_experts()
+    if not enabled_coa_experts:
+        raise ValueError("No COA experts enabled - see the COA_EXPERT_x settings")
+
+    document_shards = split_expert_shards(document_artifacts)
+    # Shared by the experts - each shard is optimized once per profile
+    image_optimizers = [ProviderImageOptimizer(document_shard) for document_shard in document_shards]
+    expert_tasks = {
+        asyncio.create_task(
+            extract_from_shards_using_expert(expert_llm, task, document_shards, image_optimizers)
+        ): get_expert_name(expert_llm)
+        for expert_llm in enabled_coa_experts
+    }
+    quorum = min(experts_quorum or len(expert_tasks), len(expert_tasks))
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + experts_deadline_seconds if experts_deadline_seconds > 0 else None
+
+    results: dict[asyncio.Task, ExpertResult] = {}
+    errors: list[BaseException] = []
+    pending = set(expert_tasks)
+    try:
+        while pending and len(results) < quorum:
+            timeout = max(0, deadline - loop.time()) if deadline is not None else None
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.warning(f"Experts deadline passed: answered={len(results)}, deadline={experts_deadline_seconds}s")
+                break
+            for expert_task in done:
+                if expert_task.exception() is not None:
+                    errors.append(expert_task.exception())
+                    logger.error(
+                        f"Expert failed: expert={expert_tasks[expert_task]}, error={expert_task.exception()!r}"
+                    )
+                    report_progress(
+                        "expert_failed", expert=expert_tasks[expert_task], error=str(expert_task.exception())
+                    )
+                else:
+                    results[expert_task] = expert_task.result()
+                    report_progress(
+                        "expert_done",
+                        expert=results[expert_task].expert,
+                        time=results[expert_task].time,
+                        cached=results[expert_task].cached,
+                    )
+    finally:
+        # Stragglers past the quorum / deadline (or the request itself was cancelled)
+        for expert_task in pending:
+            logger.info(f"Cancelling expert: expert={expert_tasks[expert_task]}")
+            expert_task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
 
+    if len(results) < min(experts_min_results, len(expert_tasks)) or not results:
+        if errors:
+            raise errors[0]
+        raise TimeoutError(f"Not enough experts answered within {experts_deadline_seconds}s")
 
-async def expert_extraction_from_images(task: Task, image_artifacts: list[ImageArtifact]):
-    expert_results = []
-    for expert_llm in enabled_coa_experts:
-        res_expert_task = extract_from_images_using_expert(expert_llm, task, image_artifacts)
-        expert_results.append(res_expert_task)
-    expert_results = await asyncio.gather(*expert_results)
+    # Keep the enabled experts order - the consolidation input (and cache key) is stable
+    expert_results = [results[expert_task] for expert_task in expert_tasks if expert_task in results]
+    logger.info(f"Experts participating: experts={[r.expert for r in expert_results]}")
     return expert_results
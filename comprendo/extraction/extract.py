@@ -1,18 +1,33 @@
+import asyncio
+import json
 import logging
+import time
 
+from comprendo.configuration import app_config
+from comprendo.extraction.caching import get_extraction_cache_stats
+from comprendo.extraction.expert_report_parsing import extract_candidate_measurement_descriptions
 from comprendo.extraction.experts.experts import expert_extraction_from_images
+from comprendo.extraction.local_consolidation import consolidate_expert_reports_locally
 from comprendo.extraction.supervisors.supervisors import (
     supervisor_consolidation,
     supervisor_mapping,
+    supervisor_mapping_descriptions,
 )
+from comprendo.log_payloads import format_log_payload
+from comprendo.progress import report_progress
+from comprendo.telemetry import stage_span
 from comprendo.types.consolidated_report import ConsolidatedReport
+from comprendo.types.expert_result import ExpertResult
 from comprendo.types.extraction_result import ExtractionResult
-from comprendo.types.image_artifact import ImageArtifact
+from comprendo.types.document_artifact import DocumentArtifact
 from comprendo.types.measurement_mapping import MeasurementMappingTable
 from comprendo.types.task import Task
 
 logger = logging.getLogger(__name__)
 
+# Map the measurement descriptions found in the expert reports while the consolidation runs
+early_mapping_enabled = app_config.bool("EARLY_MAPPING_ENABLED", True)
+
 
 def remap_measurements_to_canonical(
     task: Task, consolidated_report: ConsolidatedReport, mapping_table: MeasurementMappingTable
@@ -47,27 +62,110 @@ def remap_measurements_to_canonical(
 
 
 def generate_extraction_result(
-    task: Task, consolidated_report: ConsolidatedReport, mapping_table: MeasurementMappingTable
+    task: Task,
+    consolidated_report: ConsolidatedReport,
+    mapping_table: MeasurementMappingTable,
+    expert_results: list[ExpertResult],
 ) -> ExtractionResult:
-    consolidated_report = remap_measurements_to_canonical(task, consolidated_report, mapping_table)
-
-    final_extraction_results = ExtractionResult(request_id=task.request.id, consolidated_report=consolidated_report)
-    logger.info(f"Final extraction results: payload={final_extraction_results.model_dump_json()}")
+    with stage_span("remapping"):
+        consolidated_report = remap_measurements_to_canonical(task, consolidated_report, mapping_table)
+
+    final_extraction_results = ExtractionResult(
+        request_id=task.request.id,
+        consolidated_report=consolidated_report,
+        experts=[expert_result.expert for expert_result in expert_results],
+    )
+    logger.info(f"Final extraction results: payload={format_log_payload(lambda: final_extraction_results.model_dump_json())}")
     return final_extraction_results
 
 
-async def extract(task: Task, image_artifacts: list[ImageArtifact]):
-    expert_results = await expert_extraction_from_images(task, image_artifacts)
-
-    consolidated_report: ConsolidatedReport = await supervisor_consolidation(task, expert_results)
+def normalize_mapping_key(description: str) -> str:
+    # Same matching as remap_measurements_to_canonical
+    return description.strip().lower()
+
+
+async def complete_early_mapping(
+    task: Task,
+    consolidated_report: ConsolidatedReport,
+    early_mapping: asyncio.Task,
+    early_mapping_descs: list[str],
+) -> MeasurementMappingTable:
+    try:
+        early_mapping_table: MeasurementMappingTable = await early_mapping
+    except Exception as e:
+        logger.warning(f"Early measurement mapping failed - mapping the consolidated report: error={e!r}")
+        return await supervisor_mapping(task, consolidated_report)
+
+    # Descriptions already seen by the early mapping (Mapped, or found to have no match)
+    seen_descs = {normalize_mapping_key(d) for d in early_mapping_descs} | {
+        normalize_mapping_key(e.raw_description) for e in early_mapping_table.entries
+    }
+    catch_up_descs = sorted(
+        {
+            r.description
+            for b in consolidated_report.batches
+            for r in b.results
+            if normalize_mapping_key(r.description) not in seen_descs
+        }
+    )
+    logger.info(
+        f"Early measurement mapping: early={len(early_mapping_descs)}, catch_up={len(catch_up_descs)}",
+        extra={"catch_up": len(catch_up_descs)},
+    )
+    if not catch_up_descs:
+        return early_mapping_table
+
+    catch_up_mapping_table = await supervisor_mapping_descriptions(task, catch_up_descs)
+    return MeasurementMappingTable(entries=early_mapping_table.entries + catch_up_mapping_table.entries)
+
+
+async def extract(task: Task, document_artifacts: list[DocumentArtifact]):
+    expert_results = await expert_extraction_from_images(task, document_artifacts)
+    expert_reports = [expert_result.content for expert_result in expert_results]
+
+    # The mapping needs the descriptions only - start it from the expert reports instead of waiting for consolidation
+    early_mapping: asyncio.Task | None = None
+    early_mapping_descs = extract_candidate_measurement_descriptions(expert_reports) if early_mapping_enabled else []
+    if early_mapping_descs:
+        early_mapping = asyncio.create_task(supervisor_mapping_descriptions(task, early_mapping_descs))
+
+    try:
+        consolidation_start_time = time.time()
+        with stage_span("consolidation") as consolidation_span:
+            # A single expert, or experts in agreement, need no consolidation model
+            consolidated_report = consolidate_expert_reports_locally(expert_reports)
+            local_consolidation = consolidated_report is not None
+            consolidation_span.set_attribute("local", local_consolidation)
+            if consolidated_report is None:
+                consolidated_report = await supervisor_consolidation(task, expert_reports)
+    except BaseException:
+        if early_mapping is not None:
+            early_mapping.cancel()
+            await asyncio.gather(early_mapping, return_exceptions=True)
+        raise
     # print_report_formatted(task, consolidated_report)
-
-    mapping_table = await supervisor_mapping(task, consolidated_report)
+    report_progress(
+        "consolidation_done",
+        local=local_consolidation,
+        batches=len(consolidated_report.batches),
+        time=time.time() - consolidation_start_time,
+    )
+
+    # The early mapping has been running since the consolidation started
+    mapping_start_time = consolidation_start_time if early_mapping is not None else time.time()
+    # Early mapping - the span is the wait left after the consolidation
+    with stage_span("mapping", early=early_mapping is not None):
+        if early_mapping is not None:
+            mapping_table = await complete_early_mapping(task, consolidated_report, early_mapping, early_mapping_descs)
+        else:
+            mapping_table = await supervisor_mapping(task, consolidated_report)
+    report_progress("mapping_done", entries=len(mapping_table.entries), time=time.time() - mapping_start_time)
     # print_mapping_table(mapping_table)
 
-    extraction_result = generate_extraction_result(task, consolidated_report, mapping_table)
+    extraction_result = generate_extraction_result(task, consolidated_report, mapping_table, expert_results)
 
     logger.info(f"Total extraction cost: cost={task.cost:.7f}")
+    logger.info(f"Extraction cache stats: payload={json.dumps(get_extraction_cache_stats())}")
 
     return extraction_result
 
@@ -0,0 +1,170 @@
+import logging
+import re
+
+from comprendo.configuration import app_config
+from comprendo.extraction.expert_report_parsing import (
+    ExpertReportParsingError,
+    normalize_identifier,
+    parse_expert_report,
+)
+from comprendo.extraction.measurement_matching import (
+    get_description_order_similarity,
+    get_description_similarity,
+    measurement_matching_threshold,
+    normalize_measurement_description,
+    parse_measurement_description,
+)
+from comprendo.log_payloads import format_log_payload
+from comprendo.types.consolidated_report import (
+    ConsolidatedBatch,
+    ConsolidatedMeasurementResult,
+    ConsolidatedReport,
+)
+
+logger = logging.getLogger(__name__)
+
+local_consolidation_enabled = app_config.bool("LOCAL_CONSOLIDATION_ENABLED", True)
+# A single expert report is used as parsed - its measurement descriptions are reported as the expert wrote them
+# (The consolidation model rewrites them descriptively). Disable to always consolidate a single report with the model
+local_consolidation_single_expert = app_config.bool("LOCAL_CONSOLIDATION_SINGLE_EXPERT", True)
+# Differing measurement values flagged locally - beyond it the consolidation model decides
+local_consolidation_max_disagreements = app_config.int("LOCAL_CONSOLIDATION_MAX_DISAGREEMENTS", 0)
+
+number_re = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+class ExpertReportsDisagreement(Exception):
+    pass
+
+
+def normalize_result_value(value: str | float | bool | None) -> tuple:
+    # "0.50 %" / "0.5%" / 0.5 compare by their numbers and the text around them
+    if value is None or isinstance(value, bool):
+        return (value,)
+    text = "".join(str(value).lower().split())
+    return tuple(float(n) for n in number_re.findall(text)), number_re.sub("#", text)
+
+
+def merge_field(name: str, values: list[str | None], normalize) -> str | None:
+    # A detail missing from some experts is not a disagreement
+    reported_values = [value for value in values if value is not None]
+    if len({normalize(value) for value in reported_values}) > 1:
+        raise ExpertReportsDisagreement(f"{name} differs: {reported_values}")
+    return reported_values[0] if reported_values else None
+
+
+def pair_batches(reports: list[ConsolidatedReport]) -> list[list[ConsolidatedBatch]]:
+    base_batches = reports[0].batches
+    if any(len(report.batches) != len(base_batches) for report in reports[1:]):
+        raise ExpertReportsDisagreement(f"Batch count differs: {[len(report.batches) for report in reports]}")
+    if len(base_batches) == 1:
+        return [[report.batches[0] for report in reports]]
+
+    paired_batches = []
+    for base_batch in base_batches:
+        batch_key = normalize_identifier(base_batch.batch_number)
+        if batch_key is None:
+            raise ExpertReportsDisagreement("Several batches without a batch number")
+        batch_group = [base_batch]
+        for report in reports[1:]:
+            same_batches = [b for b in report.batches if normalize_identifier(b.batch_number) == batch_key]
+            if len(same_batches) != 1:
+                raise ExpertReportsDisagreement(f"Batch not reported by all experts: {base_batch.batch_number}")
+            batch_group.append(same_batches[0])
+        paired_batches.append(batch_group)
+    return paired_batches
+
+
+def pair_results(
+    base_results: list[ConsolidatedMeasurementResult], other_results: list[ConsolidatedMeasurementResult]
+) -> list[tuple[ConsolidatedMeasurementResult, ConsolidatedMeasurementResult]]:
+    # Same measurement by normalized description, then by a close fuzzy match
+    remaining = list(other_results)
+    normalized_remaining = [parse_measurement_description(r.description) for r in remaining]
+    pairs = []
+    for base_result in base_results:
+        normalized_base = parse_measurement_description(base_result.description)
+        scores = [
+            (
+                get_description_similarity(normalized_base, normalized),
+                get_description_order_similarity(normalized_base, normalized),
+            )
+            for normalized in normalized_remaining
+        ]
+        best_idx = max(range(len(scores)), key=lambda idx: scores[idx], default=None)
+        if best_idx is None or scores[best_idx][0] < measurement_matching_threshold:
+            raise ExpertReportsDisagreement(f"Measurement not reported by all experts: {base_result.description}")
+        pairs.append((base_result, remaining.pop(best_idx)))
+        normalized_remaining.pop(best_idx)
+    if remaining:
+        raise ExpertReportsDisagreement(
+            f"Measurements not reported by all experts: {[r.description for r in remaining]}"
+        )
+    return pairs
+
+
+def merge_expert_reports(reports: list[ConsolidatedReport]) -> ConsolidatedReport:
+    # Deterministic field diff - the first (enabled order) expert values are reported
+    order_number = merge_field("Order number", [r.order_number for r in reports], normalize_identifier)
+    product_name = merge_field(
+        "Product name", [r.product_name for r in reports], normalize_measurement_description
+    )
+
+    disagreements = 0
+    merged_batches = []
+    for batch_group in pair_batches(reports):
+        base_batch = batch_group[0]
+        expiration_date = merge_field("Expiration date", [b.expiration_date for b in batch_group], str)
+        for other_batch in batch_group[1:]:
+            for base_result, other_result in pair_results(base_batch.results, other_batch.results):
+                if (
+                    base_result.accept != other_result.accept
+                    or normalize_result_value(base_result.value) != normalize_result_value(other_result.value)
+                ) and not base_result.flag_disagreement:
+                    base_result.flag_disagreement = True
+                    disagreements += 1
+        merged_batches.append(
+            ConsolidatedBatch(
+                results=base_batch.results,
+                batch_number=merge_field(
+                    "Batch number", [b.batch_number for b in batch_group], normalize_identifier
+                ),
+                expiration_date=expiration_date,
+            )
+        )
+
+    if disagreements > local_consolidation_max_disagreements:
+        raise ExpertReportsDisagreement(f"Measurement values differ: disagreements={disagreements}")
+    return ConsolidatedReport(
+        batches=merged_batches,
+        order_number=order_number,
+        product_name=product_name,
+        flag_identification_warning=False,
+    )
+
+
+def consolidate_expert_reports_locally(expert_reports: list[str]) -> ConsolidatedReport | None:
+    # Returns None when the consolidation model is needed
+    if not local_consolidation_enabled:
+        return None
+    if len(expert_reports) == 1 and not local_consolidation_single_expert:
+        logger.info("Local consolidation skipped - single expert report")
+        return None
+
+    try:
+        parsed_reports = [parse_expert_report(expert_report) for expert_report in expert_reports]
+    except ExpertReportParsingError as e:
+        logger.info(f"Local consolidation skipped - expert report not parsed: reason={e}")
+        return None
+
+    try:
+        consolidated_report = merge_expert_reports(parsed_reports)
+    except ExpertReportsDisagreement as e:
+        logger.info(f"Local consolidation skipped - experts disagree: reason={e}")
+        return None
+
+    logger.info(
+        f"Consolidated {len(expert_reports)} expert results locally: "
+        f"payload={format_log_payload(lambda: consolidated_report.model_dump_json())}"
+    )
+    return consolidated_report
@@ -0,0 +1,159 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from comprendo.configuration import app_config
+from comprendo.extraction.cassettes import model_cassette
+from comprendo.extraction.measurement_matching import normalize_measurement_description
+from comprendo.server.types.extract_coa_input import RequestMeasurement
+
+logger = logging.getLogger(__name__)
+
+mapping_memory_enabled = app_config.bool("MAPPING_MEMORY_ENABLED", True)
+# SQLite file - shared by all server worker processes on the host
+mapping_memory_path = app_config.str("MAPPING_MEMORY_PATH", "mapping_memory/mapping_memory.sqlite3")
+# A mapping is reused once the mapping model gave it on this many requests - a single answer may be wrong
+mapping_memory_min_confirmations = app_config.int("MAPPING_MEMORY_MIN_CONFIRMATIONS", 2)
+# Mappings not confirmed again for this long are forgotten - and learned again from the model
+mapping_memory_max_age_days = app_config.float("MAPPING_MEMORY_MAX_AGE_DAYS", 90)
+
+mapping_memory_schema = """
+CREATE TABLE IF NOT EXISTS measurement_mappings (
+    client_id TEXT NOT NULL,
+    normalized_description TEXT NOT NULL,
+    canonical_id TEXT NOT NULL,
+    canonical_name TEXT NOT NULL,
+    confirmations INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (client_id, normalized_description)
+) WITHOUT ROWID
+"""
+
+
+class MappingMemory:
+    # Learned (client, normalized raw description) -> canonical measurement mappings
+    def __init__(self, path: str):
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            # Concurrent readers with a writer (Several server processes)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(measurement_mappings)")]
+            if columns and "confirmations" not in columns:
+                # Mappings remembered before confirmations were counted - none of them is confirmed
+                self._connection.execute("DROP TABLE measurement_mappings")
+            self._connection.execute(mapping_memory_schema)
+            self._connection.commit()
+        return self._connection
+
+    def recall(
+        self, client_id: str, raw_descriptions: list[str], canonical_measurements: list[RequestMeasurement]
+    ) -> dict[str, str]:
+        # Raw description -> canonical id, for confirmed descriptions still valid in this request
+        canonical_names_by_id = {m.id: normalize_measurement_description(m.name) for m in canonical_measurements}
+        normalized_descriptions = {d: normalize_measurement_description(d) for d in raw_descriptions}
+
+        recalled: dict[str, str] = {}
+        invalidated: list[str] = []
+        with self._lock:
+            connection = self._get_connection()
+            self._evict_expired(connection)
+            for raw_description, normalized_description in normalized_descriptions.items():
+                row = connection.execute(
+                    "SELECT canonical_id, canonical_name, confirmations FROM measurement_mappings "
+                    "WHERE client_id = ? AND normalized_description = ?",
+                    (client_id, normalized_description),
+                ).fetchone()
+                if row is None:
+                    continue
+                canonical_id, canonical_name, confirmations = row
+                # The id was removed from the catalog, or now stands for another measurement
+                if canonical_names_by_id.get(canonical_id) != normalize_measurement_description(canonical_name):
+                    invalidated.append(normalized_description)
+                    continue
+                if confirmations < mapping_memory_min_confirmations:
+                    continue
+                recalled[raw_description] = canonical_id
+
+            if invalidated:
+                connection.executemany(
+                    "DELETE FROM measurement_mappings WHERE client_id = ? AND normalized_description = ?",
+                    [(client_id, normalized_description) for normalized_description in invalidated],
+                )
+                connection.commit()
+                logger.info(
+                    f"Invalidated remembered measurement mappings: client={client_id}, count={len(invalidated)}"
+                )
+        return recalled
+
+    def remember(
+        self, client_id: str, mappings: dict[str, str], canonical_measurements: list[RequestMeasurement]
+    ) -> None:
+        # Raw description -> canonical id, as answered by the mapping model on one request
+        # The same answer again confirms the mapping, another answer starts over. The canonical name detects reused ids
+        canonical_names_by_id = {m.id: m.name for m in canonical_measurements}
+        updated_at = time.time()
+        rows = [
+            (
+                client_id,
+                normalize_measurement_description(raw_description),
+                canonical_id,
+                canonical_names_by_id[canonical_id],
+                updated_at,
+            )
+            for raw_description, canonical_id in mappings.items()
+            if canonical_id in canonical_names_by_id and normalize_measurement_description(raw_description)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            connection = self._get_connection()
+            connection.executemany(
+                "INSERT INTO measurement_mappings "
+                "(client_id, normalized_description, canonical_id, canonical_name, confirmations, updated_at) "
+                "VALUES (?, ?, ?, ?, 1, ?) "
+                "ON CONFLICT (client_id, normalized_description) DO UPDATE SET "
+                "confirmations = CASE WHEN canonical_id = excluded.canonical_id "
+                "AND canonical_name = excluded.canonical_name THEN confirmations + 1 ELSE 1 END, "
+                "canonical_id = excluded.canonical_id, canonical_name = excluded.canonical_name, "
+                "updated_at = excluded.updated_at",
+                rows,
+            )
+            connection.commit()
+
+    def forget(self, client_id: str) -> int:
+        # All mappings of the client - returns the number of forgotten mappings
+        with self._lock:
+            connection = self._get_connection()
+            forgotten = connection.execute(
+                "DELETE FROM measurement_mappings WHERE client_id = ?", (client_id,)
+            ).rowcount
+            connection.commit()
+        logger.info(f"Forgot remembered measurement mappings: client={client_id}, count={forgotten}")
+        return forgotten
+
+    def _evict_expired(self, connection: sqlite3.Connection) -> None:
+        expired_before = time.time() - mapping_memory_max_age_days * 24 * 3600
+        evicted = connection.execute(
+            "DELETE FROM measurement_mappings WHERE updated_at < ?", (expired_before,)
+        ).rowcount
+        if evicted:
+            connection.commit()
+            logger.info(f"Evicted expired measurement mappings: count={evicted}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+# Off with a model cassette - as the extraction cache, recalled mappings skip the mapping model calls
+mapping_memory = MappingMemory(mapping_memory_path) if mapping_memory_enabled and model_cassette is None else None
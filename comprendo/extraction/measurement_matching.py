@@ -0,0 +1,193 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from attrs import define
+
+from comprendo.configuration import app_config
+from comprendo.server.types.extract_coa_input import RequestMeasurement
+
+measurement_matching_enabled = app_config.bool("MEASUREMENT_MATCHING_ENABLED", True)
+# Minimal fuzzy match score (0-1) to map a description locally - below it the description goes to the mapping LLM
+measurement_matching_threshold = app_config.float("MEASUREMENT_MATCHING_THRESHOLD", 0.9)
+# A description scoring this close to two different canonicals is ambiguous - left to the mapping LLM
+MEASUREMENT_MATCHING_AMBIGUITY_MARGIN = 0.05
+# Shorter normalized descriptions only match exactly ("ph" / "pb")
+MEASUREMENT_MATCHING_FUZZY_MIN_LENGTH = 5
+# Words differing this little are spelling variants of each other ("mould" / "mold", "yeast" / "yeasts")
+MEASUREMENT_MATCHING_WORD_VARIANT_MIN_RATIO = 0.8
+# Shorter words only match exactly
+MEASUREMENT_MATCHING_WORD_VARIANT_MIN_LENGTH = 4
+
+# Units as commonly reported next to the measurement name - compared apart from the name
+unit_re = re.compile(
+    r"(?<![\w/])(?:%|ppm|ppb|mg/kg|mg/g|mg/l|mg/ml|ug/g|ug/kg|ug/l|g/100 ?g|g/ml|g/cm3|g/l|cfu/g|cfu/ml|mpn/g|iu/g|"
+    r"w/w|v/v|w/v|mpa\.?s|mm2/s|cst|cp|degc|°c|°|kg|mg|ug|ml|nm|mm|cm)(?![\w/])"
+)
+# Spellings of the same unit
+unit_aliases = {
+    "degc": "°c",
+    "°": "°c",
+    "mg/kg": "ppm",
+    "ug/g": "ppm",
+    "ug/kg": "ppb",
+    "g/100g": "%",
+    "cp": "mpa.s",
+    "mpas": "mpa.s",
+    "cst": "mm2/s",
+}
+non_word_re = re.compile(r"[\W_]+")
+digits_re = re.compile(r"\d+")
+# A word and its negation are different measurements ("aerobic" / "anaerobic", "soluble" / "insoluble")
+negation_prefixes = ("an", "non", "in", "un", "im", "ir", "il", "dis", "a")
+antonym_words = [
+    {"min", "max"},
+    {"minimum", "maximum"},
+    {"upper", "lower"},
+    {"initial", "final"},
+    {"before", "after"},
+    {"positive", "negative"},
+    {"high", "low"},
+    {"total", "free"},
+]
+
+
+@define
+class MeasurementMatch:
+    raw_description: str
+    canonical_id: str
+    canonical_name: str
+    # 1 for normalized exact matches
+    score: float
+
+
+@define(frozen=True)
+class NormalizedDescription:
+    # Case, accents, punctuation and whitespace insensitive name - units apart
+    text: str
+    units: frozenset[str]
+
+    def to_key(self) -> str:
+        if not self.units:
+            return self.text
+        return f"{self.text} [{' '.join(sorted(self.units))}]"
+
+
+def parse_measurement_description(description: str) -> NormalizedDescription:
+    normalized = unicodedata.normalize("NFKD", description).replace("µ", "u").replace("μ", "u")
+    normalized = "".join(c for c in normalized if not unicodedata.combining(c)).lower()
+    units = frozenset(
+        unit_aliases.get(unit.replace(" ", ""), unit.replace(" ", "")) for unit in unit_re.findall(normalized)
+    )
+    normalized = unit_re.sub(" ", normalized)
+    return NormalizedDescription(text=" ".join(non_word_re.sub(" ", normalized).split()), units=units)
+
+
+def normalize_measurement_description(description: str) -> str:
+    # Equal for descriptions of the same measurement in the same unit
+    return parse_measurement_description(description).to_key()
+
+
+def is_unit_conflict(units_a: frozenset[str], units_b: frozenset[str]) -> bool:
+    # "Particle size (cm)" / "Particle size (mm)" - a missing unit is not a conflict
+    return bool(units_a) and bool(units_b) and not units_a & units_b
+
+
+def is_negation_pair(word_a: str, word_b: str) -> bool:
+    if {word_a, word_b} in antonym_words:
+        return True
+    shorter, longer = sorted((word_a, word_b), key=len)
+    return any(longer == prefix + shorter for prefix in negation_prefixes)
+
+
+def get_word_variant_ratio(word_a: str, word_b: str) -> float:
+    # 0 unless the words are spelling variants of the same word
+    if min(len(word_a), len(word_b)) < MEASUREMENT_MATCHING_WORD_VARIANT_MIN_LENGTH or is_negation_pair(word_a, word_b):
+        return 0.0
+    ratio = SequenceMatcher(None, word_a, word_b).ratio()
+    return ratio if ratio >= MEASUREMENT_MATCHING_WORD_VARIANT_MIN_RATIO else 0.0
+
+
+def get_token_agreement(words_a: set[str], words_b: set[str]) -> float:
+    # Every word must have its counterpart - the same word or a spelling variant. 0 when a word differs
+    only_a, only_b = sorted(words_a - words_b), sorted(words_b - words_a)
+    if len(only_a) != len(only_b):
+        return 0.0
+    variant_ratios = []
+    for word_a in only_a:
+        best_word_b = max(only_b, key=lambda word_b: get_word_variant_ratio(word_a, word_b))
+        variant_ratio = get_word_variant_ratio(word_a, best_word_b)
+        if not variant_ratio:
+            return 0.0
+        variant_ratios.append(variant_ratio)
+        only_b.remove(best_word_b)
+    return (len(words_a & words_b) + sum(variant_ratios)) / len(words_a)
+
+
+def get_description_similarity(description_a: NormalizedDescription, description_b: NormalizedDescription) -> float:
+    if is_unit_conflict(description_a.units, description_b.units):
+        return 0.0
+    text_a, text_b = description_a.text, description_b.text
+    if text_a == text_b:
+        return 1.0
+    if min(len(text_a), len(text_b)) < MEASUREMENT_MATCHING_FUZZY_MIN_LENGTH:
+        return 0.0
+    # Numbers distinguish measurements ("Vitamin B1" / "Vitamin B12", "D50" / "D90") - never fuzzy matched
+    if digits_re.findall(text_a) != digits_re.findall(text_b):
+        return 0.0
+    # Word order insensitive - "Count, total aerobic" / "Total aerobic count"
+    return get_token_agreement(set(text_a.split()), set(text_b.split()))
+
+
+def get_description_order_similarity(description_a: NormalizedDescription, description_b: NormalizedDescription):
+    # Tie-breaker between canonicals of the same token agreement - closest wording wins
+    return SequenceMatcher(None, description_a.text, description_b.text).ratio()
+
+
+def match_measurement_descriptions(
+    raw_descriptions: list[str], canonical_measurements: list[RequestMeasurement]
+) -> tuple[list[MeasurementMatch], list[str]]:
+    # Returns the locally resolved matches and the unresolved descriptions (In the given order)
+    if not measurement_matching_enabled:
+        return [], list(raw_descriptions)
+
+    normalized_canonicals = [(parse_measurement_description(m.name), m) for m in canonical_measurements]
+    matches: list[MeasurementMatch] = []
+    unresolved: list[str] = []
+    for raw_description in raw_descriptions:
+        normalized_description = parse_measurement_description(raw_description)
+        if not normalized_description.text:
+            unresolved.append(raw_description)
+            continue
+
+        scored_canonicals = sorted(
+            (
+                (
+                    get_description_similarity(normalized_description, normalized_canonical),
+                    get_description_order_similarity(normalized_description, normalized_canonical),
+                    canonical,
+                )
+                for normalized_canonical, canonical in normalized_canonicals
+            ),
+            key=lambda scored: scored[:2],
+            reverse=True,
+        )
+        if not scored_canonicals or scored_canonicals[0][0] < measurement_matching_threshold:
+            unresolved.append(raw_description)
+            continue
+
+        best_score, _, best_canonical = scored_canonicals[0]
+        runner_up = next((scored for scored in scored_canonicals[1:] if scored[2].id != best_canonical.id), None)
+        if runner_up is not None and best_score - runner_up[0] < MEASUREMENT_MATCHING_AMBIGUITY_MARGIN:
+            unresolved.append(raw_description)
+            continue
+
+        matches.append(
+            MeasurementMatch(
+                raw_description=raw_description,
+                canonical_id=best_canonical.id,
+                canonical_name=best_canonical.name,
+                score=best_score,
+            )
+        )
+    return matches, unresolved
@@ -11,7 +11,7 @@ from comprendo.types.consolidated_report import (
     ConsolidatedReport,
 )
 from comprendo.types.extraction_result import ExtractionResult
-from comprendo.types.image_artifact import ImageArtifact
+from comprendo.types.document_artifact import DocumentArtifact
 from comprendo.types.measurement_mapping import (
     MeasurementMappingEntry,
     MeasurementMappingTable,
@@ -81,10 +81,10 @@ def create_mock_consolidated_batch(task) -> ConsolidatedBatch:
     )
 
 
-def create_mock_consolidated_report(task: Task, image_artifacts: list[ImageArtifact]) -> ConsolidatedReport:
+def create_mock_consolidated_report(task: Task, document_artifacts: list[DocumentArtifact]) -> ConsolidatedReport:
     # Imagine each image is a page
     # imagine each page is batch
-    batches_count = random.randint(1, max(len(image_artifacts), 3))
+    batches_count = random.randint(1, max(len(document_artifacts), 3))
     mock_report = ConsolidatedReport(
         order_number=task.request.order_number,
         product_name="mock produce name",
@@ -138,9 +138,9 @@ def generate_extraction_result(
     return ExtractionResult(request_id=task.request.id, consolidated_report=consolidated_report)
 
 
-async def extract(task: Task, image_artifacts: list[ImageArtifact]):
+async def extract(task: Task, document_artifacts: list[DocumentArtifact]):
 
-    consolidated_report: ConsolidatedReport = create_mock_consolidated_report(task, image_artifacts)
+    consolidated_report: ConsolidatedReport = create_mock_consolidated_report(task, document_artifacts)
     mapping_table: MeasurementMappingTable = create_mock_mapping_table(task, consolidated_report)
 
     extraction_result = generate_extraction_result(task, consolidated_report, mapping_table)
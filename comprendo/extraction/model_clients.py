@@ -0,0 +1,185 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from attrs import define
+
+from comprendo.configuration import app_config
+
+logger = logging.getLogger(__name__)
+
+# Shared connection pools of the HTTP based providers (anthropic, openai)
+# Google providers use gRPC channels - HTTP/2 with a channel per client
+model_http2_enabled = app_config.bool("MODEL_HTTP2_ENABLED", True)
+model_http_max_connections = app_config.int("MODEL_HTTP_MAX_CONNECTIONS", 100)
+model_http_max_keepalive_connections = app_config.int("MODEL_HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+model_http_keepalive_expiry_seconds = app_config.float("MODEL_HTTP_KEEPALIVE_EXPIRY_SECONDS", 120)
+model_http_connect_timeout_seconds = app_config.float("MODEL_HTTP_CONNECT_TIMEOUT_SECONDS", 10)
+# Open connections to the enabled model providers on startup - before the first request
+model_clients_warmup_enabled = app_config.bool("MODEL_CLIENTS_WARMUP_ENABLED", False)
+model_clients_warmup_timeout_seconds = app_config.float("MODEL_CLIENTS_WARMUP_TIMEOUT_SECONDS", 10)
+
+# Request timeouts are set per call by the provider SDKs
+MODEL_HTTP_DEFAULT_TIMEOUT_SECONDS = 600
+
+model_provider_base_urls = {
+    "anthropic": app_config.str("ANTHROPIC_API_URL", "https://api.anthropic.com"),
+    "openai": app_config.str("OPENAI_API_BASE", "https://api.openai.com/v1"),
+}
+
+# httpcore trace events which open a connection
+connection_setup_events = {"connection.connect_tcp", "connection.start_tls"}
+
+
+@define
+class ConnectionSetupTiming:
+    seconds: float = 0.0
+    connections: int = 0
+
+
+ctx_connection_setup: ContextVar[ConnectionSetupTiming | None] = ContextVar("connection_setup", default=None)
+
+
+@contextmanager
+def measure_connection_setup():
+    # Connection setup (TCP connect and TLS handshake) time of the model calls made within
+    timing = ConnectionSetupTiming()
+    token = ctx_connection_setup.set(timing)
+    try:
+        yield timing
+    finally:
+        ctx_connection_setup.reset(token)
+
+
+async def add_connection_setup_trace(request: httpx.Request):
+    timing = ctx_connection_setup.get()
+    if timing is None:
+        return
+    started_at: dict[str, float] = {}
+
+    async def trace(event_name: str, info: dict):
+        event, _, phase = event_name.rpartition(".")
+        if event not in connection_setup_events:
+            return
+        if phase == "started":
+            started_at[event] = time.perf_counter()
+        elif phase in ("complete", "failed") and event in started_at:
+            timing.seconds += time.perf_counter() - started_at.pop(event)
+            if event == "connection.connect_tcp":
+                timing.connections += 1
+
+    request.extensions["trace"] = trace
+
+
+def is_http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+_shared_http_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def get_shared_async_http_client(provider: str) -> httpx.AsyncClient:
+    # One keep-alive connection pool per provider - shared by all clients of the provider
+    if provider not in _shared_http_clients:
+        http2 = model_http2_enabled and is_http2_available()
+        if model_http2_enabled and not http2:
+            logger.warning("HTTP/2 requested but the h2 package is not installed - using HTTP/1.1")
+        _shared_http_clients[provider] = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=model_http_max_connections,
+                max_keepalive_connections=model_http_max_keepalive_connections,
+                keepalive_expiry=model_http_keepalive_expiry_seconds,
+            ),
+            timeout=httpx.Timeout(MODEL_HTTP_DEFAULT_TIMEOUT_SECONDS, connect=model_http_connect_timeout_seconds),
+            event_hooks={"request": [add_connection_setup_trace]},
+        )
+        logger.info(f"Created shared HTTP client: provider={provider}, http2={http2}")
+    return _shared_http_clients[provider]
+
+
+async def warmup_http_provider(provider: str):
+    # Any response will do - the connection stays in the pool
+    await get_shared_async_http_client(provider).head(model_provider_base_urls[provider])
+
+
+async def warmup_grpc_client(grpc_client):
+    await grpc_client.transport.grpc_channel.channel_ready()
+
+
+def get_grpc_client(expert_llm):
+    chat_model = getattr(expert_llm, "bound", expert_llm)
+    if hasattr(chat_model, "async_prediction_client"):
+        # ChatVertexAI
+        return chat_model.async_prediction_client
+    # ChatGoogleGenerativeAI - built on first access within the event loop
+    return getattr(chat_model, "async_client", None)
+
+
+async def warmup_step(name: str, warmup_coro):
+    start_time = time.perf_counter()
+    try:
+        await asyncio.wait_for(warmup_coro, timeout=model_clients_warmup_timeout_seconds)
+        logger.info(f"Model client warmed up: client={name}, time={time.perf_counter() - start_time:.2f}s")
+    except Exception as e:
+        logger.warning(f"Model client warmup failed: client={name}, error={e!r}")
+
+
+async def open_model_clients():
+    # Server startup - create the shared connection pools, the model clients only when warming up
+    # Model clients import their provider SDKs - left to the first extraction otherwise (Cold starts)
+    for provider in model_provider_base_urls:
+        get_shared_async_http_client(provider)
+    if not model_clients_warmup_enabled:
+        return
+
+    # Imported here - the client factories use the shared HTTP clients of this module
+    from comprendo.extraction.experts import get_enabled_coa_experts
+    from comprendo.extraction.experts.experts import get_expert_name
+    from comprendo.extraction.rate_limits import get_llm_provider
+    from comprendo.extraction.supervisors.consolidator_gpt4o import get_supervisor_consolidator_llm
+    from comprendo.extraction.supervisors.mapper_gpt4o import get_supervisor_mapper_llm
+
+    start_time = time.perf_counter()
+    try:
+        expert_llms = get_enabled_coa_experts()
+        get_supervisor_consolidator_llm()
+        get_supervisor_mapper_llm()
+    except Exception as e:
+        # Not fatal for startup (Mock mode clients) - the first extraction fails with the same error
+        logger.error(f"Model clients creation failed: error={e!r}")
+        return
+    logger.info(f"Model clients created: time={time.perf_counter() - start_time:.2f}s")
+
+    # Supervisors are OpenAI models
+    http_providers = {"openai"}
+    warmup_steps = []
+    for expert_llm in expert_llms:
+        provider = get_llm_provider(expert_llm)
+        if provider in model_provider_base_urls:
+            http_providers.add(provider)
+            continue
+        grpc_client = get_grpc_client(expert_llm)
+        if grpc_client is not None:
+            warmup_steps.append(warmup_step(get_expert_name(expert_llm), warmup_grpc_client(grpc_client)))
+    warmup_steps += [warmup_step(provider, warmup_http_provider(provider)) for provider in sorted(http_providers)]
+    await asyncio.gather(*warmup_steps)
+    logger.info(f"Model clients warmup done: time={time.perf_counter() - start_time:.2f}s")
+
+
+async def close_model_clients():
+    from comprendo.extraction.experts import get_enabled_coa_experts
+    from comprendo.extraction.supervisors.consolidator_gpt4o import get_supervisor_consolidator_llm
+    from comprendo.extraction.supervisors.mapper_gpt4o import get_supervisor_mapper_llm
+
+    # Model clients refer to the closed pools - created again on next use
+    get_enabled_coa_experts.cache_clear()
+    get_supervisor_consolidator_llm.cache_clear()
+    get_supervisor_mapper_llm.cache_clear()
+    http_clients = list(_shared_http_clients.values())
+    _shared_http_clients.clear()
+    await asyncio.gather(*[http_client.aclose() for http_client in http_clients], return_exceptions=True)
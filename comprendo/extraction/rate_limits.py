@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Callable
+
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.runnables import Runnable
+
+from comprendo.configuration import app_config
+from comprendo.extraction.cassettes import model_cassette
+from comprendo.extraction.model_clients import measure_connection_setup
+from comprendo.telemetry import record_model_queue_wait, record_model_tokens
+
+logger = logging.getLogger(__name__)
+
+# Limits per provider ("anthropic") or per provider model ("anthropic/claude-3-7-sonnet-20250219")
+# Example: {"anthropic": {"concurrency": 4, "rpm": 50, "tpm": 40000}, "openai/gpt-4o": {"concurrency": 8}}
+llm_limits_config: dict = app_config.json("LLM_LIMITS", {})
+# Attempts per call - the SDK clients do not retry (max_retries=0), retries wait for the limits here
+llm_rate_limit_max_attempts = app_config.int("LLM_RATE_LIMIT_MAX_ATTEMPTS", 3)
+# Used when a rate limited response carries no Retry-After
+llm_rate_limit_default_backoff_seconds = app_config.float("LLM_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS", 5)
+llm_rate_limit_max_backoff_seconds = app_config.float("LLM_RATE_LIMIT_MAX_BACKOFF_SECONDS", 60)
+# First wait after a transient error (5xx, timeout, connection error) - doubled per attempt, this caller only
+llm_transient_error_backoff_seconds = app_config.float("LLM_TRANSIENT_ERROR_BACKOFF_SECONDS", 1)
+
+# Rough estimates - used to debit the tokens-per-minute bucket before the actual usage is known
+CHARS_PER_TOKEN = 4
+ESTIMATED_TOKENS_PER_IMAGE = 1600
+
+
+def get_llm_provider(llm: Runnable) -> str:
+    provider = llm.config.get("provider", None)
+    if provider:
+        return provider
+    model: str = llm.config["model"]
+    if model.startswith("claude"):
+        return "anthropic"
+    if model.startswith("gemini"):
+        return "google"
+    return "openai"
+
+
+def estimate_prompt_tokens(prompt: list[BaseMessage]) -> int:
+    chars = 0
+    images = 0
+    for message in prompt:
+        if isinstance(message.content, str):
+            chars += len(message.content)
+            continue
+        for block in message.content:
+            if isinstance(block, str):
+                chars += len(block)
+            elif block.get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(block.get("text", ""))
+    return chars // CHARS_PER_TOKEN + images * ESTIMATED_TOKENS_PER_IMAGE
+
+
+def get_response_total_tokens(response: AIMessage | dict) -> int | None:
+    # Structured output runnables return {"raw": AIMessage, "parsed": ...}
+    message = response.get("raw") if isinstance(response, dict) else response
+    usage_metadata = getattr(message, "usage_metadata", None)
+    if not usage_metadata:
+        return None
+    return usage_metadata["input_tokens"] + usage_metadata["output_tokens"]
+
+
+def get_retry_after_seconds(error: Exception) -> float | None:
+    # None when the error is not a rate limit error
+    status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status_code != 429:
+        return None
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        # HTTP date form - not used by the providers
+        pass
+    return llm_rate_limit_default_backoff_seconds
+
+
+def is_transient_error(error: Exception) -> bool:
+    # Errors the SDK clients would have retried - server errors, timeouts and connection errors
+    status_code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status_code, int):
+        return status_code >= 500 or status_code in (408, 409)
+    # SDK errors are matched by name - the provider SDKs are imported on first use only
+    return isinstance(error, (httpx.TransportError, TimeoutError)) or type(error).__name__ in (
+        "APIConnectionError",
+        "APITimeoutError",
+    )
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.refill_per_second = per_minute / 60
+        self.available = float(per_minute)
+        self.updated_at = time.monotonic()
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Asyncio primitives are bound to a single loop (e.g. repeated asyncio.run calls in the CLI / benchmarks)
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    async def acquire(self, amount: int):
+        # Amounts above the capacity are allowed once the bucket is full - they are never satisfiable otherwise
+        amount = min(amount, self.capacity)
+        async with self._get_lock():
+            self._refill()
+            while self.available < amount:
+                await asyncio.sleep((amount - self.available) / self.refill_per_second)
+                self._refill()
+            self.available -= amount
+
+    def adjust(self, amount: int):
+        # Correct an estimate once the actual usage is known (May go negative - delaying the next callers)
+        self._refill()
+        self.available = min(self.capacity, self.available - amount)
+
+
+class LimitScope:
+    def __init__(self, name: str, concurrency: int | None = None, rpm: int | None = None, tpm: int | None = None):
+        self.name = name
+        self.concurrency = concurrency
+        self._semaphore: asyncio.Semaphore | None = None
+        self._semaphore_loop: asyncio.AbstractEventLoop | None = None
+        self.requests_bucket = TokenBucket(rpm) if rpm else None
+        self.tokens_bucket = TokenBucket(tpm) if tpm else None
+        self.blocked_until = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore | None:
+        # Bound to a single loop, as the bucket locks
+        if not self.concurrency:
+            return None
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def block_for(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def wait_unblocked(self):
+        while (remaining := self.blocked_until - time.monotonic()) > 0:
+            await asyncio.sleep(remaining)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        await self.wait_unblocked()
+        semaphore = self._get_semaphore()
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            if self.requests_bucket is not None:
+                await self.requests_bucket.acquire(1)
+            if self.tokens_bucket is not None:
+                await self.tokens_bucket.acquire(estimated_tokens)
+            yield
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+
+class LLMLimiter:
+    def __init__(self, limits_config: dict):
+        self.limits_config = limits_config
+        self._scopes: dict[str, LimitScope] = {}
+
+    def get_scope(self, name: str) -> LimitScope:
+        if name not in self._scopes:
+            self._scopes[name] = LimitScope(name, **self.limits_config.get(name, {}))
+        return self._scopes[name]
+
+    def get_scopes(self, provider: str, model: str) -> list[LimitScope]:
+        # Provider first - the same acquire order everywhere avoids deadlocks
+        return [self.get_scope(provider), self.get_scope(f"{provider}/{model}")]
+
+    @asynccontextmanager
+    async def slot(self, provider: str, model: str, estimated_tokens: int):
+        provider_scope, model_scope = self.get_scopes(provider, model)
+        async with provider_scope.slot(estimated_tokens):
+            async with model_scope.slot(estimated_tokens):
+                yield
+
+    def block_for(self, provider: str, model: str, seconds: float):
+        for scope in self.get_scopes(provider, model):
+            scope.block_for(seconds)
+
+    def adjust_tokens(self, provider: str, model: str, amount: int):
+        for scope in self.get_scopes(provider, model):
+            if scope.tokens_bucket is not None:
+                scope.tokens_bucket.adjust(amount)
+
+
+llm_limiter = LLMLimiter(llm_limits_config)
+
+
+def get_message_content_text(content: str | list) -> str:
+    # Streamed content may be a list of content blocks (Anthropic)
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in content
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+async def astream_message(llm: Runnable, prompt: list[BaseMessage], on_delta: Callable[[str], None]) -> AIMessage:
+    # Same response as ainvoke - text deltas are reported as they arrive
+    message: AIMessageChunk | None = None
+    async for chunk in llm.astream(prompt):
+        message = chunk if message is None else message + chunk
+        if delta_text := get_message_content_text(chunk.content):
+            on_delta(delta_text)
+    if message is None:
+        raise ValueError(f"Model stream returned no content: model={llm.config['model']}")
+    return AIMessage(
+        content=get_message_content_text(message.content),
+        id=message.id,
+        response_metadata=message.response_metadata,
+        usage_metadata=message.usage_metadata,
+    )
+
+
+async def invoke_model(llm: Runnable, prompt: list[BaseMessage], on_delta: Callable[[str], None] | None):
+    if on_delta is not None:
+        return await astream_message(llm, prompt, on_delta)
+    return await llm.ainvoke(prompt)
+
+
+async def limited_ainvoke(
+    llm: Runnable, prompt: list[BaseMessage], stage: str, on_delta: Callable[[str], None] | None = None
+):
+    # All model calls go through here - shared concurrency and rate limits per provider and model
+    # With on_delta the (chat) model response is streamed
+    provider = get_llm_provider(llm)
+    model = llm.config["model"]
+    estimated_tokens = estimate_prompt_tokens(prompt)
+
+    delta_reported = False
+
+    def report_delta(text: str):
+        nonlocal delta_reported
+        delta_reported = True
+        on_delta(text)
+
+    call_on_delta = report_delta if on_delta is not None else None
+
+    total_queue_wait = 0.0
+    for attempt in range(1, llm_rate_limit_max_attempts + 1):
+        retry_delay = 0.0
+        wait_start_time = time.time()
+        async with llm_limiter.slot(provider, model, estimated_tokens):
+            queue_wait = time.time() - wait_start_time
+            total_queue_wait += queue_wait
+            try:
+                with measure_connection_setup() as connection_setup:
+                    if model_cassette is not None:
+                        # Recorded (or replayed instead of calling the provider) - see MODEL_CASSETTE_MODE
+                        response = await model_cassette.ainvoke(
+                            stage,
+                            provider,
+                            model,
+                            prompt,
+                            lambda: invoke_model(llm, prompt, call_on_delta),
+                            call_on_delta,
+                        )
+                    else:
+                        response = await invoke_model(llm, prompt, call_on_delta)
+                break
+            except Exception as e:
+                # Reported deltas can not be taken back - a retry would report them again
+                if attempt == llm_rate_limit_max_attempts or delta_reported:
+                    raise
+                retry_after = get_retry_after_seconds(e)
+                if retry_after is not None:
+                    retry_after = min(retry_after, llm_rate_limit_max_backoff_seconds)
+                    # Every caller of this provider / model waits - not just this one
+                    llm_limiter.block_for(provider, model, retry_after)
+                    logger.warning(
+                        f"Rate limited: stage={stage}, model={model}, provider={provider}, attempt={attempt}, "
+                        f"retry_after={retry_after:.2f}s"
+                    )
+                elif is_transient_error(e):
+                    retry_delay = min(
+                        llm_transient_error_backoff_seconds * 2 ** (attempt - 1), llm_rate_limit_max_backoff_seconds
+                    )
+                    logger.warning(
+                        f"Model call failed, retrying: stage={stage}, model={model}, provider={provider}, "
+                        f"attempt={attempt}, retry_delay={retry_delay:.2f}s, error={e!r}"
+                    )
+                else:
+                    raise
+        # Outside of the slot - other callers may use it meanwhile
+        await asyncio.sleep(retry_delay)
+
+    record_model_queue_wait(stage, provider, model, total_queue_wait)
+    record_model_tokens(stage, provider, model, response)
+    actual_tokens = get_response_total_tokens(response)
+    if actual_tokens is not None:
+        llm_limiter.adjust_tokens(provider, model, actual_tokens - estimated_tokens)
+
+    # Connections opened by the call (TCP connect and TLS) - 0 when a pooled connection was reused
+    logger.info(
+        f"Model call timing: stage={stage}, model={model}, provider={provider}, queue_wait={total_queue_wait:.2f}s, "
+        f"connection_setup={connection_setup.seconds:.2f}s, new_connections={connection_setup.connections}",
+        extra={
+            "stage": stage,
+            "model": model,
+            "provider": provider,
+            "queue_wait": total_queue_wait,
+            "connection_setup": connection_setup.seconds,
+        },
+    )
+    return response
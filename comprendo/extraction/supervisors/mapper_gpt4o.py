@@ -1,12 +1,29 @@
-from langchain_openai import ChatOpenAI
+import functools
 
+from langchain_core.runnables import Runnable
+
+from comprendo.extraction.model_clients import get_shared_async_http_client
 from comprendo.types.measurement_mapping import MeasurementMappingTable
 
 supervisor_mapper_model_name = "gpt-4o"
-supervisor_mapper_llm = (
-    ChatOpenAI(
-        model=supervisor_mapper_model_name, temperature=0, max_tokens=None, timeout=None, max_retries=2, streaming=False
+
+
+@functools.cache
+def get_supervisor_mapper_llm() -> Runnable:
+    # Imported on first use - the OpenAI SDK is slow to import
+    from langchain_openai import ChatOpenAI
+
+    return (
+        ChatOpenAI(
+            model=supervisor_mapper_model_name,
+            temperature=0,
+            max_tokens=None,
+            timeout=None,
+            # Retried by the model call limiter - within the shared limits
+            max_retries=0,
+            streaming=False,
+            http_async_client=get_shared_async_http_client("openai"),
+        )
+        .with_structured_output(MeasurementMappingTable, method="json_schema", include_raw=True)
+        .with_config({"run_name": "supervisor_mapper", "model": supervisor_mapper_model_name})
     )
-    .with_structured_output(MeasurementMappingTable, method="json_schema", include_raw=True)
-    .with_config({"run_name": "supervisor_mapper", "model": supervisor_mapper_model_name})
-)
@@ -1,37 +1,36 @@
+import asyncio
 import json
 import logging
-import pathlib
 import time
 from typing import Optional
 
 from langchain_core.load import dumps
 from langchain_core.messages import AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
-from langchain_openai import ChatOpenAI
 
-from comprendo.caching.cache import SimpleFileCache
-from comprendo.extraction.caching import get_namespace_cache_dir
+from comprendo.extraction.caching import (
+    get_cached_stage_output,
+    get_stage_cache_key,
+    put_cached_stage_output,
+)
 from comprendo.extraction.cost import usage_metadata_to_cost
+from comprendo.extraction.mapping_memory import mapping_memory
+from comprendo.extraction.measurement_matching import match_measurement_descriptions
+from comprendo.extraction.rate_limits import get_llm_provider, limited_ainvoke
+from comprendo.log_payloads import format_log_payload
+from comprendo.telemetry import record_model_cost
 from comprendo.types.consolidated_report import ConsolidatedReport
 from comprendo.types.measurement_mapping import (
     MeasurementMappingEntry,
     MeasurementMappingTable,
 )
-from comprendo.extraction.supervisors.consolidator_gpt4o import supervisor_consolidator_llm
-from comprendo.extraction.supervisors.mapper_gpt4o import supervisor_mapper_llm
+from comprendo.extraction.supervisors.consolidator_gpt4o import get_supervisor_consolidator_llm
+from comprendo.extraction.supervisors.mapper_gpt4o import get_supervisor_mapper_llm
 from comprendo.types.task import Task
 
 logger = logging.getLogger(__name__)
 
 
-def get_supervisor_consolidation_cache_dir(task: Task) -> pathlib.Path:
-    return get_namespace_cache_dir(task, "supervisor_consolidation")
-
-
-def get_supervisor_mapping_cache_dir(task: Task) -> pathlib.Path:
-    return get_namespace_cache_dir(task, "supervisor_mapping")
-
-
 supervisor_system_prompt = "You are an inspection analysis process supervisor"
 supervisor_consolidation_query_prompt = """Here are the same inspection results of multiple batches / materials by independent experts:
 
@@ -54,6 +53,7 @@ supervisor_consolidation_prompt_template = ChatPromptTemplate(
     ]
 )
 
+supervisor_consolidation_cache_namespace = "supervisor_consolidation"
 supervisor_consolidation_cache_context = [
     "1",
     supervisor_system_prompt,
@@ -65,15 +65,20 @@ expert_input_template = PromptTemplate.from_template("# Expert {expert_id}\n\n{e
 
 
 async def supervisor_consolidation(task: Task, expert_results: list[str]) -> ConsolidatedReport:
+    supervisor_consolidator_llm = get_supervisor_consolidator_llm()
     logger.info(
         f"Consolidating {len(expert_results)} expert results: model={supervisor_consolidator_llm.config['model']}"
     )
-    cache = SimpleFileCache(get_supervisor_consolidation_cache_dir(task), supervisor_consolidation_cache_context)
-    cache_key = "supervisor"
-    supervisor_cached_response = cache.get(cache_key)
+    cache_key = get_stage_cache_key(
+        supervisor_consolidation_cache_namespace,
+        *supervisor_consolidation_cache_context,
+        supervisor_consolidator_llm.config["model"],
+        *expert_results,
+    )
+    supervisor_cached_response = await get_cached_stage_output(supervisor_consolidation_cache_namespace, cache_key)
     if supervisor_cached_response:
         logger.info(
-            f"Using cached supervisor consolidation response: model={supervisor_consolidator_llm.config['model']}, payload={supervisor_cached_response}"
+            f"Using cached supervisor consolidation response: model={supervisor_consolidator_llm.config['model']}, payload={format_log_payload(lambda: supervisor_cached_response)}"
         )
         output_as_json = supervisor_cached_response
         return ConsolidatedReport.model_validate_json(output_as_json)
@@ -87,11 +92,11 @@ async def supervisor_consolidation(task: Task, expert_results: list[str]) -> Con
     )
 
     logger.info(
-        f"Invoking supervisor consolidator with prompt: model={supervisor_consolidator_llm.config['model']}, payload={dumps(prompt)}"
+        f"Invoking supervisor consolidator with prompt: model={supervisor_consolidator_llm.config['model']}, payload={format_log_payload(lambda: dumps(prompt))}"
     )
 
     invoke_start_time = time.time()
-    full_response: dict = await supervisor_consolidator_llm.ainvoke(prompt)
+    full_response: dict = await limited_ainvoke(supervisor_consolidator_llm, prompt, stage="supervisor_consolidation")
     invoke_total_time = time.time() - invoke_start_time
 
     response: ConsolidatedReport = full_response["parsed"]
@@ -109,15 +114,16 @@ async def supervisor_consolidation(task: Task, expert_results: list[str]) -> Con
     )
     cost = usage_metadata_to_cost(supervisor_consolidator_llm.config["model"], usage_metadata)
     task.cost += cost
+    record_model_cost("supervisor_consolidation", get_llm_provider(supervisor_consolidator_llm), supervisor_consolidator_llm.config["model"], cost)
     logger.info(
         f"Supervisor consolidation cost: model={supervisor_consolidator_llm.config['model']}, cost={cost:.7f}",
         extra={"model": supervisor_consolidator_llm.config["model"]},
     )
 
     response_as_json_dump = response.model_dump_json()
-    cache.put(cache_key, response_as_json_dump)
+    await put_cached_stage_output(cache_key, response_as_json_dump)
     logger.info(
-        f"Supervisor consolidation response: model={supervisor_consolidator_llm.config['model']}, payload={response_as_json_dump}, time={invoke_total_time:.2f}s",
+        f"Supervisor consolidation response: model={supervisor_consolidator_llm.config['model']}, payload={format_log_payload(lambda: response_as_json_dump)}, time={invoke_total_time:.2f}s",
         extra={"time": invoke_total_time, "model": supervisor_consolidator_llm.config["model"]},
     )
 
@@ -144,38 +150,47 @@ supervisor_measurement_mapping_prompt_template = ChatPromptTemplate(
     [SystemMessage(content=supervisor_system_prompt), supervisor_measurement_mapping_query_prompt]
 )
 
+supervisor_mapping_cache_namespace = "supervisor_mapping"
 supervisor_mapping_cache_context = [
-    "1",
+    "2",
     supervisor_system_prompt,
     supervisor_measurement_mapping_query_prompt,
     json.dumps(MeasurementMappingTable.model_json_schema()),
 ]
 
 
-async def supervisor_mapping(task: Task, consolidated_report: ConsolidatedReport) -> MeasurementMappingTable:
-    logger.info(f"Invoking supervisor mapping of consolidated report: model={supervisor_mapper_llm.config['model']}")
-    cache = SimpleFileCache(get_supervisor_mapping_cache_dir(task), supervisor_mapping_cache_context)
-    cache_key = "supervisor"
-    supervisor_cached_response = cache.get(cache_key)
+async def supervisor_mapping_llm(task: Task, raw_descs: list[str]) -> MeasurementMappingTable:
+    supervisor_mapper_llm = get_supervisor_mapper_llm()
+    logger.info(
+        f"Invoking supervisor mapping of {len(raw_descs)} descriptions: model={supervisor_mapper_llm.config['model']}"
+    )
+    canonical_measurements_spec_rows = "\n".join([f"{m.id}: {m.name}" for m in task.request.measurements])
+    raw_descs_str = "\n".join(raw_descs)
+
+    cache_key = get_stage_cache_key(
+        supervisor_mapping_cache_namespace,
+        *supervisor_mapping_cache_context,
+        supervisor_mapper_llm.config["model"],
+        raw_descs_str,
+        canonical_measurements_spec_rows,
+    )
+    supervisor_cached_response = await get_cached_stage_output(supervisor_mapping_cache_namespace, cache_key)
     if supervisor_cached_response:
         output_as_json = supervisor_cached_response
         return MeasurementMappingTable.model_validate_json(output_as_json)
 
-    canonical_measurements_spec_rows = "\n".join([f"{m.id}: {m.name}" for m in task.request.measurements])
-
-    # Gather all raw measurement descriptions from the report
-    raw_descs = list(set([r.description for b in consolidated_report.batches for r in b.results]))
-    raw_descs_str = "\n".join(raw_descs)
-
     prompt = supervisor_measurement_mapping_prompt_template.format_messages(
         raw_measurement_descriptions=raw_descs_str,
         canonical_measurement_list=canonical_measurements_spec_rows,
     )
 
-    logger.info(f"Supervisor mapping prompt: model={supervisor_mapper_llm.config['model']}, payload={dumps(prompt)}")
+    logger.info(
+        f"Supervisor mapping prompt: model={supervisor_mapper_llm.config['model']}, "
+        f"payload={format_log_payload(lambda: dumps(prompt))}"
+    )
 
     invoke_start_time = time.time()
-    full_response: dict = await supervisor_mapper_llm.ainvoke(prompt)
+    full_response: dict = await limited_ainvoke(supervisor_mapper_llm, prompt, stage="supervisor_mapping")
     invoke_total_time = time.time() - invoke_start_time
 
     response: MeasurementMappingTable = full_response["parsed"]
@@ -193,20 +208,76 @@ async def supervisor_mapping(task: Task, consolidated_report: ConsolidatedReport
     )
     cost = usage_metadata_to_cost(supervisor_mapper_llm.config["model"], usage_metadata)
     task.cost += cost
+    record_model_cost("supervisor_mapping", get_llm_provider(supervisor_mapper_llm), supervisor_mapper_llm.config["model"], cost)
     logger.info(
         f"Supervisor mapping cost: model={supervisor_mapper_llm.config['model']}, cost={cost:.7f}",
         {"model": {supervisor_mapper_llm.config["model"]}},
     )
 
     logger.info(
-        f"Supervisor mapping llm response: model={supervisor_mapper_llm.config['model']}, payload={response.model_dump_json()}, time={invoke_total_time:.2f}s",
+        f"Supervisor mapping llm response: model={supervisor_mapper_llm.config['model']}, payload={format_log_payload(lambda: response.model_dump_json())}, time={invoke_total_time:.2f}s",
         extra={"time": invoke_total_time, "model": supervisor_mapper_llm.config["model"]},
     )
 
+    response_as_json_dump = response.model_dump_json()
+    await put_cached_stage_output(cache_key, response_as_json_dump)
+
+    if mapping_memory is not None:
+        # Fresh model answers only - a cached answer replays an earlier request and confirms nothing
+        await asyncio.to_thread(
+            mapping_memory.remember,
+            task.client_id or "default",
+            {e.raw_description: e.mapped_to_canonical_id for e in response.entries},
+            task.request.measurements,
+        )
+    return response
+
+
+async def supervisor_mapping(task: Task, consolidated_report: ConsolidatedReport) -> MeasurementMappingTable:
+    # Gather all raw measurement descriptions from the report
+    raw_descs = [r.description for b in consolidated_report.batches for r in b.results]
+    return await supervisor_mapping_descriptions(task, raw_descs)
+
+
+async def supervisor_mapping_descriptions(task: Task, raw_descs: list[str]) -> MeasurementMappingTable:
+    # Sorted - so the same descriptions always produce the same prompt (and cache key)
+    raw_descs = sorted(set(raw_descs))
+
+    # Descriptions mapped on earlier requests of this client
+    client_id = task.client_id or "default"
+    remembered_mappings = {}
+    if mapping_memory is not None:
+        remembered_mappings = await asyncio.to_thread(
+            mapping_memory.recall, client_id, raw_descs, task.request.measurements
+        )
+        logger.info(f"Measurement descriptions recalled from mapping memory: recalled={len(remembered_mappings)}")
+    entries = [
+        MeasurementMappingEntry(raw_description=raw_desc, mapped_to_canonical_id=canonical_id)
+        for raw_desc, canonical_id in remembered_mappings.items()
+    ]
+    raw_descs = [raw_desc for raw_desc in raw_descs if raw_desc not in remembered_mappings]
+
+    # Exact / near matches of the canonical names are resolved locally - only the rest need the LLM
+    local_matches, unresolved_descs = match_measurement_descriptions(raw_descs, task.request.measurements)
+    logger.info(
+        f"Measurement descriptions matched locally: matched={len(local_matches)}, unresolved={len(unresolved_descs)}, "
+        f"payload={[(m.raw_description, m.canonical_id, round(m.score, 3)) for m in local_matches]}"
+    )
+    entries += [
+        MeasurementMappingEntry(raw_description=m.raw_description, mapped_to_canonical_id=m.canonical_id)
+        for m in local_matches
+    ]
+    if unresolved_descs:
+        # Only the model mappings are worth remembering - local matches are recomputed cheaply
+        llm_mapping_table = await supervisor_mapping_llm(task, unresolved_descs)
+        entries += llm_mapping_table.entries
+    else:
+        logger.info("All measurement descriptions matched locally - skipping supervisor mapping llm")
+
     # Add to the table the canonicals as well.
     # If the report contains verbatim canonical descriptions
     # We need to set the proper id on them as well
-    response.entries = response.entries + [
+    entries += [
         MeasurementMappingEntry(
             raw_description=m.name,
             mapped_to_canonical_id=m.id,
@@ -216,11 +287,8 @@ async def supervisor_mapping(task: Task, consolidated_report: ConsolidatedReport
 
     # Remove entries which do not map to a valid id
     valid_canonical_ids = set(m.id for m in task.request.measurements)
-    response.entries = [e for e in response.entries if e.mapped_to_canonical_id in valid_canonical_ids]
-
-    response_as_json_dump = response.model_dump_json()
-    cache.put(cache_key, response_as_json_dump)
-    logger.info(
-        f"Supervisor mapping final result: model={supervisor_mapper_llm.config['model']}, payload={response_as_json_dump}"
+    mapping_table = MeasurementMappingTable(
+        entries=[e for e in entries if e.mapped_to_canonical_id in valid_canonical_ids]
     )
-    return response
+    logger.info(f"Supervisor mapping final result: payload={format_log_payload(lambda: mapping_table.model_dump_json())}")
+    return mapping_table
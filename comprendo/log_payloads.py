@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import logging
+import os
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from comprendo.app_logging import ctx_task
+from comprendo.configuration import app_config
+
+logger = logging.getLogger(__name__)
+
+# How large payloads (requests, model prompts and outputs, results) are logged - full / truncate / blob
+log_payload_mode = app_config.str("LOG_PAYLOAD_MODE", "full")
+# Longer payloads are cut (truncate) or moved to the blob store with a reference in the log line (blob)
+log_payload_max_chars = app_config.int("LOG_PAYLOAD_MAX_CHARS", 2000)
+# Share of requests logging payloads - by request id, so a request logs all its payloads or none
+log_payload_sample_rate = app_config.float("LOG_PAYLOAD_SAMPLE_RATE", 1.0)
+log_payload_blob_dir = app_config.str("LOG_PAYLOAD_BLOB_DIR", "log_payloads")
+
+
+class PayloadBlobStore:
+    # Content addressed and gzip compressed - a payload logged many times (same prompt) is stored once
+    def __init__(self, blob_dir: str):
+        self.blob_dir = Path(blob_dir)
+        # Written off the caller thread, in order
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-payload-blobs")
+
+    def get_blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / f"{digest}.gz"
+
+    def _write(self, digest: str, payload: str) -> None:
+        blob_path = self.get_blob_path(digest)
+        if blob_path.exists():
+            return
+        os.makedirs(blob_path.parent, exist_ok=True)
+        temp_path = blob_path.with_suffix(f".{os.getpid()}.tmp")
+        # Fastest level - about the ratio of the default on prompts and reports, at a third of the CPU time
+        temp_path.write_bytes(gzip.compress(payload.encode("utf-8"), compresslevel=1))
+        os.replace(temp_path, blob_path)
+
+    def _on_written(self, future: Future) -> None:
+        if future.exception() is not None:
+            logger.warning(f"Log payload blob not written: error={future.exception()!r}")
+
+    def put(self, payload: str) -> str:
+        digest = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+        self._writer.submit(self._write, digest, payload).add_done_callback(self._on_written)
+        return digest
+
+
+def create_payload_blob_store() -> PayloadBlobStore | None:
+    if log_payload_mode not in ("full", "truncate", "blob"):
+        raise ValueError(f"Invalid LOG_PAYLOAD_MODE: {log_payload_mode}")
+    if log_payload_mode != "blob":
+        return None
+    return PayloadBlobStore(log_payload_blob_dir)
+
+
+payload_blob_store = create_payload_blob_store()
+
+
+def is_payload_sampled() -> bool:
+    if log_payload_sample_rate >= 1:
+        return True
+    task = ctx_task.get(None)
+    request_id = task.request.id if task else ""
+    return zlib.crc32(request_id.encode("utf-8")) / 2**32 < log_payload_sample_rate
+
+
+def format_log_payload(get_payload: Callable[[], str]) -> str:
+    # The log line text of a payload - a callable, so the serialization is skipped when the payload is not logged
+    if not is_payload_sampled():
+        return "<not sampled>"
+    payload = get_payload()
+    if log_payload_mode == "full" or len(payload) <= log_payload_max_chars:
+        return payload
+    if log_payload_mode == "blob":
+        return f"<blob sha256={payload_blob_store.put(payload)} chars={len(payload)}>"
+    return f"{payload[:log_payload_max_chars]}...<truncated chars={len(payload)}>"
@@ -2,13 +2,14 @@ import logging
 import os
 from logging.handlers import RotatingFileHandler
 
-from azure.monitor.opentelemetry import configure_azure_monitor
-
 from comprendo.configuration import app_config
 
 # Configure Azure Monitor if connection string is provided
 if app_config.str("APPLICATIONINSIGHTS_CONNECTION_STRING", None):
     print("Configuring Azure Monitor")
+    # Imported only when configured - the Azure Monitor distro is slow to import
+    from azure.monitor.opentelemetry import configure_azure_monitor
+
     configure_azure_monitor(logger_name="comprendo")
 
 # Configure file logging if LOG_TO_FOLDER is provided
@@ -38,6 +39,6 @@ if log_folder and log_folder.strip():
     from comprendo.app_logging import ContextFilter
     file_handler.addFilter(ContextFilter())
     
-    # Add the handler to the logger
+    # Add the handler to the logger - init_logging moves it (and the Azure Monitor handler) behind the logging queue
     logger = logging.getLogger("comprendo")
     logger.addHandler(file_handler)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+from pathlib import Path
+
+from comprendo.caching.cache import ContentAddressedCache, content_hash, get_cache_dir
+from comprendo.configuration import app_config
+from comprendo.types.image_artifact import ImageArtifact
+
+
+raster_cache_enabled = app_config.bool("RASTER_CACHE_ENABLED", True)
+raster_cache_dir = app_config.str("RASTER_CACHE_DIR", "raster_cache")
+raster_cache_max_mb = app_config.int("RASTER_CACHE_MAX_MB", 1024)
+
+# Rendered pages are keyed by the PDF content hash - repeat uploads of the same document skip poppler
+raster_cache = (
+    ContentAddressedCache(
+        get_cache_dir(raster_cache_dir), max_size_bytes=raster_cache_max_mb * 1024 * 1024
+    )
+    if raster_cache_enabled
+    else None
+)
+
+raster_cache_namespace = "raster"
+raster_cache_version = "1"
+hash_read_chunk_size = 1024 * 1024
+
+
+def hash_document_file(document_location: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(document_location, "rb") as f:
+        while chunk := f.read(hash_read_chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def get_raster_cache_key(document_hash: str, dpi: int, fmt: str) -> str:
+    return content_hash(raster_cache_namespace, raster_cache_version, document_hash, str(dpi), fmt)
+
+
+def get_raster_page_cache_key(document_cache_key: str, page_idx: int) -> str:
+    return content_hash(document_cache_key, str(page_idx))
+
+
+def load_cached_pdf_images(document_hash: str, dpi: int, fmt: str) -> list[ImageArtifact]:
+    if raster_cache is None:
+        return []
+
+    document_cache_key = get_raster_cache_key(document_hash, dpi, fmt)
+    manifest = raster_cache.get(document_cache_key, namespace=raster_cache_namespace)
+    if manifest is None:
+        return []
+
+    result_images: list[ImageArtifact] = []
+    for page_idx, page in enumerate(json.loads(manifest)["pages"]):
+        page_content = raster_cache.get_bytes(
+            get_raster_page_cache_key(document_cache_key, page_idx), namespace=f"{raster_cache_namespace}_page"
+        )
+        if page_content is None:
+            # A page was evicted - the document is rendered again
+            return []
+        result_images.append(
+            ImageArtifact(
+                page_content, format=page["format"], width=page["width"], height=page["height"], dpi=page.get("dpi")
+            )
+        )
+    return result_images
+
+
+def store_cached_pdf_images(document_hash: str, dpi: int, fmt: str, image_artifacts: list[ImageArtifact]) -> None:
+    if raster_cache is None:
+        return
+
+    document_cache_key = get_raster_cache_key(document_hash, dpi, fmt)
+    # Pages first - the manifest marks the document as complete
+    for page_idx, image_artifact in enumerate(image_artifacts):
+        raster_cache.put_bytes(get_raster_page_cache_key(document_cache_key, page_idx), image_artifact.to_bytes())
+    manifest = {
+        "pages": [
+            {
+                "format": image_artifact.format,
+                "width": image_artifact.width,
+                "height": image_artifact.height,
+                "dpi": image_artifact.dpi,
+            }
+            for image_artifact in image_artifacts
+        ]
+    }
+    raster_cache.put(document_cache_key, json.dumps(manifest))
+
+
+def get_raster_cache_stats() -> dict:
+    if raster_cache is None:
+        return {}
+    return raster_cache.stats()
@@ -1,24 +1,47 @@
 from io import BytesIO
+import logging
 import os
+import subprocess
+import tempfile
 from pathlib import Path
 
 import magic
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from PIL import Image
 
 from comprendo.configuration import app_config
+from comprendo.preprocess.caching import hash_document_file, load_cached_pdf_images, store_cached_pdf_images
+from comprendo.telemetry import stage_span
 from comprendo.types.image_artifact import ImageArtifact
 
 
+logger = logging.getLogger(__name__)
+
 disable_pdf_to_image = app_config.bool("DISABLE_PDF_TO_IMAGE", False)
+rasterize_dpi = app_config.int("RASTERIZE_DPI", 200)
+rasterize_format = "png"
+# Scanned pages (a single full page image) are sent as the embedded image instead of a rendering
+pdf_embedded_scans_enabled = app_config.bool("PDF_EMBEDDED_SCANS_ENABLED", True)
+# Embedded scans and renderings differ - they are cached separately
+raster_cache_format = f"{rasterize_format}+scans" if pdf_embedded_scans_enabled else rasterize_format
+
+# Embedded image encodings (pdfimages -list) and how they are extracted:
+# all - written as stored (jpeg as is, flate images as png)
+# png - decoded by pdfimages to png (Fax / JBIG2 bi-level scans)
+# JPEG 2000 is not accepted by the models - such pages are rendered
+embedded_scan_extract_modes = {"jpeg": "all", "image": "all", "ccitt": "png", "jbig2": "png"}
+embedded_scan_formats = {".jpg": "jpeg", ".png": "png"}
+# Share of the page an image must cover to count as a scan of the page
+embedded_scan_min_page_coverage = 0.9
 
 
 def detect_file_type(file_path: Path):
-    # Create a magic object
-    mime = magic.Magic(mime=True)
+    with stage_span("mime_detection"):
+        # Create a magic object
+        mime = magic.Magic(mime=True)
 
-    # Identify the MIME type of the file
-    mime_type = mime.from_file(file_path)
+        # Identify the MIME type of the file
+        mime_type = mime.from_file(file_path)
 
     return mime_type
 
@@ -31,52 +54,236 @@ def is_pdf_mime(mime: str) -> bool:
     return mime == "application/pdf"
 
 
-def get_document_as_images(document_location: Path) -> list[ImageArtifact]:
+def get_pdf_page_count(document_location: Path) -> int:
+    return pdfinfo_from_path(document_location)["Pages"]
+
+
+def get_pdf_text_pages(document_location: Path) -> list[str]:
+    # Text layer of each page - empty for scanned pages
+    completed = subprocess.run(
+        ["pdftotext", "-layout", "-enc", "UTF-8", str(document_location), "-"],
+        capture_output=True,
+        check=True,
+    )
+    # Pages are separated by form feeds - the last one is followed by a trailing form feed
+    return completed.stdout.decode("utf-8", errors="replace").split("\f")[:-1]
+
+
+def get_pdf_pages_layout(document_location: Path) -> dict[int, dict]:
+    # Size (in points) and rotation of each page
+    completed = subprocess.run(
+        ["pdfinfo", "-f", "1", "-l", str(get_pdf_page_count(document_location)), str(document_location)],
+        capture_output=True,
+        check=True,
+    )
+    pages_layout: dict[int, dict] = {}
+    for line in completed.stdout.decode("utf-8", errors="replace").splitlines():
+        # Page    1 size: 595.276 x 841.89 pts (A4) / Page    1 rot:  0
+        parts = line.split()
+        if len(parts) < 4 or parts[0] != "Page" or not parts[1].isdigit():
+            continue
+        page_layout = pages_layout.setdefault(int(parts[1]), {})
+        if parts[2] == "size:":
+            page_layout["width"], page_layout["height"] = float(parts[3]), float(parts[5])
+        elif parts[2] == "rot:":
+            page_layout["rotation"] = int(parts[3])
+    return pages_layout
+
+
+def get_pdf_images_list(document_location: Path) -> list[dict]:
+    completed = subprocess.run(["pdfimages", "-list", str(document_location)], capture_output=True, check=True)
+    images_list = []
+    # Two header lines, then: page num type width height color comp bpc enc interp object ID x-ppi y-ppi size ratio
+    for line in completed.stdout.decode("utf-8", errors="replace").splitlines()[2:]:
+        parts = line.split()
+        if len(parts) < 14:
+            continue
+        images_list.append(
+            {
+                "page": int(parts[0]),
+                "type": parts[2],
+                "width": int(parts[3]),
+                "height": int(parts[4]),
+                "components": int(parts[6]),
+                "encoding": parts[8],
+                "x_ppi": float(parts[12]),
+                "y_ppi": float(parts[13]),
+            }
+        )
+    return images_list
+
+
+def get_pdf_scan_pages(document_location: Path) -> dict[int, dict]:
+    # Pages which are a single upright image covering the page - page number to the pdfimages -list entry
+    page_images: dict[int, list[dict]] = {}
+    for image in get_pdf_images_list(document_location):
+        page_images.setdefault(image["page"], []).append(image)
+
+    pages_layout = get_pdf_pages_layout(document_location)
+    scan_pages: dict[int, dict] = {}
+    for page, images in page_images.items():
+        # More than one entry - several images, or an image with a mask (smask / stencil)
+        if len(images) != 1:
+            continue
+        image = images[0]
+        page_layout = pages_layout.get(page, {})
+        if (
+            image["type"] != "image"
+            or image["encoding"] not in embedded_scan_extract_modes
+            # Gray or RGB only - CMYK is not accepted by the models
+            or image["components"] not in (1, 3)
+            or page_layout.get("rotation", 0) != 0
+            or not page_layout.get("width")
+            or not image["x_ppi"]
+            or not image["y_ppi"]
+        ):
+            continue
+        image_width_pts = image["width"] / image["x_ppi"] * 72
+        image_height_pts = image["height"] / image["y_ppi"] * 72
+        if (
+            image_width_pts >= page_layout["width"] * embedded_scan_min_page_coverage
+            and image_height_pts >= page_layout["height"] * embedded_scan_min_page_coverage
+        ):
+            scan_pages[page] = image
+    return scan_pages
+
+
+def extract_pdf_embedded_scans(document_location: Path, pages: list[int] | None = None) -> dict[int, ImageArtifact]:
+    # The embedded scan of each scanned page, as stored when possible (no decoding / re-encoding)
+    scan_pages = get_pdf_scan_pages(document_location)
+    if pages is not None:
+        scan_pages = {page: image for page, image in scan_pages.items() if page in pages}
+    if not scan_pages:
+        return {}
+
+    result_images: dict[int, ImageArtifact] = {}
+    with tempfile.TemporaryDirectory(prefix="comprendo-scans-") as output_dir:
+        for extract_mode in sorted({embedded_scan_extract_modes[image["encoding"]] for image in scan_pages.values()}):
+            mode_pages = [
+                page
+                for page, image in scan_pages.items()
+                if embedded_scan_extract_modes[image["encoding"]] == extract_mode
+            ]
+            # -p adds the page number to the file names: <prefix>-<page>-<num>.<ext>
+            subprocess.run(
+                [
+                    "pdfimages",
+                    f"-{extract_mode}",
+                    "-p",
+                    "-f",
+                    str(min(mode_pages)),
+                    "-l",
+                    str(max(mode_pages)),
+                    str(document_location),
+                    os.path.join(output_dir, extract_mode),
+                ],
+                capture_output=True,
+                check=True,
+            )
+            for page in mode_pages:
+                page_files = list(Path(output_dir).glob(f"{extract_mode}-{page:03d}-*"))
+                if len(page_files) != 1 or page_files[0].suffix not in embedded_scan_formats:
+                    continue
+                with Image.open(page_files[0]) as pil_image:
+                    width, height = pil_image.size
+                result_images[page] = ImageArtifact(
+                    page_files[0].read_bytes(),
+                    format=embedded_scan_formats[page_files[0].suffix],
+                    width=width,
+                    height=height,
+                    dpi=round(scan_pages[page]["x_ppi"]),
+                )
+    return result_images
+
+
+def load_pdf_embedded_scans(document_location: Path, pages: list[int] | None = None) -> dict[int, ImageArtifact]:
+    # Rendering is always the fallback - any failure here only costs the optimization
+    if not pdf_embedded_scans_enabled:
+        return {}
+    try:
+        return extract_pdf_embedded_scans(document_location, pages)
+    except Exception as e:
+        logger.warning(f"Embedded scans extraction failed: document={document_location.name}, error={e!r}")
+        return {}
+
+
+def split_page_list(pages: list[int], pages_per_job: int) -> list[tuple[int, int]]:
+    # Runs of consecutive pages - each run split to at most pages_per_job pages
+    pages_per_job = max(1, pages_per_job)
+    page_ranges: list[tuple[int, int]] = []
+    for page in sorted(pages):
+        if page_ranges and page == page_ranges[-1][1] + 1 and page - page_ranges[-1][0] < pages_per_job:
+            page_ranges[-1] = (page_ranges[-1][0], page)
+        else:
+            page_ranges.append((page, page))
+    return page_ranges
+
+
+def render_pdf_pages(
+    document_location: Path, first_page: int = None, last_page: int = None, dpi: int = rasterize_dpi
+) -> list[ImageArtifact]:
+    # TODO - consider other format that work better for text docs
+    # Pages are encoded by poppler to files and read as is - no decoded page images are held in memory
+    with tempfile.TemporaryDirectory(prefix="comprendo-render-") as output_dir:
+        page_paths = convert_from_path(
+            document_location,
+            dpi=dpi,
+            fmt=rasterize_format,
+            first_page=first_page,
+            last_page=last_page,
+            output_folder=output_dir,
+            paths_only=True,
+        )
+        result_images: list[ImageArtifact] = []
+        for page_path in page_paths:
+            # Reads the image header only
+            with Image.open(page_path) as pil_image:
+                width, height = pil_image.size
+            result_images.append(
+                ImageArtifact(Path(page_path).read_bytes(), format=rasterize_format, width=width, height=height, dpi=dpi)
+            )
+    return result_images
+
+
+def load_image_document(document_location: Path) -> list[ImageArtifact]:
+    # Open image using Pillow
+    # TODO - make sure image format is one of the commonly supported image types by the target models
+    with Image.open(document_location) as img:
+        return [ImageArtifact.from_pil_image(img)]
+
+
+def get_document_as_images(
+    document_location: Path, document_hash: str | None = None, use_raster_cache: bool = True
+) -> list[ImageArtifact]:
     file_mime = detect_file_type(document_location)
 
     if is_pdf_mime(file_mime):
-        pil_images = None
-        # If cache sub folder files exists next to the document
-        #  load all png images in it instead of converting the pdf to images
-        # Order them by the name ascending
-
-        cache_folder_path = document_location.parent / f"to_image_cache"
-        cache_file_name_base = document_location.stem
-        if cache_folder_path.exists():
-            png_files = sorted(cache_folder_path.glob(f"{cache_file_name_base}.*.png"))
-            if png_files:
-                pil_images = [Image.open(png_file) for png_file in png_files]
-
         if disable_pdf_to_image:
             return []
 
-        if not pil_images:
-            # TODO - detect "image scanned pdfs" - and extract the image instead of rendering the pdf to an image
-            # TODO - cache conversion output for restarts
-            # TODO - consider other format that work better for text docs
-            # Convert PDF to images; get the first page by default
-            pil_images = convert_from_path(document_location, fmt="png")
-
-            # store in the cache folder for subsequent runs
-            # Create the cache folder if it doesn't exist
-
-            cache_folder_path.mkdir(parents=True, exist_ok=True)
-            for idx, pil_image in enumerate(pil_images):
-                pil_image.save(cache_folder_path / f"{cache_file_name_base}.{idx}.png")
-
-        if pil_images:
-            result_images: list[ImageArtifact] = []
-            for pil_image in pil_images:
-                result_images.append(ImageArtifact.from_pil_image(pil_image))
-            return result_images
-        else:
+        if use_raster_cache:
+            document_hash = document_hash or hash_document_file(document_location)
+            cached_images = load_cached_pdf_images(document_hash, rasterize_dpi, raster_cache_format)
+            if cached_images:
+                return cached_images
+
+        scan_images = load_pdf_embedded_scans(document_location)
+        # Convert PDF to images - all pages which are not scans
+        page_images = dict(scan_images)
+        render_pages = [page for page in range(1, get_pdf_page_count(document_location) + 1) if page not in scan_images]
+        for first_page, last_page in split_page_list(render_pages, len(render_pages)):
+            rendered_images = render_pdf_pages(document_location, first_page, last_page)
+            page_images.update(zip(range(first_page, last_page + 1), rendered_images))
+        result_images = [page_images[page] for page in sorted(page_images)]
+        if not result_images:
             raise ValueError("The PDF file could not be converted.")
 
+        if use_raster_cache:
+            store_cached_pdf_images(document_hash, rasterize_dpi, raster_cache_format, result_images)
+        return result_images
+
     elif is_image_mime(file_mime):
-        # Open image using Pillow
-        # TODO - make sure image format is one of the commonly supported image types by the target models
-        with Image.open(document_location) as img:
-            return [ImageArtifact.from_pil_image(img)]
+        return load_image_document(document_location)
 
     else:
         raise ValueError(f"Unknown file type: {file_mime}")
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import math
+from io import BytesIO
+
+from attrs import asdict, define
+from PIL import Image
+
+from comprendo.configuration import app_config
+from comprendo.preprocess.rasterize import rasterization_engine, spill_large_images
+from comprendo.telemetry import stage_span
+from comprendo.types.document_artifact import DocumentArtifact
+from comprendo.types.image_artifact import ImageArtifact
+
+logger = logging.getLogger(__name__)
+
+
+@define(frozen=True)
+class ImageOptimizationProfile:
+    # Downscale to this resolution - applies to images with a known render DPI
+    target_dpi: int | None = None
+    # Downscale so the longest edge is at most this many pixels
+    max_long_edge: int | None = None
+    grayscale: bool = False
+    # png / jpeg / webp - None keeps the image format (Lossless for rendered pages)
+    format: str | None = None
+    # jpeg / webp only
+    quality: int = 85
+
+
+# Long edge limits follow the providers own downscaling - larger images only add upload time
+default_image_optimization_profiles = {
+    "default": {"max_long_edge": 2048},
+    "anthropic": {"max_long_edge": 1568},
+    "openai": {"max_long_edge": 2048},
+    "google": {"max_long_edge": 3072},
+    "vertexai": {"max_long_edge": 3072},
+}
+
+# Opt-in - lossy settings (jpeg / webp, grayscale) change what the experts see
+image_optimization_enabled = app_config.bool("IMAGE_OPTIMIZATION_ENABLED", False)
+# Per provider overrides, merged into the defaults. Example: {"anthropic": {"grayscale": true, "quality": 75}}
+image_optimization_profiles_config: dict = app_config.json("IMAGE_OPTIMIZATION_PROFILES", {})
+
+image_optimization_profiles = {
+    provider: ImageOptimizationProfile(
+        **{**default_image_optimization_profiles.get(provider, {}), **image_optimization_profiles_config.get(provider, {})}
+    )
+    for provider in {*default_image_optimization_profiles, *image_optimization_profiles_config}
+}
+
+
+def get_provider_image_optimization_profile(provider: str) -> ImageOptimizationProfile:
+    return image_optimization_profiles.get(provider, image_optimization_profiles["default"])
+
+
+def get_image_optimization_profile(provider: str) -> ImageOptimizationProfile | None:
+    if not image_optimization_enabled:
+        return None
+    return get_provider_image_optimization_profile(provider)
+
+
+def estimate_image_tokens(provider: str, width: int, height: int) -> int:
+    # Based on the providers published image token accounting
+    if provider == "openai":
+        # High detail - fit 2048 square, shortest side to 768, 170 tokens per 512px tile + 85 base
+        scale = min(1, 2048 / max(width, height))
+        width, height = width * scale, height * scale
+        scale = min(1, 768 / min(width, height))
+        width, height = width * scale, height * scale
+        return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+    if provider in ("google", "vertexai"):
+        # 258 tokens per 768px tile, small images are a single tile
+        if width <= 384 and height <= 384:
+            return 258
+        return 258 * math.ceil(width / 768) * math.ceil(height / 768)
+    # Anthropic - images are downscaled to 1568px long edge / ~1.15 megapixels, tokens = pixels / 750
+    scale = min(1, 1568 / max(width, height), math.sqrt(1_150_000 / (width * height)))
+    return math.ceil(width * scale * height * scale / 750)
+
+
+def optimize_image(image_artifact: ImageArtifact, profile: ImageOptimizationProfile) -> ImageArtifact:
+    scale = 1.0
+    if profile.target_dpi and image_artifact.dpi:
+        scale = min(scale, profile.target_dpi / image_artifact.dpi)
+    if profile.max_long_edge:
+        scale = min(scale, profile.max_long_edge / max(image_artifact.width, image_artifact.height))
+    needs_resize = scale < 1
+    image_format = profile.format or image_artifact.format
+
+    if not needs_resize and not profile.grayscale and image_artifact.format == image_format:
+        # Already fits - passed through as is
+        return image_artifact
+
+    with Image.open(BytesIO(image_artifact.to_bytes())) as pil_image:
+        optimized_image = pil_image
+        if profile.grayscale:
+            optimized_image = optimized_image.convert("L")
+        elif optimized_image.mode not in ("RGB", "L"):
+            # jpeg has no alpha / palette support
+            optimized_image = optimized_image.convert("RGB")
+
+        if needs_resize:
+            optimized_image = optimized_image.resize(
+                (max(1, round(image_artifact.width * scale)), max(1, round(image_artifact.height * scale))),
+                Image.Resampling.LANCZOS,
+            )
+
+        save_params = {"optimize": True}
+        if image_format in ("jpeg", "webp"):
+            save_params["quality"] = profile.quality
+        optimized_artifact = ImageArtifact.from_pil_image(
+            optimized_image,
+            format=image_format.upper(),
+            dpi=round(image_artifact.dpi * scale) if image_artifact.dpi else None,
+            **save_params,
+        )
+
+    if not needs_resize and len(optimized_artifact) >= len(image_artifact):
+        # Re-encoding did not pay off
+        return image_artifact
+    return optimized_artifact
+
+
+def optimize_images(
+    document_artifacts: list[DocumentArtifact], profile: ImageOptimizationProfile
+) -> list[DocumentArtifact]:
+    # Text artifacts pass through as is
+    return [
+        optimize_image(artifact, profile) if isinstance(artifact, ImageArtifact) else artifact
+        for artifact in document_artifacts
+    ]
+
+
+def get_image_optimization_report(
+    provider: str, original_images: list[DocumentArtifact], optimized_images: list[DocumentArtifact]
+) -> list[dict]:
+    report = []
+    for original, optimized in zip(original_images, optimized_images):
+        if not isinstance(original, ImageArtifact):
+            continue
+        original_tokens = estimate_image_tokens(provider, original.width, original.height)
+        optimized_tokens = estimate_image_tokens(provider, optimized.width, optimized.height)
+        report.append(
+            {
+                "source": original.source,
+                "page": original.page,
+                "bytes_before": len(original),
+                "bytes_after": len(optimized),
+                "bytes_saved": len(original) - len(optimized),
+                "tokens_before": original_tokens,
+                "tokens_after": optimized_tokens,
+                "tokens_saved": original_tokens - optimized_tokens,
+            }
+        )
+    return report
+
+
+class ProviderImageOptimizer:
+    # Per request - images are optimized once per profile and shared by all experts using it
+    def __init__(self, image_artifacts: list[DocumentArtifact]):
+        self.image_artifacts = image_artifacts
+        self._optimizations: dict[ImageOptimizationProfile, asyncio.Future] = {}
+        # Experts waiting on each optimization
+        self._waiting: dict[ImageOptimizationProfile, int] = {}
+
+    async def get_images(self, provider: str) -> list[DocumentArtifact]:
+        profile = get_image_optimization_profile(provider)
+        if profile is None or not any(isinstance(artifact, ImageArtifact) for artifact in self.image_artifacts):
+            return self.image_artifacts
+
+        optimization = self._optimizations.get(profile)
+        if optimization is None:
+            optimization = self._optimizations[profile] = asyncio.ensure_future(self._optimize(provider, profile))
+        self._waiting[profile] = self._waiting.get(profile, 0) + 1
+        try:
+            # Shielded - a cancelled expert must not cancel the optimization other experts wait on
+            return await asyncio.shield(optimization)
+        finally:
+            self._waiting[profile] -= 1
+            if not self._waiting[profile] and not optimization.done():
+                # All its experts were cancelled (quorum, deadline, request cancelled) - the result is not needed
+                optimization.cancel()
+                del self._optimizations[profile]
+
+    async def _optimize(self, provider: str, profile: ImageOptimizationProfile) -> list[DocumentArtifact]:
+        with stage_span("image_encoding", provider=provider, step="optimize"):
+            optimized_images = await rasterization_engine.run_job(optimize_images, self.image_artifacts, profile)
+            await asyncio.to_thread(spill_large_images, optimized_images)
+        report = get_image_optimization_report(provider, self.image_artifacts, optimized_images)
+        logger.info(
+            f"Image optimization: provider={provider}, profile={asdict(profile)}, "
+            f"bytes_saved={sum(r['bytes_saved'] for r in report)}, tokens_saved={sum(r['tokens_saved'] for r in report)}, "
+            f"payload={report}",
+            extra={"provider": provider},
+        )
+        return optimized_images
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import re
+from io import BytesIO
+from pathlib import Path
+
+from attrs import define
+from PIL import Image
+
+from comprendo.configuration import app_config
+from comprendo.preprocess.document import detect_file_type, get_pdf_text_pages, is_pdf_mime
+from comprendo.preprocess.rasterize import rasterization_engine
+from comprendo.types.document_artifact import DocumentArtifact
+from comprendo.types.image_artifact import ImageArtifact
+from comprendo.types.text_artifact import TextArtifact
+
+logger = logging.getLogger(__name__)
+
+# off - keep all pages, drop - remove irrelevant pages, deprioritize - move irrelevant pages last
+# Deprioritize by default - a misclassified page is still sent to the experts
+page_filter_mode = app_config.str("PAGE_FILTER_MODE", "deprioritize")
+# Share of ink pixels (clearly darker than the paper) below which a page is considered blank
+# A signature or a stamp alone is well above the default
+page_filter_blank_max_ink_ratio = app_config.float("PAGE_FILTER_BLANK_MAX_INK_RATIO", 0.0002)
+# Pages with less text than this are judged by pixels only (Scans / no text layer)
+page_filter_min_text_chars = app_config.int("PAGE_FILTER_MIN_TEXT_CHARS", 80)
+# Pages with relevant keywords and at least this share of digits read as a results table - never filtered
+page_filter_table_min_digit_ratio = app_config.float("PAGE_FILTER_TABLE_MIN_DIGIT_RATIO", 0.03)
+
+# Grayscale levels below the paper level for a pixel to count as ink
+BLANK_INK_LEVEL_DELTA = 64
+
+# Whole words - stems where noted with \w*
+relevant_keywords_re = re.compile(
+    r"\b(?:certificate of analysis|analys[ie]s|analytical|batch(?:es)?|lots?|results?|specifications?|tests?|tested"
+    r"|testing|methods?|assay|purity|expiry|expiration|manufactur\w*|conform\w*|complies|parameters?|limits?)\b"
+)
+irrelevant_keywords_re = re.compile(
+    r"\b(?:terms and conditions|general conditions|conditions of sale|liability|liable|warrant(?:y|ies)"
+    r"|governing law|indemn\w*|dear|sincerely|kind regards|best regards|yours faithfully)\b"
+)
+
+word_re = re.compile(r"\w+")
+digit_re = re.compile(r"\d")
+
+
+@define
+class PageClassification:
+    relevant: bool
+    reason: str
+
+
+@define
+class PageFilterResult:
+    document_artifacts: list[DocumentArtifact]
+    # Pages left out (drop) / sent after the relevant pages (deprioritize)
+    filtered_pages: int = 0
+    deprioritized_pages: int = 0
+
+
+def get_ink_ratio(image_artifact: ImageArtifact) -> float:
+    # Full resolution - a downscaled page averages thin strokes (signatures) into the paper
+    with Image.open(BytesIO(image_artifact.to_bytes())) as pil_image:
+        histogram = pil_image.convert("L").histogram()
+    # The paper is the most common level of the lighter half
+    paper_level = max(range(128, 256), key=lambda level: histogram[level])
+    ink_pixels = sum(histogram[: max(0, paper_level - BLANK_INK_LEVEL_DELTA)])
+    return ink_pixels / max(1, sum(histogram))
+
+
+def is_blank_image(image_artifact: ImageArtifact) -> bool:
+    return get_ink_ratio(image_artifact) < page_filter_blank_max_ink_ratio
+
+
+def classify_page(document_artifact: DocumentArtifact, page_text: str | None) -> PageClassification:
+    if isinstance(document_artifact, TextArtifact):
+        # A usable text layer - the page is judged by its own text
+        page_text = document_artifact.value
+    elif is_blank_image(document_artifact):
+        return PageClassification(relevant=False, reason="blank")
+
+    if page_text is None or len(page_text.strip()) < page_filter_min_text_chars:
+        # Scanned page (or almost no text) - nothing to judge by
+        return PageClassification(relevant=True, reason="no_text_layer")
+
+    normalized_text = page_text.lower()
+    relevant_hits = len(relevant_keywords_re.findall(normalized_text))
+    irrelevant_hits = len(irrelevant_keywords_re.findall(normalized_text))
+    words = word_re.findall(normalized_text)
+    # Whitespace excluded - layout text pads the columns
+    digit_ratio = len(digit_re.findall(normalized_text)) / max(1, len("".join(normalized_text.split())))
+
+    if relevant_hits and (digit_ratio >= page_filter_table_min_digit_ratio or relevant_hits >= irrelevant_hits):
+        # A results page - possibly with a terms or letter footer
+        return PageClassification(relevant=True, reason="keywords")
+    if irrelevant_hits:
+        return PageClassification(relevant=False, reason="terms_or_letter")
+    if relevant_hits == 0 and len(words) > 150 and digit_ratio < 0.01:
+        # Dense prose with almost no numbers - not a results table
+        return PageClassification(relevant=False, reason="prose")
+    return PageClassification(relevant=True, reason="no_keywords")
+
+
+def load_document_text_pages(documents_paths: list[Path]) -> dict[str, list[str]]:
+    text_pages: dict[str, list[str]] = {}
+    for document_location in documents_paths:
+        if is_pdf_mime(detect_file_type(document_location)):
+            try:
+                text_pages[str(document_location)] = get_pdf_text_pages(document_location)
+            except Exception as e:
+                logger.warning(f"Text layer extraction failed: document={document_location.name}, error={e}")
+    return text_pages
+
+
+def get_page_text(text_pages: dict[str, list[str]], document_artifact: DocumentArtifact) -> str | None:
+    document_text_pages = text_pages.get(document_artifact.source, [])
+    if document_artifact.page is None or document_artifact.page > len(document_text_pages):
+        return None
+    return document_text_pages[document_artifact.page - 1]
+
+
+def get_page_key(document_artifact: DocumentArtifact) -> tuple:
+    # A page may be sent as both its text and an image
+    if document_artifact.page is None:
+        return (id(document_artifact),)
+    return (document_artifact.source, document_artifact.page)
+
+
+async def filter_document_pages(
+    documents_paths: list[Path], document_artifacts: list[DocumentArtifact]
+) -> PageFilterResult:
+    if page_filter_mode == "off" or not document_artifacts:
+        return PageFilterResult(document_artifacts=document_artifacts)
+
+    # Only documents with page images need their text layer - text artifacts carry it
+    image_sources = {artifact.source for artifact in document_artifacts if isinstance(artifact, ImageArtifact)}
+    text_pages = await asyncio.to_thread(
+        load_document_text_pages, [path for path in documents_paths if str(path) in image_sources]
+    )
+    classifications: list[PageClassification] = await asyncio.gather(
+        *[
+            rasterization_engine.run_job(classify_page, artifact, get_page_text(text_pages, artifact))
+            for artifact in document_artifacts
+        ]
+    )
+
+    relevant_artifacts = [artifact for artifact, c in zip(document_artifacts, classifications) if c.relevant]
+    irrelevant_artifacts = [artifact for artifact, c in zip(document_artifacts, classifications) if not c.relevant]
+    filtered_report = [
+        {"document": Path(artifact.source).name if artifact.source else None, "page": artifact.page, "reason": c.reason}
+        for artifact, c in zip(document_artifacts, classifications)
+        if not c.relevant
+    ]
+    irrelevant_pages = len({get_page_key(artifact) for artifact in irrelevant_artifacts})
+    total_pages = len({get_page_key(artifact) for artifact in document_artifacts})
+
+    if not relevant_artifacts:
+        # Never send nothing - the classifier may be wrong about unusual documents
+        logger.warning(f"All {total_pages} pages classified irrelevant - keeping all pages")
+        return PageFilterResult(document_artifacts=document_artifacts)
+
+    if page_filter_mode == "deprioritize":
+        logger.info(
+            f"Deprioritized {irrelevant_pages} of {total_pages} pages: payload={filtered_report}",
+            extra={"deprioritized_pages": irrelevant_pages},
+        )
+        return PageFilterResult(
+            document_artifacts=relevant_artifacts + irrelevant_artifacts, deprioritized_pages=irrelevant_pages
+        )
+
+    logger.info(
+        f"Filtered {irrelevant_pages} of {total_pages} pages: payload={filtered_report}",
+        extra={"filtered_pages": irrelevant_pages},
+    )
+    return PageFilterResult(document_artifacts=relevant_artifacts, filtered_pages=irrelevant_pages)
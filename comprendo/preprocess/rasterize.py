@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable
+
+from comprendo.configuration import app_config
+from comprendo.preprocess.caching import hash_document_file, load_cached_pdf_images, store_cached_pdf_images
+from comprendo.preprocess.document import (
+    detect_file_type,
+    disable_pdf_to_image,
+    get_pdf_page_count,
+    is_image_mime,
+    is_pdf_mime,
+    load_image_document,
+    load_pdf_embedded_scans,
+    raster_cache_format,
+    rasterize_dpi,
+    render_pdf_pages,
+    split_page_list,
+)
+from comprendo.telemetry import record_rasterized_pages, stage_span
+from comprendo.types.image_artifact import ImageArtifact
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the process pool - rendering then runs on a worker thread (Still off the event loop)
+rasterize_pool_size = app_config.int("RASTERIZE_POOL_SIZE", min(4, os.cpu_count() or 1))
+# Max number of render jobs (page ranges) submitted and not yet completed - further jobs wait on the loop
+rasterize_queue_depth = app_config.int("RASTERIZE_QUEUE_DEPTH", max(1, rasterize_pool_size) * 4)
+rasterize_pages_per_job = app_config.int("RASTERIZE_PAGES_PER_JOB", 4)
+rasterize_pool_start_method = app_config.str("RASTERIZE_POOL_START_METHOD", "forkserver")
+# Images from this size on are moved to memory mapped temp files - 0 keeps all images in memory
+image_spill_min_kb = app_config.int("IMAGE_SPILL_MIN_KB", 0)
+
+
+def run_timed(fn: Callable, *args):
+    # Runs in the pool - the work time without the queue wait
+    start_time = time.perf_counter()
+    return fn(*args), time.perf_counter() - start_time
+
+
+def spill_large_images(image_artifacts: list[ImageArtifact]) -> None:
+    if image_spill_min_kb <= 0:
+        return
+    for image_artifact in image_artifacts:
+        if isinstance(image_artifact, ImageArtifact) and len(image_artifact) >= image_spill_min_kb * 1024:
+            image_artifact.spill()
+
+
+class RasterizationEngine:
+    def __init__(
+        self, pool_size: int, queue_depth: int, pages_per_job: int, start_method: str, use_raster_cache: bool = True
+    ):
+        self.pool_size = pool_size
+        self.queue_depth = max(1, queue_depth)
+        self.pages_per_job = pages_per_job
+        self.start_method = start_method
+        self.use_raster_cache = use_raster_cache
+        self._executor: Executor | None = None
+        self._queue_slots: asyncio.Semaphore | None = None
+        self._queue_slots_loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_executor(self) -> Executor | None:
+        if self.pool_size <= 0:
+            # Use the loop default thread pool
+            return None
+        if self._executor is None:
+            logger.info(f"Starting rasterization process pool: size={self.pool_size}, queue_depth={self.queue_depth}")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+        return self._executor
+
+    def _get_queue_slots(self) -> asyncio.Semaphore:
+        # Asyncio primitives are bound to a single loop (e.g. repeated asyncio.run calls in the CLI / benchmarks)
+        loop = asyncio.get_running_loop()
+        if self._queue_slots is None or self._queue_slots_loop is not loop:
+            self._queue_slots = asyncio.Semaphore(self.queue_depth)
+            self._queue_slots_loop = loop
+        return self._queue_slots
+
+    async def run_job(self, fn: Callable, *args):
+        # CPU bound work - runs in the pool, bounded by the queue depth
+        async with self._get_queue_slots():
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            except BrokenProcessPool:
+                # A worker died (OOM kill, poppler crash) - the pool is unusable, start fresh on next job
+                logger.error("Rasterization process pool is broken - restarting on next job")
+                self.shutdown(wait=False)
+                raise
+
+    async def _run_render_job(self, kind: str, fn: Callable, *args) -> list[ImageArtifact]:
+        with stage_span("rasterize", kind=kind) as span:
+            result_images, render_time = await self.run_job(run_timed, fn, *args)
+            span.set_attribute("pages", len(result_images))
+        record_rasterized_pages(len(result_images), render_time, kind)
+        return result_images
+
+    async def _run_io(self, fn: Callable, *args):
+        # Light blocking IO (mime sniffing, hashing, cache files, pdfinfo) - no need for a process
+        return await asyncio.to_thread(fn, *args)
+
+    async def _finish_images(self, document_location: Path, pages: list[int], images: list[ImageArtifact]):
+        # Every rendering path ends here - source and page of each image, then the spill policy
+        for page, image in zip(pages, images):
+            image.source = str(document_location)
+            image.page = page
+        await self._run_io(spill_large_images, images)
+
+    async def render_pdf(self, document_location: Path, document_hash: str | None = None) -> list[ImageArtifact]:
+        if disable_pdf_to_image:
+            return []
+
+        if self.use_raster_cache:
+            if document_hash is None:
+                document_hash = await self._run_io(hash_document_file, document_location)
+            cached_images = await self._run_io(
+                load_cached_pdf_images, document_hash, rasterize_dpi, raster_cache_format
+            )
+            if cached_images:
+                logger.info(f"Using cached document images: pages={len(cached_images)}, hash={document_hash}")
+                await self._finish_images(document_location, list(range(1, len(cached_images) + 1)), cached_images)
+                return cached_images
+
+        page_count = await self._run_io(get_pdf_page_count, document_location)
+        result_images = await self.render_pdf_page_list(
+            document_location, list(range(1, page_count + 1)), rasterize_dpi, use_embedded_scans=True
+        )
+        if not result_images:
+            raise ValueError("The PDF file could not be converted.")
+
+        if self.use_raster_cache:
+            await self._run_io(
+                store_cached_pdf_images, document_hash, rasterize_dpi, raster_cache_format, result_images
+            )
+        return result_images
+
+    async def render_pdf_page_list(
+        self, document_location: Path, pages: list[int], dpi: int, use_embedded_scans: bool = False
+    ) -> list[ImageArtifact]:
+        # Selected pages only, in page order - caching is left to the caller (The cache holds whole documents)
+        if disable_pdf_to_image or not pages:
+            return []
+
+        # Scanned pages are taken as embedded in the PDF - only the rest are rendered
+        page_images = {}
+        if use_embedded_scans:
+            page_images = await self._run_io(load_pdf_embedded_scans, document_location, pages)
+        scan_pages_count = len(page_images)
+        render_pages = [page for page in sorted(pages) if page not in page_images]
+        page_ranges = split_page_list(render_pages, self.pages_per_job)
+        rendered_ranges = await asyncio.gather(
+            *[
+                self._run_render_job("pdf", render_pdf_pages, document_location, first, last, dpi)
+                for first, last in page_ranges
+            ]
+        )
+        page_images.update(zip(render_pages, [image for rendered_range in rendered_ranges for image in rendered_range]))
+        if scan_pages_count:
+            logger.info(
+                f"Embedded scans used: document={document_location.name}, scan_pages={scan_pages_count}, "
+                f"rendered_pages={len(render_pages)}"
+            )
+
+        result_images = [page_images[page] for page in sorted(page_images)]
+        await self._finish_images(document_location, sorted(page_images), result_images)
+        return result_images
+
+    async def render_document(self, document_location: Path, document_hash: str | None = None) -> list[ImageArtifact]:
+        file_mime = await self._run_io(detect_file_type, document_location)
+
+        if is_pdf_mime(file_mime):
+            return await self.render_pdf(document_location, document_hash)
+        if is_image_mime(file_mime):
+            result_images = await self._run_render_job("image", load_image_document, document_location)
+            await self._finish_images(document_location, [1], result_images)
+            return result_images
+        raise ValueError(f"Unknown file type: {file_mime}")
+
+    async def render_documents(
+        self, documents_paths: list[Path], documents_hashes: list[str | None] | None = None
+    ) -> list[ImageArtifact]:
+        documents_hashes = documents_hashes or [None] * len(documents_paths)
+        render_start_time = time.time()
+        documents_images = await asyncio.gather(
+            *[self.render_document(doc, doc_hash) for doc, doc_hash in zip(documents_paths, documents_hashes)]
+        )
+        render_total_time = time.time() - render_start_time
+        result_images = [img for document_images in documents_images for img in document_images]
+        logger.info(
+            f"Rasterized {len(documents_paths)} documents to {len(result_images)} images, time={render_total_time:.2f}s",
+            extra={"time": render_total_time},
+        )
+        return result_images
+
+    def shutdown(self, wait: bool = True) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+rasterization_engine = RasterizationEngine(
+    pool_size=rasterize_pool_size,
+    queue_depth=rasterize_queue_depth,
+    pages_per_job=rasterize_pages_per_job,
+    start_method=rasterize_pool_start_method,
+)
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import re
+import time
+from pathlib import Path
+
+from comprendo.configuration import app_config
+from comprendo.preprocess.document import detect_file_type, get_pdf_text_pages, is_pdf_mime, rasterize_dpi
+from comprendo.preprocess.rasterize import rasterization_engine
+from comprendo.types.document_artifact import DocumentArtifact
+from comprendo.types.text_artifact import TextArtifact
+
+logger = logging.getLogger(__name__)
+
+# images - page images only (default)
+# text - the PDF text layer instead of page images where the text layer is usable
+# text_image - the PDF text layer along with a low resolution page image
+preprocess_mode = app_config.str("PREPROCESS_MODE", "images")
+# Render resolution of the page image sent along with the text in text_image mode
+text_layer_image_dpi = app_config.int("TEXT_LAYER_IMAGE_DPI", 72)
+# Pages with less text fall back to images (Scans, a stamp or a logo only)
+text_layer_min_chars = app_config.int("TEXT_LAYER_MIN_CHARS", 100)
+# Pages with a larger share of unreadable characters fall back to images (Broken font encodings)
+text_layer_max_garbage_ratio = app_config.float("TEXT_LAYER_MAX_GARBAGE_RATIO", 0.05)
+
+# Unmapped glyphs - replacement characters, private use area, control characters and pdftotext cid markers
+garbage_char_re = re.compile(r"[\ufffd\ue000-\uf8ff\x00-\x08\x0b\x0e-\x1f]|\(cid:\d+\)")
+word_re = re.compile(r"\S+")
+readable_word_re = re.compile(r"^[\w.,:;%°±<>=/()\[\]+\-*'\"µ]+$")
+
+
+def is_usable_text_layer(page_text: str) -> bool:
+    stripped_text = page_text.strip()
+    if len(stripped_text) < text_layer_min_chars:
+        return False
+
+    garbage_chars = sum(len(m) for m in garbage_char_re.findall(stripped_text))
+    if garbage_chars / len(stripped_text) > text_layer_max_garbage_ratio:
+        return False
+
+    # Garbled encodings also show as runs of symbols with no letters or digits
+    words = word_re.findall(stripped_text)
+    readable_words = sum(1 for word in words if readable_word_re.match(word))
+    return readable_words / len(words) >= 0.8
+
+
+async def load_pdf_artifacts(document_location: Path, document_hash: str | None = None) -> list[DocumentArtifact]:
+    try:
+        text_pages = await asyncio.to_thread(get_pdf_text_pages, document_location)
+    except Exception as e:
+        logger.warning(f"Text layer extraction failed: document={document_location.name}, error={e}")
+        text_pages = []
+
+    text_page_numbers = [idx + 1 for idx, page_text in enumerate(text_pages) if is_usable_text_layer(page_text)]
+    if not text_page_numbers:
+        # No usable text layer at all - the regular (cached) rendering of the whole document
+        return await rasterization_engine.render_document(document_location, document_hash)
+
+    image_page_numbers = [idx + 1 for idx in range(len(text_pages)) if idx + 1 not in text_page_numbers]
+    page_images, low_res_page_images = await asyncio.gather(
+        # Pages without a usable text layer are mostly scans - taken as embedded when possible
+        rasterization_engine.render_pdf_page_list(
+            document_location, image_page_numbers, rasterize_dpi, use_embedded_scans=True
+        ),
+        rasterization_engine.render_pdf_page_list(
+            document_location, text_page_numbers if preprocess_mode == "text_image" else [], text_layer_image_dpi
+        ),
+    )
+
+    page_artifacts: dict[int, list[DocumentArtifact]] = {page: [] for page in range(1, len(text_pages) + 1)}
+    for page in text_page_numbers:
+        page_artifacts[page].append(TextArtifact(text_pages[page - 1], source=str(document_location), page=page))
+    for image in [*page_images, *low_res_page_images]:
+        page_artifacts[image.page].append(image)
+
+    logger.info(
+        f"Text layer used: document={document_location.name}, text_pages={len(text_page_numbers)}, "
+        f"image_pages={len(image_page_numbers)}"
+    )
+    return [artifact for page in sorted(page_artifacts) for artifact in page_artifacts[page]]
+
+
+async def load_document_artifacts(document_location: Path, document_hash: str | None = None) -> list[DocumentArtifact]:
+    if preprocess_mode in ("text", "text_image"):
+        file_mime = await asyncio.to_thread(detect_file_type, document_location)
+        if is_pdf_mime(file_mime):
+            return await load_pdf_artifacts(document_location, document_hash)
+    return await rasterization_engine.render_document(document_location, document_hash)
+
+
+async def load_documents_artifacts(
+    documents_paths: list[Path], documents_hashes: list[str | None] | None = None
+) -> list[DocumentArtifact]:
+    if preprocess_mode not in ("text", "text_image"):
+        return await rasterization_engine.render_documents(documents_paths, documents_hashes)
+
+    documents_hashes = documents_hashes or [None] * len(documents_paths)
+    load_start_time = time.time()
+    documents_artifacts = await asyncio.gather(
+        *[load_document_artifacts(doc, doc_hash) for doc, doc_hash in zip(documents_paths, documents_hashes)]
+    )
+    load_total_time = time.time() - load_start_time
+    result_artifacts = [artifact for document_artifacts in documents_artifacts for artifact in document_artifacts]
+    logger.info(
+        f"Loaded {len(documents_paths)} documents to {len(result_artifacts)} artifacts, mode={preprocess_mode}, "
+        f"time={load_total_time:.2f}s",
+        extra={"time": load_total_time},
+    )
+    return result_artifacts
@@ -3,26 +3,44 @@ from pathlib import Path
 
 from comprendo.extraction.extract import extract as live_extract
 from comprendo.extraction.mock_extract import extract as mock_extract
-from comprendo.preprocess.document import get_document_as_images
-from comprendo.types.image_artifact import ImageArtifact
+from comprendo.log_payloads import format_log_payload
+from comprendo.preprocess.page_filter import filter_document_pages
+from comprendo.preprocess.text_layer import load_documents_artifacts
+from comprendo.progress import report_progress
+from comprendo.telemetry import stage_span
+from comprendo.types.document_artifact import DocumentArtifact
 from comprendo.types.task import Task
 
 
 logger = logging.getLogger(__name__)
 
 
-def load_task_document_image_artifacts(documents_paths: list[Path]) -> list[ImageArtifact]:
-    # Assuming get_document_as_images returns a list of images for each document
+async def load_task_document_artifacts(
+    documents_paths: list[Path], documents_hashes: list[str | None] | None = None
+) -> list[DocumentArtifact]:
+    # Rendering is CPU bound - it runs in the rasterization engine pool to keep the event loop responsive
+    # Depending on PREPROCESS_MODE - PDF pages with a usable text layer are sent as text
     # TODO Consider passing the image through technical improvements
-    # TODO Consider filtering out images which do not contain relevant data for this task - Reduce costs and processing time
-    return [img for doc in documents_paths for img in get_document_as_images(doc)]
+    return await load_documents_artifacts(documents_paths, documents_hashes)
 
 
-async def process_task(task: Task, documents_paths: list[Path]):
-    logger.info(f"Processing task with payload: {task.model_dump_json()}")
+async def process_task(task: Task, documents_paths: list[Path], documents_hashes: list[str | None] | None = None):
+    logger.info(f"Processing task with payload: {format_log_payload(lambda: task.model_dump_json())}")
     logger.info(f"Processing extraction task with {len(documents_paths)} documents")
-    image_artifacts = load_task_document_image_artifacts(documents_paths)
-    logger.info(f"Derived {len(image_artifacts)} images")
+    document_artifacts = await load_task_document_artifacts(documents_paths, documents_hashes)
+    logger.info(f"Derived {len(document_artifacts)} document artifacts")
+    report_progress("pages_rendered", artifacts=len(document_artifacts))
+    # Blank backs, cover letters and terms pages would otherwise go to every expert
+    page_filter_result = await filter_document_pages(documents_paths, document_artifacts)
+    report_progress(
+        "pages_filtered",
+        artifacts=len(page_filter_result.document_artifacts),
+        filtered_pages=page_filter_result.filtered_pages,
+        deprioritized_pages=page_filter_result.deprioritized_pages,
+    )
     extract_fn = mock_extract if task.mock_mode else live_extract
-    extraction_result = await extract_fn(task, image_artifacts)
+    with stage_span("extraction", mock=task.mock_mode):
+        extraction_result = await extract_fn(task, page_filter_result.document_artifacts)
+    extraction_result.filtered_pages = page_filter_result.filtered_pages
+    extraction_result.deprioritized_pages = page_filter_result.deprioritized_pages
     return extraction_result
@@ -0,0 +1,44 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+from comprendo.configuration import app_config
+
+logger = logging.getLogger(__name__)
+
+# Stream expert model output tokens to progress listeners - where the provider supports streaming
+progress_stream_tokens = app_config.bool("PROGRESS_STREAM_TOKENS", True)
+
+ProgressListener = Callable[[str, dict], None]
+
+# Tasks created within a listened block (experts, shards, mapping) inherit the listener
+ctx_progress_listener: ContextVar[ProgressListener | None] = ContextVar("progress_listener", default=None)
+
+
+@contextmanager
+def listen_progress(listener: ProgressListener):
+    token = ctx_progress_listener.set(listener)
+    try:
+        yield
+    finally:
+        ctx_progress_listener.reset(token)
+
+
+def report_progress(event: str, **data):
+    # No-op without a listener - call from the event loop thread only
+    listener = ctx_progress_listener.get()
+    if listener is None:
+        return
+    try:
+        listener(event, data)
+    except Exception as e:
+        # Progress is best effort - never fails the extraction
+        logger.warning(f"Progress listener failed: event={event}, error={e!r}")
+
+
+def get_progress_delta_reporter(event: str, **data) -> Callable[[str], None] | None:
+    # None when nobody listens - the model is invoked without streaming
+    if not progress_stream_tokens or ctx_progress_listener.get() is None:
+        return None
+    return lambda text: report_progress(event, text=text, **data)
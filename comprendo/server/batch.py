@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+from fastapi import HTTPException
+
+from comprendo.configuration import app_config
+from comprendo.server.types.extract_coa_input import COABatchItem
+from comprendo.server.types.extract_coa_output import COABatchItemResponse, COAResponse
+from comprendo.server.upload import MB
+
+logger = logging.getLogger(__name__)
+
+batch_max_items = app_config.int("BATCH_MAX_ITEMS", 50)
+# Whole batch body limit - each item is also held to the per request upload limits
+batch_max_request_bytes = app_config.int("BATCH_MAX_REQUEST_MB", 1000) * MB
+# Concurrent batch items per server process - shared by all batch requests
+batch_concurrency = app_config.int("BATCH_CONCURRENCY", 4)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+BatchItemRunner = Callable[[int, COABatchItem], Awaitable[COAResponse]]
+
+_batch_slots: asyncio.Semaphore | None = None
+_batch_slots_loop: asyncio.AbstractEventLoop | None = None
+
+
+def get_batch_slots() -> asyncio.Semaphore:
+    # Asyncio primitives are bound to a single loop (e.g. repeated asyncio.run calls in the CLI / benchmarks)
+    global _batch_slots, _batch_slots_loop
+    loop = asyncio.get_running_loop()
+    if _batch_slots is None or _batch_slots_loop is not loop:
+        _batch_slots = asyncio.Semaphore(max(1, batch_concurrency))
+        _batch_slots_loop = loop
+    return _batch_slots
+
+
+def get_item_error(e: Exception) -> str:
+    if isinstance(e, HTTPException):
+        return str(e.detail)
+    return str(e)
+
+
+async def run_batch_item(idx: int, item: COABatchItem, run: BatchItemRunner) -> COABatchItemResponse:
+    async with get_batch_slots():
+        start_time = time.perf_counter()
+        try:
+            result = await run(idx, item)
+        except Exception as e:
+            logger.exception(f"Batch item failed: index={idx}, request_id={item.request.id}")
+            return COABatchItemResponse(
+                index=idx, request_id=item.request.id, status="failed", error=get_item_error(e)
+            )
+        logger.info(
+            f"Batch item done: index={idx}, request_id={item.request.id}, time={time.perf_counter() - start_time:.2f}s"
+        )
+        return COABatchItemResponse(index=idx, request_id=item.request.id, status="succeeded", result=result)
+
+
+async def stream_batch_results(items: list[COABatchItem], run: BatchItemRunner) -> AsyncIterator[str]:
+    # One NDJSON line per item in completion order - a failed item does not fail the batch
+    item_tasks = [asyncio.create_task(run_batch_item(idx, item, run)) for idx, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(item_tasks):
+            item_response = await next_done
+            yield item_response.model_dump_json() + "\n"
+    finally:
+        # Client went away - stop the remaining items
+        for item_task in item_tasks:
+            item_task.cancel()
+        await asyncio.gather(*item_tasks, return_exceptions=True)
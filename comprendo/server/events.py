@@ -0,0 +1,60 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable
+
+from fastapi import HTTPException
+
+from comprendo.configuration import app_config
+from comprendo.progress import listen_progress
+from comprendo.server.types.extract_coa_output import COAResponse
+
+logger = logging.getLogger(__name__)
+
+# Comment lines sent while no event is due - keeps proxies from closing an idle stream
+progress_heartbeat_seconds = app_config.float("PROGRESS_HEARTBEAT_SECONDS", 15)
+
+SSE_MEDIA_TYPE = "text/event-stream"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_task_progress(request_id: str, run: Callable[[], Awaitable[COAResponse]]) -> AsyncIterator[str]:
+    # Stage events as they happen, then a final result (or error) event
+    events: asyncio.Queue[tuple[str, dict] | None] = asyncio.Queue()
+
+    def on_progress(event: str, data: dict):
+        events.put_nowait((event, data))
+
+    with listen_progress(on_progress):
+        run_task = asyncio.create_task(run())
+    run_task.add_done_callback(lambda _: events.put_nowait(None))
+
+    try:
+        yield format_sse_event("started", {"request_id": request_id})
+        while True:
+            try:
+                next_event = await asyncio.wait_for(events.get(), timeout=progress_heartbeat_seconds or None)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if next_event is None:
+                break
+            yield format_sse_event(*next_event)
+
+        try:
+            response = run_task.result()
+        except Exception as e:
+            logger.exception(f"Streamed extraction failed: request_id={request_id}")
+            detail = str(e.detail) if isinstance(e, HTTPException) else str(e)
+            yield format_sse_event("error", {"request_id": request_id, "detail": detail})
+            return
+        yield format_sse_event("result", response.model_dump())
+    finally:
+        # Client went away - no one waits for the extraction anymore
+        if not run_task.done():
+            run_task.cancel()
+            await asyncio.gather(run_task, return_exceptions=True)
@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import logging
+import os
+import socket
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+from comprendo.configuration import app_config
+from comprendo.server.types.extract_coa_output import COAResponse
+from comprendo.server.types.job import Job, JobResponse, JobStatus
+
+logger = logging.getLogger(__name__)
+
+jobs_workers = app_config.int("JOBS_WORKERS", 2)
+jobs_queue_depth = app_config.int("JOBS_QUEUE_DEPTH", 20)
+# Job records are files - any server worker process can answer status requests
+jobs_state_dir = app_config.str("JOBS_STATE_DIR", "jobs")
+jobs_result_ttl_seconds = app_config.int("JOBS_RESULT_TTL_SECONDS", 24 * 60 * 60)
+# Expired records are removed and the records of live jobs refreshed at this interval
+# Queued / running records not refreshed for 3 intervals belong to a dead process - they are marked failed
+jobs_maintenance_interval_seconds = app_config.float("JOBS_MAINTENANCE_INTERVAL_SECONDS", 60)
+jobs_webhook_timeout_seconds = app_config.float("JOBS_WEBHOOK_TIMEOUT_SECONDS", 10)
+# Webhook hosts allowed to resolve to private, loopback or link-local addresses - others must be public
+jobs_webhook_allowed_hosts = {host.lower() for host in app_config.list("JOBS_WEBHOOK_ALLOWED_HOSTS", [])}
+# Signs webhook calls (HMAC-SHA256 of "<timestamp>.<body>") when set
+jobs_webhook_secret = app_config.str("JOBS_WEBHOOK_SECRET", None)
+jobs_webhook_attempts = 2
+
+JobRunner = Callable[[Job], Awaitable[COAResponse]]
+
+
+class JobStore:
+    def __init__(self, state_dir: str, result_ttl_seconds: int):
+        self.state_dir = Path(state_dir)
+        self.result_ttl_seconds = result_ttl_seconds
+
+    def _get_job_path(self, job_id: str) -> Path:
+        return self.state_dir / f"{Path(job_id).name}.json"
+
+    def save(self, job: Job) -> None:
+        os.makedirs(self.state_dir, exist_ok=True)
+        job_path = self._get_job_path(job.job_id)
+        tmp_path = job_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp_path.write_text(job.model_dump_json())
+        os.replace(tmp_path, job_path)
+
+    def load(self, job_id: str) -> Job | None:
+        try:
+            return Job.model_validate_json(self._get_job_path(job_id).read_text())
+        except FileNotFoundError:
+            return None
+
+    def delete(self, job_id: str) -> None:
+        self._get_job_path(job_id).unlink(missing_ok=True)
+
+    def touch(self, job_ids: list[str]) -> None:
+        for job_id in job_ids:
+            try:
+                os.utime(self._get_job_path(job_id))
+            except FileNotFoundError:
+                pass
+
+    def remove_expired(self) -> None:
+        expire_before = time.time() - self.result_ttl_seconds
+        for job_path in self.state_dir.glob("*.json"):
+            try:
+                if job_path.stat().st_mtime < expire_before:
+                    job_path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def fail_abandoned(self, stale_after_seconds: float, is_abandoned: Callable[[Job], bool] | None = None) -> int:
+        # Queued / running jobs of a process that is gone - not refreshed for stale_after_seconds
+        # or (is_abandoned) known dead, e.g. a previous run of this process
+        stale_before = time.time() - stale_after_seconds
+        failed_jobs = 0
+        for job_path in self.state_dir.glob("*.json"):
+            try:
+                job_mtime = job_path.stat().st_mtime
+                job = Job.model_validate_json(job_path.read_text())
+            except (FileNotFoundError, ValueError):
+                continue
+            if job.status not in (JobStatus.queued, JobStatus.running):
+                continue
+            if job_mtime >= stale_before and not (is_abandoned and is_abandoned(job)):
+                continue
+            job.status = JobStatus.failed
+            job.error = "Job interrupted - the server process running it stopped"
+            job.finished_at = time.time()
+            self.save(job)
+            failed_jobs += 1
+            logger.warning(f"Abandoned job marked failed: job_id={job.job_id}, worker_id={job.worker_id}")
+        return failed_jobs
+
+
+def is_process_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    def __init__(self, store: JobStore, workers: int, queue_depth: int, maintenance_interval_seconds: float):
+        self.store = store
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.maintenance_interval_seconds = maintenance_interval_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue: asyncio.Queue | None = None
+        self._worker_tasks: list[asyncio.Task] = []
+        self._maintenance_task: asyncio.Task | None = None
+        # Queued and running jobs of this process - their records are refreshed by the maintenance task
+        self._live_jobs: dict[str, Job] = {}
+
+    async def start(self) -> None:
+        # Set at start, the process id may differ from import time (e.g. forked server workers)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue = asyncio.Queue(maxsize=self.queue_depth)
+        self._worker_tasks = [asyncio.create_task(self._worker(idx)) for idx in range(self.workers)]
+        await asyncio.to_thread(self.store.remove_expired)
+        failed_jobs = await asyncio.to_thread(
+            self.store.fail_abandoned, self.get_stale_after_seconds(), self._is_abandoned_on_start
+        )
+        self._maintenance_task = asyncio.create_task(self._maintain())
+        logger.info(
+            f"Started job workers: workers={self.workers}, queue_depth={self.queue_depth}, "
+            f"abandoned_jobs_failed={failed_jobs}"
+        )
+
+    async def stop(self) -> None:
+        tasks = [*self._worker_tasks, *([self._maintenance_task] if self._maintenance_task else [])]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._maintenance_task = None
+        # Jobs still waiting in the queue will not run
+        while self._queue is not None and not self._queue.empty():
+            job, _ = self._queue.get_nowait()
+            self._mark_failed(job, "Job cancelled - the server shut down before it started")
+
+    def get_stale_after_seconds(self) -> float:
+        return 3 * self.maintenance_interval_seconds
+
+    def _is_abandoned_on_start(self, job: Job) -> bool:
+        # A previous run of this process (same host - the process id is reused in containers, or not running)
+        if job.worker_id is None or job.job_id in self._live_jobs:
+            return False
+        host, _, pid = job.worker_id.rpartition(":")
+        if host != socket.gethostname():
+            return False
+        return job.worker_id == self.worker_id or not is_process_running(int(pid))
+
+    async def _maintain(self) -> None:
+        while True:
+            await asyncio.sleep(self.maintenance_interval_seconds)
+            try:
+                await asyncio.to_thread(self.store.touch, list(self._live_jobs))
+                await asyncio.to_thread(self.store.remove_expired)
+                await asyncio.to_thread(self.store.fail_abandoned, self.get_stale_after_seconds())
+            except Exception:
+                logger.exception("Job records maintenance failed")
+
+    def is_full(self) -> bool:
+        return self._queue is None or self._queue.full()
+
+    async def submit(self, job: Job, run: JobRunner) -> None:
+        # Raises asyncio.QueueFull when the queue is at capacity
+        if self.is_full():
+            raise asyncio.QueueFull()
+        job.worker_id = self.worker_id
+        # Saved before queuing - a worker picking the job up must not be overwritten by the queued record
+        await asyncio.to_thread(self.store.save, job)
+        try:
+            self._queue.put_nowait((job, run))
+        except asyncio.QueueFull:
+            # Filled up while saving
+            await asyncio.to_thread(self.store.delete, job.job_id)
+            raise
+        self._live_jobs[job.job_id] = job
+
+    def get(self, job_id: str) -> Job | None:
+        return self.store.load(job_id)
+
+    async def _worker(self, worker_idx: int) -> None:
+        while True:
+            job, run = await self._queue.get()
+            try:
+                await self._run_job(job, run)
+            except Exception:
+                logger.exception(f"Job worker {worker_idx} failed handling job {job.job_id}")
+            finally:
+                self._live_jobs.pop(job.job_id, None)
+                self._queue.task_done()
+
+    def _mark_failed(self, job: Job, error: str) -> None:
+        job.status = JobStatus.failed
+        job.error = error
+        job.finished_at = time.time()
+        # Also called while being cancelled - written inline, it is a small file
+        self.store.save(job)
+        self._live_jobs.pop(job.job_id, None)
+
+    async def _run_job(self, job: Job, run: JobRunner) -> None:
+        job.status = JobStatus.running
+        job.started_at = time.time()
+        await asyncio.to_thread(self.store.save, job)
+
+        try:
+            job.result = await run(job)
+            job.status = JobStatus.succeeded
+        except asyncio.CancelledError:
+            logger.warning(f"Job cancelled: job_id={job.job_id}")
+            self._mark_failed(job, "Job cancelled - the server shut down while it was running")
+            raise
+        except Exception as e:
+            logger.exception(f"Job failed: job_id={job.job_id}")
+            job.status = JobStatus.failed
+            job.error = str(e)
+        job.finished_at = time.time()
+        await asyncio.to_thread(self.store.save, job)
+        logger.info(
+            f"Job finished: job_id={job.job_id}, status={job.status.value}, time={job.finished_at - job.started_at:.2f}s"
+        )
+
+        if job.callback_url:
+            await notify_job_webhook(job)
+
+
+def to_job_response(job: Job) -> JobResponse:
+    return JobResponse(**job.model_dump(exclude={"client_id", "callback_url", "worker_id"}))
+
+
+def is_public_address(address: str) -> bool:
+    ip_address = ipaddress.ip_address(address.split("%")[0])
+    if isinstance(ip_address, ipaddress.IPv6Address) and ip_address.ipv4_mapped:
+        ip_address = ip_address.ipv4_mapped
+    return ip_address.is_global and not ip_address.is_multicast
+
+
+async def check_webhook_url(callback_url: str) -> None:
+    # Raises ValueError for URLs the service must not call - checked on submission and again before each delivery
+    # (The host may resolve differently later). Redirects are not followed
+    url = httpx.URL(callback_url)
+    if url.scheme not in ("http", "https"):
+        raise ValueError("callback_url must be an http(s) URL")
+    if not url.host:
+        raise ValueError("callback_url has no host")
+    if url.host.lower() in jobs_webhook_allowed_hosts:
+        return
+    if jobs_webhook_allowed_hosts:
+        raise ValueError(f"callback_url host {url.host} is not allowed")
+    try:
+        address_infos = await asyncio.get_running_loop().getaddrinfo(url.host, url.port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        raise ValueError(f"callback_url host {url.host} cannot be resolved")
+    # Every address must be public - the client may connect to any of them
+    if not all(is_public_address(address_info[4][0]) for address_info in address_infos):
+        raise ValueError(f"callback_url host {url.host} resolves to a non-public address")
+
+
+def get_webhook_signature_headers(body: bytes, secret: str) -> dict[str, str]:
+    # The receiver recomputes the signature and rejects old timestamps (replays)
+    timestamp = str(int(time.time()))
+    signature = hmac.new(secret.encode("utf-8"), f"{timestamp}.".encode("utf-8") + body, hashlib.sha256).hexdigest()
+    return {"x-comprendo-timestamp": timestamp, "x-comprendo-signature": f"sha256={signature}"}
+
+
+async def notify_job_webhook(job: Job) -> None:
+    try:
+        await check_webhook_url(job.callback_url)
+    except ValueError as e:
+        logger.warning(f"Job webhook not delivered: job_id={job.job_id}, error={e}")
+        return
+
+    body = to_job_response(job).model_dump_json().encode("utf-8")
+    headers = {"content-type": "application/json", "x-comprendo-job-id": job.job_id}
+    if jobs_webhook_secret:
+        headers.update(get_webhook_signature_headers(body, jobs_webhook_secret))
+    async with httpx.AsyncClient(timeout=jobs_webhook_timeout_seconds, follow_redirects=False) as client:
+        for attempt in range(1, jobs_webhook_attempts + 1):
+            try:
+                response = await client.post(job.callback_url, content=body, headers=headers)
+                response.raise_for_status()
+                logger.info(f"Job webhook delivered: job_id={job.job_id}, status_code={response.status_code}")
+                return
+            except httpx.HTTPError as e:
+                logger.warning(f"Job webhook failed: job_id={job.job_id}, attempt={attempt}, error={e}")
+
+
+job_queue = JobQueue(
+    JobStore(jobs_state_dir, jobs_result_ttl_seconds),
+    workers=jobs_workers,
+    queue_depth=jobs_queue_depth,
+    maintenance_interval_seconds=jobs_maintenance_interval_seconds,
+)
@@ -2,7 +2,7 @@ import os
 from typing import Annotated
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from openai import BaseModel
+from pydantic import BaseModel
 
 from comprendo.configuration import app_config
 
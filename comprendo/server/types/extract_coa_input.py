@@ -12,3 +12,9 @@ class COARequest(BaseModel):
     id: str | None
     order_number: str
     measurements: List[RequestMeasurement]
+
+
+class COABatchItem(BaseModel):
+    request: COARequest
+    # Uploaded file names of this request
+    files: List[str]
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 
 class MeasurementResultResponse(BaseModel):
@@ -23,3 +23,14 @@ class COAResponse(BaseModel):
     identification_warning: bool
     estimated_cost: float
     mock: Optional[bool] = False
+    experts: Optional[List[str]] = None
+    filtered_pages: int = 0
+    deprioritized_pages: int = 0
+
+
+class COABatchItemResponse(BaseModel):
+    index: int
+    request_id: str
+    status: Literal["succeeded", "failed"]
+    result: Optional[COAResponse] = None
+    error: Optional[str] = None
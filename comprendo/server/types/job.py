@@ -0,0 +1,39 @@
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+from comprendo.server.types.extract_coa_output import COAResponse
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class Job(BaseModel):
+    job_id: str
+    request_id: str
+    client_id: str
+    status: JobStatus = JobStatus.queued
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    callback_url: Optional[str] = None
+    # Server process running the job - "<host>:<pid>"
+    worker_id: Optional[str] = None
+    result: Optional[COAResponse] = None
+    error: Optional[str] = None
+
+
+class JobResponse(BaseModel):
+    job_id: str
+    request_id: str
+    status: JobStatus
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[COAResponse] = None
+    error: Optional[str] = None
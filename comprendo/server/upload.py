@@ -0,0 +1,139 @@
+import asyncio
+import hashlib
+import uuid
+from pathlib import Path
+
+from attrs import define
+from fastapi import HTTPException, UploadFile
+from pdf2image.exceptions import PDFPageCountError, PDFSyntaxError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from comprendo.configuration import app_config
+from comprendo.preprocess.document import detect_file_type, get_pdf_page_count, is_pdf_mime
+from comprendo.telemetry import stage_span
+
+MB = 1024 * 1024
+
+upload_chunk_size = app_config.int("UPLOAD_CHUNK_SIZE_KB", 1024) * 1024
+upload_max_file_bytes = app_config.int("UPLOAD_MAX_FILE_MB", 50) * MB
+upload_max_request_bytes = app_config.int("UPLOAD_MAX_REQUEST_MB", 200) * MB
+upload_max_file_pages = app_config.int("UPLOAD_MAX_FILE_PAGES", 100)
+upload_max_request_pages = app_config.int("UPLOAD_MAX_REQUEST_PAGES", 300)
+
+
+@define
+class StoredDocument:
+    path: Path
+    sha256: str
+    size: int
+    page_count: int
+
+
+def upload_too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=413, detail=detail)
+
+
+class RequestSizeLimitMiddleware:
+    # Rejects oversized request bodies before they are parsed
+    # Declared Content-Length is checked up front, chunked bodies are counted as they arrive
+    def __init__(self, app: ASGIApp, max_body_bytes: int, path_max_body_bytes: dict[str, int] | None = None):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+        self.path_max_body_bytes = path_max_body_bytes or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        max_body_bytes = self.path_max_body_bytes.get(scope["path"], self.max_body_bytes)
+        if max_body_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_body_bytes:
+            await self._send_too_large(send, max_body_bytes)
+            return
+
+        received_bytes = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                received_bytes += len(message.get("body", b""))
+                if received_bytes > max_body_bytes:
+                    # Raised inside body parsing - FastAPI re-raises it as the response
+                    raise upload_too_large(f"Request body exceeds {max_body_bytes} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _send_too_large(self, send: Send, max_body_bytes: int):
+        body = f'{{"detail":"Request body exceeds {max_body_bytes} bytes"}}'.encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+
+def upload_unprocessable(detail: str) -> HTTPException:
+    return HTTPException(status_code=422, detail=detail)
+
+
+def get_document_page_count(document_location: Path) -> int:
+    if is_pdf_mime(detect_file_type(document_location)):
+        return get_pdf_page_count(document_location)
+    return 1
+
+
+async def store_upload_file(file: UploadFile, storage_dir: Path, max_bytes: int) -> StoredDocument:
+    file_id = str(uuid.uuid4())
+    input_filename = Path(file.filename).name
+    file_path = storage_dir / f"{file_id}-{input_filename}"
+
+    # The form parser has spooled the upload already (memory, then a temporary file past 1 MB)
+    # Copy it in chunks - hashed while copying, without reading the whole file into memory
+    hasher = hashlib.sha256()
+    size = 0
+    with stage_span("upload_write"):
+        f = await asyncio.to_thread(open, file_path, "wb")
+        try:
+            while chunk := await file.read(upload_chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise upload_too_large(f"File {input_filename} exceeds the allowed upload size")
+                hasher.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+
+    try:
+        page_count = await asyncio.to_thread(get_document_page_count, file_path)
+    except (PDFPageCountError, PDFSyntaxError):
+        # Corrupt, truncated or password protected PDFs - pdfinfo cannot read them
+        raise upload_unprocessable(f"File {input_filename} is not a readable PDF (Corrupt or encrypted)")
+    if page_count > upload_max_file_pages:
+        raise upload_too_large(f"File {input_filename} has {page_count} pages, max is {upload_max_file_pages}")
+
+    return StoredDocument(path=file_path, sha256=hasher.hexdigest(), size=size, page_count=page_count)
+
+
+async def store_upload_files(files: list[UploadFile], storage_dir: Path) -> list[StoredDocument]:
+    stored_documents: list[StoredDocument] = []
+    request_bytes = 0
+    request_pages = 0
+    for file in files:
+        max_file_bytes = min(upload_max_file_bytes, upload_max_request_bytes - request_bytes)
+        stored_document = await store_upload_file(file, storage_dir, max_file_bytes)
+        request_bytes += stored_document.size
+        request_pages += stored_document.page_count
+        if request_pages > upload_max_request_pages:
+            raise upload_too_large(f"Request has more than {upload_max_request_pages} pages")
+        stored_documents.append(stored_document)
+    return stored_documents
@@ -0,0 +1,171 @@
+import asyncio
+import math
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator
+
+from opentelemetry import metrics, trace
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import Histogram, InMemoryMetricReader, Metric, Sum
+from opentelemetry.sdk.metrics.view import ExplicitBucketHistogramAggregation, View
+from opentelemetry.sdk.resources import Resource
+
+from comprendo import __version__
+from comprendo.configuration import app_config
+
+if TYPE_CHECKING:
+    # Not imported at runtime - this module is loaded by the rasterization workers too
+    from langchain_core.messages import AIMessage
+
+# Stage metrics are kept in process and exposed on /metrics (Prometheus text format) - with or without Azure Monitor
+metrics_enabled = app_config.bool("METRICS_ENABLED", True)
+# Stage duration buckets (seconds) - from MIME sniffing to long expert calls
+metrics_duration_buckets = [
+    float(bound)
+    for bound in app_config.list(
+        "METRICS_DURATION_BUCKETS", [0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120, 300]
+    )
+]
+
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Spans go to the global tracer provider - exported when Azure Monitor is configured
+tracer = trace.get_tracer("comprendo", __version__)
+
+metric_reader: InMemoryMetricReader | None = None
+if metrics_enabled:
+    metric_reader = InMemoryMetricReader()
+    meter_provider = MeterProvider(
+        metric_readers=[metric_reader],
+        resource=Resource.create({"service.name": "comprendo", "service.version": __version__}),
+        views=[
+            View(
+                instrument_name="comprendo_*_seconds",
+                aggregation=ExplicitBucketHistogramAggregation(boundaries=metrics_duration_buckets),
+            )
+        ],
+    )
+    meter = meter_provider.get_meter("comprendo", __version__)
+else:
+    meter = metrics.NoOpMeter("comprendo")
+
+stage_duration = meter.create_histogram(
+    "comprendo_stage_duration_seconds", unit="s", description="Duration of extraction stages"
+)
+stage_in_flight = meter.create_up_down_counter(
+    "comprendo_stage_in_flight", description="Extraction stages running right now"
+)
+rasterize_page_duration = meter.create_histogram(
+    "comprendo_rasterize_page_seconds", unit="s", description="Rasterization time per page (Averaged over a job)"
+)
+model_tokens = meter.create_counter(
+    "comprendo_model_tokens", unit="{token}", description="Model call tokens by direction (input / output)"
+)
+model_queue_wait = meter.create_histogram(
+    "comprendo_model_queue_wait_seconds",
+    unit="s",
+    description="Wait for a model call slot (Concurrency and rate limits)",
+)
+model_cost = meter.create_counter("comprendo_model_cost_usd", unit="USD", description="Estimated model call cost")
+
+
+@contextmanager
+def stage_span(stage: str, **attributes) -> Iterator[trace.Span]:
+    # A span per stage run, with its duration and in-flight count as metrics
+    # Attributes are metric labels too - keep them low cardinality (model, provider - no ids)
+    stage_attributes = {"stage": stage, **{key: value for key, value in attributes.items() if value is not None}}
+    outcome = "error"
+    stage_in_flight.add(1, stage_attributes)
+    start_time = time.perf_counter()
+    try:
+        with tracer.start_as_current_span(f"comprendo.{stage}", attributes=stage_attributes) as span:
+            yield span
+        outcome = "ok"
+    except asyncio.CancelledError:
+        outcome = "cancelled"
+        raise
+    finally:
+        stage_in_flight.add(-1, stage_attributes)
+        stage_duration.record(time.perf_counter() - start_time, {**stage_attributes, "outcome": outcome})
+
+
+def record_rasterized_pages(pages: int, seconds: float, kind: str) -> None:
+    # Pages are rendered in jobs of a few pages - each page gets the job average
+    for _ in range(pages):
+        rasterize_page_duration.record(seconds / pages, {"kind": kind})
+
+
+def record_model_tokens(stage: str, provider: str, model: str, response: "AIMessage | dict") -> None:
+    # Structured output runnables return {"raw": AIMessage, "parsed": ...}
+    message = response.get("raw") if isinstance(response, dict) else response
+    usage_metadata = getattr(message, "usage_metadata", None)
+    if not usage_metadata:
+        return
+    attributes = {"stage": stage, "provider": provider, "model": model}
+    model_tokens.add(usage_metadata["input_tokens"], {**attributes, "direction": "input"})
+    model_tokens.add(usage_metadata["output_tokens"], {**attributes, "direction": "output"})
+
+
+def record_model_queue_wait(stage: str, provider: str, model: str, seconds: float) -> None:
+    model_queue_wait.record(seconds, {"stage": stage, "provider": provider, "model": model})
+
+
+def record_model_cost(stage: str, provider: str, model: str, cost: float) -> None:
+    model_cost.add(cost, {"stage": stage, "provider": provider, "model": model})
+
+
+def format_prometheus_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_prometheus_labels(attributes: dict) -> str:
+    if not attributes:
+        return ""
+    labels = []
+    for key, value in attributes.items():
+        escaped_value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        labels.append(f'{key.replace(".", "_")}="{escaped_value}"')
+    return "{" + ",".join(labels) + "}"
+
+
+def format_prometheus_metric(metric: Metric) -> list[str]:
+    data = metric.data
+    if isinstance(data, Histogram):
+        metric_type, name = "histogram", metric.name
+    elif isinstance(data, Sum) and data.is_monotonic:
+        metric_type, name = "counter", f"{metric.name}_total"
+    else:
+        # Up / down counters and gauges
+        metric_type, name = "gauge", metric.name
+
+    lines = [f"# HELP {name} {metric.description}", f"# TYPE {name} {metric_type}"]
+    for point in data.data_points:
+        attributes = dict(point.attributes or {})
+        if metric_type != "histogram":
+            lines.append(f"{name}{format_prometheus_labels(attributes)} {format_prometheus_value(point.value)}")
+            continue
+        # Prometheus buckets are cumulative, OpenTelemetry buckets are not
+        bucket_count = 0
+        for bound, count in zip([*point.explicit_bounds, math.inf], point.bucket_counts):
+            bucket_count += count
+            bucket_labels = format_prometheus_labels({**attributes, "le": format_prometheus_value(float(bound))})
+            lines.append(f"{name}_bucket{bucket_labels} {bucket_count}")
+        lines.append(f"{name}_sum{format_prometheus_labels(attributes)} {format_prometheus_value(point.sum)}")
+        lines.append(f"{name}_count{format_prometheus_labels(attributes)} {point.count}")
+    return lines
+
+
+def render_prometheus_metrics() -> str:
+    if metric_reader is None:
+        return ""
+    metrics_data = metric_reader.get_metrics_data()
+    if metrics_data is None:
+        return ""
+    lines = []
+    for resource_metrics in metrics_data.resource_metrics:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                lines.extend(format_prometheus_metric(metric))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,5 @@
+from comprendo.types.image_artifact import ImageArtifact
+from comprendo.types.text_artifact import TextArtifact
+
+# A document page as sent to the experts - a rendered image or its text layer
+DocumentArtifact = ImageArtifact | TextArtifact
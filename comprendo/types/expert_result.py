@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+
+class ExpertResult(BaseModel):
+    expert: str
+    content: str
+    time: float
+    cached: bool = False
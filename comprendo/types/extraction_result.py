@@ -9,3 +9,9 @@ class ExtractionResult(BaseModel):
     request_id: str
     consolidated_report: ConsolidatedReport
     errors: Optional[List[str]] = None
+    # Experts which took part in the extraction
+    experts: Optional[List[str]] = None
+    # Pages dropped by the local page filter before extraction
+    filtered_pages: int = 0
+    # Pages the local page filter sent after the relevant pages
+    deprioritized_pages: int = 0
@@ -1,27 +1,78 @@
 from io import BytesIO
 import base64
+import hashlib
+import mmap
+import tempfile
 
 from PIL import Image
-from attrs import define
+from attrs import define, field
 
 
 @define
 class ImageArtifact:
-    value: bytes
+    # Encoded image - a read only memory map of a temp file once spilled (See spill)
+    # Compared by content hash (See __eq__) - in memory and spilled images of the same bytes are equal
+    value: bytes | mmap.mmap = field(eq=False)
     format: str
     width: int
     height: int
+    # Render resolution - known for rendered PDF pages only
+    dpi: int | None = None
+    # Source document and 1-based page number within it
+    source: str | None = None
+    page: int | None = None
+    _content_hash: str | None = field(default=None, init=False, eq=False)
+    _base64: str | None = field(default=None, init=False, eq=False, repr=False)
 
     @property
     def base64(self) -> str:
-        return base64.b64encode(self.value).decode('utf8')
+        if self.is_spilled:
+            # Not kept - the encoding lives as long as the expert message only, the image stays out of RAM
+            return base64.b64encode(self.value).decode("utf8")
+        # Encoded once - the same string is shared by all the experts sending this image
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.value).decode("utf8")
+        return self._base64
+
+    @property
+    def is_spilled(self) -> bool:
+        return isinstance(self.value, mmap.mmap)
+
+    def spill(self) -> None:
+        # Move the image bytes to an (unlinked) temp file mapped in memory - pages the OS can drop under pressure
+        if self.is_spilled or not self.value:
+            return
+        with tempfile.TemporaryFile(prefix="comprendo-image-") as spill_file:
+            spill_file.write(self.value)
+            spill_file.flush()
+            # The mapping stays valid after the file is closed
+            self.value = mmap.mmap(spill_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._base64 = None
 
     @property
     def mime_type(self) -> str:
         return f"image/{self.format}"
 
+    def content_hash(self) -> str:
+        # Computed once - used as the cache identity of the image
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.value).hexdigest()
+        return self._content_hash
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ImageArtifact):
+            return NotImplemented
+        return (self.format, self.width, self.height, self.dpi, self.source, self.page) == (
+            other.format,
+            other.width,
+            other.height,
+            other.dpi,
+            other.source,
+            other.page,
+        ) and self.content_hash() == other.content_hash()
+
     def to_bytes(self) -> bytes:
-        return self.value
+        return self.value[:] if self.is_spilled else self.value
 
     def to_text(self) -> str:
         return f"<Image ({self.format}), {self.width}x{self.height}, {len(self.value)} bytes>"
@@ -38,11 +89,19 @@ class ImageArtifact:
     def __len__(self) -> int:
         return len(self.value)
 
+    def __reduce__(self):
+        # Sent to the rasterization pool workers - memory maps are not picklable
+        return (
+            self.__class__,
+            (self.to_bytes(), self.format, self.width, self.height, self.dpi, self.source, self.page),
+        )
+
     @classmethod
-    def from_pil_image(cls, pil_image: Image, format: str = "PNG"):
+    def from_pil_image(cls, pil_image: Image, format: str = "PNG", dpi: int | None = None, **save_params):
         byte_stream = BytesIO()
-        pil_image.save(byte_stream, format=format)
+        pil_image.save(byte_stream, format=format, **save_params)
         byte_stream.seek(0)
+        # The format is the encoded one - not the source image format
         return cls(
-            byte_stream.getvalue(), format=pil_image.format.lower(), width=pil_image.width, height=pil_image.height
+            byte_stream.getvalue(), format=format.lower(), width=pil_image.width, height=pil_image.height, dpi=dpi
         )
@@ -5,5 +5,7 @@ from comprendo.server.types.extract_coa_input import COARequest
 
 class Task(BaseModel):
     request: COARequest
+    # Scopes what is learned from the task (e.g. measurement mappings) to the client
+    client_id: str | None = None
     mock_mode: bool = False
     cost: float = 0.0
@@ -0,0 +1,34 @@
+import hashlib
+
+from attrs import define, field
+
+
+@define
+class TextArtifact:
+    # Layout preserving text of a document page (PDF text layer)
+    value: str
+    # Source document and 1-based page number within it
+    source: str | None = None
+    page: int | None = None
+    _content_hash: str | None = field(default=None, init=False, eq=False)
+
+    def content_hash(self) -> str:
+        # Computed once - used as the cache identity of the text
+        if self._content_hash is None:
+            self._content_hash = hashlib.sha256(self.value.encode("utf8")).hexdigest()
+        return self._content_hash
+
+    def to_text(self) -> str:
+        return self.value
+
+    def __str__(self) -> str:
+        return f"<Text, page {self.page}, {len(self.value)} chars>"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+    def __bool__(self) -> bool:
+        return bool(self.value)
+
+    def __len__(self) -> int:
+        return len(self.value)
@@ -1,25 +1,49 @@
+import asyncio
 import json
+import shutil
+import time
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import Annotated, List
+from tempfile import TemporaryDirectory, mkdtemp
+from typing import Annotated, List, Optional
 
 from fastapi import Depends, FastAPI, File, Form, Header, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from fastapi.middleware.cors import CORSMiddleware
 
 from comprendo import __version__ as SERVER_VERSION
 from comprendo.app_logging import set_logging_context
 from comprendo.configuration import app_config
+from comprendo.extraction.mapping_memory import mapping_memory
+from comprendo.extraction.model_clients import close_model_clients, open_model_clients
+from comprendo.preprocess.rasterize import rasterization_engine
 from comprendo.process import process_task
+from comprendo.server.batch import (
+    NDJSON_MEDIA_TYPE,
+    batch_max_items,
+    batch_max_request_bytes,
+    stream_batch_results,
+)
+from comprendo.server.events import SSE_HEADERS, SSE_MEDIA_TYPE, stream_task_progress
+from comprendo.server.jobs import check_webhook_url, job_queue, to_job_response
 from comprendo.server.security import ClientCredentials, validate_api_key
-from comprendo.server.types.extract_coa_input import COARequest
+from comprendo.server.upload import (
+    MB,
+    RequestSizeLimitMiddleware,
+    StoredDocument,
+    store_upload_files,
+    upload_max_request_bytes,
+)
+from comprendo.server.types.extract_coa_input import COABatchItem, COARequest
 from comprendo.server.types.extract_coa_output import (
     BatchDataResponse,
     COAResponse,
     MeasurementResultResponse,
 )
+from comprendo.server.types.job import Job
+from comprendo.telemetry import PROMETHEUS_MEDIA_TYPE, metrics_enabled, render_prometheus_metrics
 from comprendo.types.consolidated_report import (
     ConsolidatedBatch,
     ConsolidatedMeasurementResult,
@@ -27,7 +51,27 @@ from comprendo.types.consolidated_report import (
 from comprendo.types.extraction_result import ExtractionResult
 from comprendo.types.task import Task
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Model clients and their connection pools are shared by all requests
+    await open_model_clients()
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    await close_model_clients()
+    rasterization_engine.shutdown()
+    if mapping_memory is not None:
+        mapping_memory.close()
+
+
+app = FastAPI(lifespan=lifespan)
+# Allow some room for the multipart framing and the request metadata field
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_body_bytes=upload_max_request_bytes + MB,
+    path_max_body_bytes={"/extract/coa/batch": batch_max_request_bytes + MB},
+)
 
 if app_config.bool("CORS_ALLOW_ALL", False):
     app.add_middleware(
@@ -72,6 +116,9 @@ def map_extraction_result_to_response(task: Task, extraction_result: ExtractionR
         estimated_cost=task.cost,
         # Errors?
         batches=response_batches,
+        experts=extraction_result.experts,
+        filtered_pages=extraction_result.filtered_pages,
+        deprioritized_pages=extraction_result.deprioritized_pages,
     )
 
     if task.mock_mode:
@@ -93,6 +140,75 @@ async def ping():
     return JSONResponse(content={"server_version": SERVER_VERSION})
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Stage metrics for Prometheus scraping - no API key, like /ping.
+    Returns:
+      - Stage durations, in-flight stages, rasterization time per page, model tokens and cost (Prometheus text format)
+    """
+    if not metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(content=render_prometheus_metrics(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
+def parse_coa_request(request: str) -> COARequest:
+    # Parse metadata JSON
+    try:
+        input_data = COARequest(**json.loads(request))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metadata JSON: {str(e)}")
+
+    if not input_data.id:
+        input_data.id = str(uuid.uuid4())
+
+    return input_data
+
+
+def parse_coa_batch_request(requests: str) -> list[COABatchItem]:
+    try:
+        items = [COABatchItem(**item) for item in json.loads(requests)]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch requests JSON: {str(e)}")
+
+    if not items:
+        raise HTTPException(status_code=400, detail="Batch has no requests")
+    if len(items) > batch_max_items:
+        raise HTTPException(status_code=400, detail=f"Batch has more than {batch_max_items} requests")
+    for item in items:
+        if not item.files or len(set(item.files)) != len(item.files):
+            raise HTTPException(status_code=400, detail=f"Batch request {item.request.id} files are empty or repeated")
+        if not item.request.id:
+            item.request.id = str(uuid.uuid4())
+
+    return items
+
+
+def map_batch_files(items: list[COABatchItem], files: list[UploadFile]) -> dict[str, UploadFile]:
+    # Requests refer to their uploads by file name
+    files_by_name: dict[str, UploadFile] = {}
+    for file in files:
+        filename = Path(file.filename).name
+        if filename in files_by_name:
+            raise HTTPException(status_code=400, detail=f"Duplicate file name in batch: {filename}")
+        files_by_name[filename] = file
+
+    referenced_filenames = {filename for item in items for filename in item.files}
+    if missing_filenames := referenced_filenames - files_by_name.keys():
+        raise HTTPException(status_code=400, detail=f"Files not uploaded: {sorted(missing_filenames)}")
+    if unused_filenames := files_by_name.keys() - referenced_filenames:
+        raise HTTPException(status_code=400, detail=f"Files not used by any request: {sorted(unused_filenames)}")
+    return files_by_name
+
+
+async def run_coa_task(task: Task, client: ClientCredentials, stored_documents: list[StoredDocument]) -> COAResponse:
+    documents_paths = [stored_document.path for stored_document in stored_documents]
+    documents_hashes = [stored_document.sha256 for stored_document in stored_documents]
+    set_logging_context(task=task, client=client)
+    extraction_result = await process_task(task, documents_paths, documents_hashes)
+    return map_extraction_result_to_response(task, extraction_result)
+
+
 @app.post("/extract/coa")
 async def extract_coa(
     client: Annotated[ClientCredentials, Depends(validate_api_key)],
@@ -109,38 +225,206 @@ async def extract_coa(
     Returns:
       - JSON response conforming to COAResponse model
     """
-
-    # Parse metadata JSON
-    try:
-        input_data = COARequest(**json.loads(request))
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid metadata JSON: {str(e)}")
-
-    if not input_data.id:
-        input_data.id = str(uuid.uuid4())
+    input_data = parse_coa_request(request)
 
     with TemporaryDirectory(suffix=f"-coa-{input_data.id}") as task_storage_dir:
         storage_dir_path = Path(task_storage_dir)
-        # Store files locally in a temporary processing dir
-        input_files = []
-        for file in files:
-            file_id = str(uuid.uuid4())
-            input_filename = Path(file.filename).name
-            file_path = storage_dir_path / f"{file_id}-{input_filename}"
-            with open(file_path, "wb") as f:
-                f.write(await file.read())
-            input_files.append((file_path, file_id))
-
-        documents_paths = [Path(doc_file_path) for doc_file_path, _ in input_files]
+        # Copy files to a temporary processing dir - hashed while copying, oversized uploads are rejected early
+        stored_documents = await store_upload_files(files, storage_dir_path)
+
         task = Task(
             request=input_data,
+            client_id=client.id,
             mock_mode=mock_mode,
         )
-        set_logging_context(task=task, client=client)
-        extraction_result = await process_task(task, documents_paths)
-        response = map_extraction_result_to_response(task, extraction_result)
+        response = await run_coa_task(task, client, stored_documents)
 
     return JSONResponse(content=response.model_dump())
 
 
+@app.post("/extract/coa/stream")
+async def extract_coa_stream(
+    client: Annotated[ClientCredentials, Depends(validate_api_key)],
+    mock_mode: Annotated[bool, Depends(detect_mock_mode)],
+    files: List[UploadFile] = File(...),
+    request: str = Form(...),
+):
+    """
+    Streaming variant of /extract/coa.
+    Expects:
+      - files (1 or more PDFs) in multipart/form-data
+      - metadata (JSON) in multipart/form-data
+    Returns:
+      - Server-sent events - stage progress as each stage finishes, then a result event with the COAResponse
+    """
+    input_data = parse_coa_request(request)
+
+    # Files must outlive this handler - removed when the stream ends
+    task_storage_dir = Path(mkdtemp(suffix=f"-coa-{input_data.id}"))
+    try:
+        stored_documents = await store_upload_files(files, task_storage_dir)
+    except Exception:
+        shutil.rmtree(task_storage_dir, ignore_errors=True)
+        raise
+
+    task = Task(
+        request=input_data,
+        client_id=client.id,
+        mock_mode=mock_mode,
+    )
+
+    async def run_task() -> COAResponse:
+        return await run_coa_task(task, client, stored_documents)
+
+    async def stream_events():
+        try:
+            async for event in stream_task_progress(input_data.id, run_task):
+                yield event
+        finally:
+            shutil.rmtree(task_storage_dir, ignore_errors=True)
+
+    return StreamingResponse(stream_events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
+
+
+@app.post("/extract/coa/batch")
+async def extract_coa_batch(
+    client: Annotated[ClientCredentials, Depends(validate_api_key)],
+    mock_mode: Annotated[bool, Depends(detect_mock_mode)],
+    files: List[UploadFile] = File(...),
+    requests: str = Form(...),
+):
+    """
+    Endpoint to process many COA requests in one call.
+    Expects:
+      - files (1 or more PDFs) in multipart/form-data
+      - requests (JSON list of {"request": COARequest, "files": [file names]}) in multipart/form-data
+    Returns:
+      - NDJSON stream - a COABatchItemResponse line per request as it finishes
+    """
+    items = parse_coa_batch_request(requests)
+    files_by_name = map_batch_files(items, files)
+
+    # Files must outlive this handler - removed when the stream ends
+    batch_storage_dir = Path(mkdtemp(suffix="-coa-batch"))
+    try:
+        items_documents: list[list[StoredDocument]] = []
+        for idx, item in enumerate(items):
+            item_storage_dir = batch_storage_dir / str(idx)
+            item_storage_dir.mkdir()
+            item_files = [files_by_name[filename] for filename in item.files]
+            # A file may be used by several requests
+            for file in item_files:
+                await file.seek(0)
+            # Upload limits apply per request
+            items_documents.append(await store_upload_files(item_files, item_storage_dir))
+    except Exception:
+        shutil.rmtree(batch_storage_dir, ignore_errors=True)
+        raise
+
+    async def run_item(idx: int, item: COABatchItem) -> COAResponse:
+        task = Task(
+            request=item.request,
+            client_id=client.id,
+            mock_mode=mock_mode,
+        )
+        return await run_coa_task(task, client, items_documents[idx])
+
+    async def stream_results():
+        try:
+            async for line in stream_batch_results(items, run_item):
+                yield line
+        finally:
+            shutil.rmtree(batch_storage_dir, ignore_errors=True)
+
+    return StreamingResponse(stream_results(), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def validate_callback_url(callback_url: str | None) -> str | None:
+    if not callback_url:
+        return None
+    try:
+        await check_webhook_url(callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return callback_url
+
+
+@app.post("/jobs/coa", status_code=202)
+async def submit_coa_job(
+    client: Annotated[ClientCredentials, Depends(validate_api_key)],
+    mock_mode: Annotated[bool, Depends(detect_mock_mode)],
+    files: List[UploadFile] = File(...),
+    request: str = Form(...),
+    callback_url: Optional[str] = Form(None),
+):
+    """
+    Submit a COA extraction job - returns at once with a job id.
+    The result is available from GET /jobs/{job_id} and optionally POSTed to callback_url.
+    """
+    input_data = parse_coa_request(request)
+    callback_url = await validate_callback_url(callback_url)
+
+    # Fail fast before storing the uploads
+    if job_queue.is_full():
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later")
+
+    # Files must outlive this request - removed by the job when done
+    task_storage_dir = Path(mkdtemp(suffix=f"-coa-{input_data.id}"))
+    try:
+        stored_documents = await store_upload_files(files, task_storage_dir)
+    except Exception:
+        shutil.rmtree(task_storage_dir, ignore_errors=True)
+        raise
+
+    task = Task(
+        request=input_data,
+        client_id=client.id,
+        mock_mode=mock_mode,
+    )
+    job = Job(
+        job_id=str(uuid.uuid4()),
+        request_id=input_data.id,
+        client_id=client.id,
+        created_at=time.time(),
+        callback_url=callback_url,
+    )
+
+    async def run_job(job: Job) -> COAResponse:
+        try:
+            return await run_coa_task(task, client, stored_documents)
+        finally:
+            shutil.rmtree(task_storage_dir, ignore_errors=True)
+
+    try:
+        await job_queue.submit(job, run_job)
+    except asyncio.QueueFull:
+        shutil.rmtree(task_storage_dir, ignore_errors=True)
+        raise HTTPException(status_code=429, detail="Job queue is full, retry later")
+
+    return JSONResponse(status_code=202, content=to_job_response(job).model_dump(mode="json"))
+
+
+@app.get("/jobs/{job_id}")
+async def get_coa_job(
+    client: Annotated[ClientCredentials, Depends(validate_api_key)],
+    job_id: str,
+):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    # Jobs of other clients are reported as not found
+    if job is None or job.client_id != client.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=to_job_response(job).model_dump(mode="json"))
+
+
+@app.delete("/mapping-memory")
+async def forget_mapping_memory(
+    client: Annotated[ClientCredentials, Depends(validate_api_key)],
+):
+    # Remembered measurement mappings of the calling client only - e.g. after a wrong mapping was reported
+    forgotten = 0
+    if mapping_memory is not None:
+        forgotten = await asyncio.to_thread(mapping_memory.forget, client.id)
+    return {"forgotten": forgotten}
+
+
 FastAPIInstrumentor.instrument_app(app)
@@ -0,0 +1,9 @@
+import os
+
+# Settings are read on import - tests run without the disk caches, stores and provider credentials
+os.environ.setdefault("EXTRACTION_CACHE_ENABLED", "false")
+os.environ.setdefault("RASTER_CACHE_ENABLED", "false")
+os.environ.setdefault("MAPPING_MEMORY_ENABLED", "false")
+os.environ.setdefault("MODEL_CASSETTE_MODE", "off")
+os.environ.setdefault("METRICS_ENABLED", "true")
+os.environ.setdefault("LOG_QUEUE_ENABLED", "false")
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import server
+from comprendo.server import batch
+from comprendo.server.types.extract_coa_input import COABatchItem, COARequest
+from comprendo.server.types.extract_coa_output import COAResponse
+
+
+def create_items(count: int) -> list[COABatchItem]:
+    return [
+        COABatchItem(request=COARequest(id=f"request-{idx}", order_number="PO-1", measurements=[]), files=["a.pdf"])
+        for idx in range(count)
+    ]
+
+
+def stream_results(items: list[COABatchItem], run) -> list[dict]:
+    async def collect():
+        return [json.loads(line) async for line in batch.stream_batch_results(items, run)]
+
+    return asyncio.run(collect())
+
+
+def test_results_stream_in_completion_order():
+    async def run(idx: int, item: COABatchItem) -> COAResponse:
+        await asyncio.sleep(0.03 if idx == 0 else 0.01)
+        return COAResponse.model_construct()
+
+    lines = stream_results(create_items(2), run)
+    assert [(line["index"], line["request_id"], line["status"]) for line in lines] == [
+        (1, "request-1", "succeeded"),
+        (0, "request-0", "succeeded"),
+    ]
+
+
+def test_failed_item_does_not_fail_the_batch():
+    async def run(idx: int, item: COABatchItem) -> COAResponse:
+        if idx == 1:
+            raise HTTPException(status_code=413, detail="File too large")
+        return COAResponse.model_construct()
+
+    lines = sorted(stream_results(create_items(3), run), key=lambda line: line["index"])
+    assert [line["status"] for line in lines] == ["succeeded", "failed", "succeeded"]
+    assert lines[1]["error"] == "File too large"
+
+
+def test_items_run_within_the_batch_concurrency():
+    running = []
+    max_running = []
+
+    async def run(idx: int, item: COABatchItem) -> COAResponse:
+        running.append(idx)
+        max_running.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(idx)
+        return COAResponse.model_construct()
+
+    # A new event loop per batch - as separate test runs or CLI calls
+    for _ in range(2):
+        assert len(stream_results(create_items(batch.batch_concurrency + 2), run)) == batch.batch_concurrency + 2
+    assert max(max_running) == batch.batch_concurrency
+
+
+def test_closed_stream_cancels_the_remaining_items():
+    cancelled = []
+
+    async def run(idx: int, item: COABatchItem) -> COAResponse:
+        try:
+            await asyncio.sleep(0.01 if idx == 0 else 5)
+        except asyncio.CancelledError:
+            cancelled.append(idx)
+            raise
+        return COAResponse.model_construct()
+
+    async def read_first_line():
+        results = batch.stream_batch_results(create_items(3), run)
+        first_line = await anext(results)
+        # The client went away
+        await results.aclose()
+        return json.loads(first_line)
+
+    assert asyncio.run(read_first_line())["index"] == 0
+    assert sorted(cancelled) == [1, 2]
+
+
+def test_parse_batch_request_validation():
+    request = {"id": None, "order_number": "PO-1", "measurements": []}
+    items = server.parse_coa_batch_request(json.dumps([{"request": request, "files": ["a.pdf"]}]))
+    assert items[0].request.id
+
+    for requests in ("[]", json.dumps([{"request": request, "files": ["a.pdf", "a.pdf"]}]), "not json"):
+        with pytest.raises(HTTPException) as exc_info:
+            server.parse_coa_batch_request(requests)
+        assert exc_info.value.status_code == 400
+
+
+def test_map_batch_files_requires_every_file_used_once():
+    items = create_items(1)
+
+    def create_upload_files(*filenames: str) -> list[UploadFile]:
+        return [UploadFile(file=BytesIO(b"%PDF"), filename=filename) for filename in filenames]
+
+    assert list(server.map_batch_files(items, create_upload_files("a.pdf"))) == ["a.pdf"]
+    for filenames in (("b.pdf",), ("a.pdf", "b.pdf"), ("a.pdf", "dir/a.pdf")):
+        with pytest.raises(HTTPException):
+            server.map_batch_files(items, create_upload_files(*filenames))
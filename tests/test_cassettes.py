@@ -0,0 +1,75 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from comprendo.app_logging import ctx_task
+from comprendo.extraction.cassettes import ModelCassette, ctx_model_call_shard, get_request_key
+from comprendo.server.types.extract_coa_input import COARequest
+from comprendo.types.task import Task
+
+
+def set_task(request_id: str):
+    ctx_task.set(Task.model_construct(request=COARequest.model_construct(id=request_id)))
+
+
+def get_shard_request_key(shard_idx: int | None) -> str:
+    ctx_model_call_shard.set(shard_idx)
+    return get_request_key("expert", "anthropic", "claude-test")
+
+
+def test_request_key_tells_shards_apart():
+    def get_keys():
+        set_task("request-1")
+        return [get_shard_request_key(shard_idx) for shard_idx in (None, 0, 1)]
+
+    keys = asyncio.run(asyncio.to_thread(get_keys))
+    assert len(set(keys)) == 3
+
+
+def test_request_match_replays_each_shard_its_answer(tmp_path):
+    cassette_path = str(tmp_path / "cassette.jsonl")
+
+    async def call_shards(cassette: ModelCassette, shard_delays: list[float]) -> list[str]:
+        async def call_shard(shard_idx: int, delay: float) -> str:
+            set_task("request-1")
+            ctx_model_call_shard.set(shard_idx)
+            await asyncio.sleep(delay)
+
+            async def invoke():
+                return AIMessage(content=f"shard {shard_idx} report")
+
+            prompt = [HumanMessage(content=f"shard {shard_idx} images")]
+            response = await cassette.ainvoke("expert", "anthropic", "claude-test", prompt, invoke)
+            return response.content
+
+        return await asyncio.gather(*[call_shard(idx, delay) for idx, delay in enumerate(shard_delays)])
+
+    recorder = ModelCassette(cassette_path, mode="record", match="request", replay_latency_scale=0)
+    asyncio.run(call_shards(recorder, [0, 0.02]))
+    player = ModelCassette(cassette_path, mode="replay", match="request", replay_latency_scale=0)
+    # Shards answered in the other order than recorded
+    assert asyncio.run(call_shards(player, [0.02, 0])) == ["shard 0 report", "shard 1 report"]
+
+    with open(cassette_path) as f:
+        assert sorted(json.loads(line)["shard"] for line in f) == [0, 1]
+
+
+def test_cassette_turns_model_call_skipping_caches_off(tmp_path):
+    code = (
+        "from comprendo.extraction import caching, mapping_memory; "
+        "print(caching.extraction_cache is None, mapping_memory.mapping_memory is None)"
+    )
+    env = {
+        **os.environ,
+        "MODEL_CASSETTE_MODE": "replay",
+        "MODEL_CASSETTE_PATH": str(tmp_path / "cassette.jsonl"),
+        "EXTRACTION_CACHE_ENABLED": "true",
+        "EXTRACTION_CACHE_DIR": str(tmp_path / "extraction_cache"),
+        "MAPPING_MEMORY_ENABLED": "true",
+    }
+    completed = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == "True True"
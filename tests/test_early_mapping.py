@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from comprendo.extraction import extract
+from comprendo.types.consolidated_report import ConsolidatedBatch, ConsolidatedMeasurementResult, ConsolidatedReport
+from comprendo.types.expert_result import ExpertResult
+from comprendo.types.measurement_mapping import MeasurementMappingEntry, MeasurementMappingTable
+from comprendo.types.task import Task
+
+
+def create_report(*descriptions: str) -> ConsolidatedReport:
+    results = [
+        ConsolidatedMeasurementResult(description=description, value=1.0, accept=True, flag_disagreement=False)
+        for description in descriptions
+    ]
+    return ConsolidatedReport(
+        batches=[ConsolidatedBatch(results=results, batch_number="B1", expiration_date=None)],
+        order_number=None,
+        product_name=None,
+        flag_identification_warning=False,
+    )
+
+
+def create_table(*mappings: tuple[str, str]) -> MeasurementMappingTable:
+    return MeasurementMappingTable(
+        entries=[MeasurementMappingEntry(raw_description=d, mapped_to_canonical_id=i) for d, i in mappings]
+    )
+
+
+@pytest.fixture
+def mapping_calls(monkeypatch):
+    calls = []
+
+    async def supervisor_mapping_descriptions(task, raw_descs):
+        calls.append(("descriptions", raw_descs))
+        return create_table(*[(raw_desc, "catch-up") for raw_desc in raw_descs])
+
+    async def supervisor_mapping(task, consolidated_report):
+        calls.append(("report", [r.description for b in consolidated_report.batches for r in b.results]))
+        return create_table(("Moisture", "full"))
+
+    monkeypatch.setattr(extract, "supervisor_mapping_descriptions", supervisor_mapping_descriptions)
+    monkeypatch.setattr(extract, "supervisor_mapping", supervisor_mapping)
+    return calls
+
+
+def complete_early_mapping(report: ConsolidatedReport, early_mapping_result, early_mapping_descs: list[str]):
+    async def run():
+        async def early_mapping():
+            if isinstance(early_mapping_result, Exception):
+                raise early_mapping_result
+            return early_mapping_result
+
+        early_mapping_task = asyncio.ensure_future(early_mapping())
+        return await extract.complete_early_mapping(
+            Task.model_construct(), report, early_mapping_task, early_mapping_descs
+        )
+
+    return asyncio.run(run())
+
+
+def test_early_mapping_covers_the_report(mapping_calls):
+    early_mapping_table = create_table(("Moisture", "1"))
+    mapping_table = complete_early_mapping(create_report("moisture ", "Ash"), early_mapping_table, ["Moisture", "Ash"])
+    assert mapping_table is early_mapping_table
+    assert mapping_calls == []
+
+
+def test_consolidated_descriptions_missed_early_are_caught_up(mapping_calls):
+    early_mapping_table = create_table(("Moisture", "1"))
+    report = create_report("Moisture", "Water activity")
+    mapping_table = complete_early_mapping(report, early_mapping_table, ["Moisture"])
+    assert mapping_calls == [("descriptions", ["Water activity"])]
+    assert [(e.raw_description, e.mapped_to_canonical_id) for e in mapping_table.entries] == [
+        ("Moisture", "1"),
+        ("Water activity", "catch-up"),
+    ]
+
+
+def test_failed_early_mapping_maps_the_report(mapping_calls):
+    mapping_table = complete_early_mapping(create_report("Moisture"), RuntimeError("mapper down"), ["Moisture"])
+    assert mapping_calls == [("report", ["Moisture"])]
+    assert mapping_table.entries[0].mapped_to_canonical_id == "full"
+
+
+def test_failed_consolidation_cancels_the_early_mapping(monkeypatch):
+    early_mapping_cancelled = asyncio.Event()
+
+    async def expert_extraction_from_images(task, document_artifacts):
+        return [ExpertResult(expert="claude", content="- Moisture: 0.5 %, Accept", time=1)]
+
+    async def supervisor_mapping_descriptions(task, raw_descs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            early_mapping_cancelled.set()
+            raise
+
+    async def supervisor_consolidation(task, expert_reports):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("consolidator down")
+
+    monkeypatch.setattr(extract, "early_mapping_enabled", True)
+    monkeypatch.setattr(extract, "expert_extraction_from_images", expert_extraction_from_images)
+    monkeypatch.setattr(extract, "supervisor_mapping_descriptions", supervisor_mapping_descriptions)
+    monkeypatch.setattr(extract, "consolidate_expert_reports_locally", lambda expert_reports: None)
+    monkeypatch.setattr(extract, "supervisor_consolidation", supervisor_consolidation)
+
+    with pytest.raises(RuntimeError, match="consolidator down"):
+        asyncio.run(extract.extract(Task.model_construct(), []))
+    assert early_mapping_cancelled.is_set()
@@ -0,0 +1,116 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from comprendo.preprocess import document
+
+A4_LAYOUT = {"width": 595.0, "height": 842.0, "rotation": 0}
+
+PDFIMAGES_LIST_OUTPUT = b"""page   num  type   width height color comp bpc  enc interp  object ID x-ppi y-ppi size ratio
+--------------------------------------------------------------------------------------------
+   1     0 image    2480  3508  gray    1   8  jpeg   no         9  0   300   300  512K 6.0%
+   2     1 smask     100   100  gray    1   8  image  no        12  0    72    72  100B 1.0%
+"""
+
+
+def get_page_image(**overrides) -> dict:
+    # An A4 page scanned at 300 dpi
+    return {
+        "page": 1,
+        "type": "image",
+        "width": 2480,
+        "height": 3508,
+        "components": 3,
+        "encoding": "jpeg",
+        "x_ppi": 300.0,
+        "y_ppi": 300.0,
+    } | overrides
+
+
+@pytest.fixture
+def pdf_images(monkeypatch):
+    def use_pdf_images(images: list[dict], page_layout: dict = A4_LAYOUT):
+        monkeypatch.setattr(document, "get_pdf_images_list", lambda document_location: images)
+        monkeypatch.setattr(
+            document,
+            "get_pdf_pages_layout",
+            lambda document_location: {page: page_layout for page in {image["page"] for image in images}},
+        )
+
+    return use_pdf_images
+
+
+def test_full_page_image_is_scan(pdf_images):
+    pdf_images([get_page_image()])
+    assert list(document.get_pdf_scan_pages(Path("scan.pdf"))) == [1]
+
+
+@pytest.mark.parametrize(
+    "images,page_layout",
+    [
+        # Logo on a text page
+        ([get_page_image(width=600, height=300)], A4_LAYOUT),
+        # Several images on the page
+        ([get_page_image(), get_page_image()], A4_LAYOUT),
+        # Image with a soft mask
+        ([get_page_image(), get_page_image(type="smask")], A4_LAYOUT),
+        ([get_page_image(components=4)], A4_LAYOUT),
+        ([get_page_image(encoding="jpx")], A4_LAYOUT),
+        ([get_page_image()], A4_LAYOUT | {"rotation": 90}),
+        ([get_page_image(x_ppi=0.0)], A4_LAYOUT),
+    ],
+    ids=["partial_coverage", "several_images", "masked", "cmyk", "jpeg2000", "rotated", "unknown_ppi"],
+)
+def test_pages_rendered_instead_of_extracted(pdf_images, images, page_layout):
+    pdf_images(images, page_layout)
+    assert document.get_pdf_scan_pages(Path("scan.pdf")) == {}
+
+
+def test_pdfimages_list_parsing(monkeypatch):
+    monkeypatch.setattr(
+        subprocess, "run", lambda *args, **kwargs: subprocess.CompletedProcess(args, 0, stdout=PDFIMAGES_LIST_OUTPUT)
+    )
+    images = document.get_pdf_images_list(Path("scan.pdf"))
+    assert images == [
+        get_page_image(components=1),
+        {
+            "page": 2,
+            "type": "smask",
+            "width": 100,
+            "height": 100,
+            "components": 1,
+            "encoding": "image",
+            "x_ppi": 72.0,
+            "y_ppi": 72.0,
+        },
+    ]
+
+
+def test_embedded_scans_failure_falls_back_to_rendering(monkeypatch):
+    def get_failing_images_list(document_location):
+        raise FileNotFoundError("pdfimages")
+
+    monkeypatch.setattr(document, "get_pdf_images_list", get_failing_images_list)
+    monkeypatch.setattr(document, "pdf_embedded_scans_enabled", True)
+    assert document.load_pdf_embedded_scans(Path("scan.pdf")) == {}
+
+
+def test_embedded_scans_disabled(monkeypatch, pdf_images):
+    pdf_images([get_page_image()])
+    monkeypatch.setattr(document, "pdf_embedded_scans_enabled", False)
+    assert document.load_pdf_embedded_scans(Path("scan.pdf")) == {}
+
+
+@pytest.mark.parametrize(
+    "pages,pages_per_job,page_ranges",
+    [
+        ([], 4, []),
+        ([1, 2, 3], 4, [(1, 3)]),
+        ([5, 1, 2, 7, 6], 4, [(1, 2), (5, 7)]),
+        ([1, 2, 3, 4, 5], 2, [(1, 2), (3, 4), (5, 5)]),
+        ([1, 2], 0, [(1, 1), (2, 2)]),
+    ],
+)
+def test_split_page_list(pages, pages_per_job, page_ranges):
+    assert document.split_page_list(pages, pages_per_job) == page_ranges
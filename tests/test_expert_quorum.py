@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from comprendo.extraction.experts import experts
+from comprendo.types.expert_result import ExpertResult
+from comprendo.types.task import Task
+
+
+class FakeExpertLLM:
+    def __init__(self, model: str, delay: float, error: Exception | None = None):
+        self.config = {"model": model}
+        self.delay = delay
+        self.error = error
+        self.cancelled = False
+
+
+@pytest.fixture
+def enabled_experts(monkeypatch):
+    expert_llms: list[FakeExpertLLM] = []
+
+    async def extract_from_shards_using_expert(expert_llm, task, document_shards, image_optimizers):
+        try:
+            await asyncio.sleep(expert_llm.delay)
+        except asyncio.CancelledError:
+            expert_llm.cancelled = True
+            raise
+        if expert_llm.error is not None:
+            raise expert_llm.error
+        return ExpertResult(expert=expert_llm.config["model"], content="report", time=expert_llm.delay)
+
+    monkeypatch.setattr(experts, "get_enabled_coa_experts", lambda: expert_llms)
+    monkeypatch.setattr(experts, "extract_from_shards_using_expert", extract_from_shards_using_expert)
+    monkeypatch.setattr(experts, "experts_quorum", 0)
+    monkeypatch.setattr(experts, "experts_deadline_seconds", 5)
+    monkeypatch.setattr(experts, "experts_min_results", 1)
+    return expert_llms
+
+
+def run_experts() -> list[str]:
+    expert_results = asyncio.run(experts.expert_extraction_from_images(Task.model_construct(), []))
+    return [expert_result.expert for expert_result in expert_results]
+
+
+def test_all_experts_in_enabled_order(enabled_experts):
+    enabled_experts += [FakeExpertLLM("slow", 0.05), FakeExpertLLM("fast", 0.01)]
+    assert run_experts() == ["slow", "fast"]
+
+
+def test_quorum_cancels_stragglers(enabled_experts, monkeypatch):
+    monkeypatch.setattr(experts, "experts_quorum", 2)
+    enabled_experts += [FakeExpertLLM("a", 0.01), FakeExpertLLM("straggler", 5), FakeExpertLLM("b", 0.02)]
+    assert run_experts() == ["a", "b"]
+    assert enabled_experts[1].cancelled
+
+
+def test_failed_expert_does_not_count_towards_the_quorum(enabled_experts, monkeypatch):
+    monkeypatch.setattr(experts, "experts_quorum", 2)
+    enabled_experts += [
+        FakeExpertLLM("failing", 0.01, error=RuntimeError("provider down")),
+        FakeExpertLLM("a", 0.02),
+        FakeExpertLLM("b", 0.03),
+    ]
+    assert run_experts() == ["a", "b"]
+
+
+def test_deadline_keeps_the_answers_so_far(enabled_experts, monkeypatch):
+    monkeypatch.setattr(experts, "experts_deadline_seconds", 0.1)
+    enabled_experts += [FakeExpertLLM("late", 5), FakeExpertLLM("on-time", 0.01)]
+    assert run_experts() == ["on-time"]
+    assert enabled_experts[0].cancelled
+
+
+def test_deadline_below_min_results_fails(enabled_experts, monkeypatch):
+    monkeypatch.setattr(experts, "experts_deadline_seconds", 0.1)
+    monkeypatch.setattr(experts, "experts_min_results", 2)
+    enabled_experts += [FakeExpertLLM("late", 5), FakeExpertLLM("on-time", 0.01)]
+    with pytest.raises(TimeoutError):
+        run_experts()
+
+
+def test_all_experts_failing_raises_the_first_error(enabled_experts):
+    enabled_experts += [
+        FakeExpertLLM("a", 0.01, error=RuntimeError("first")),
+        FakeExpertLLM("b", 0.02, error=RuntimeError("second")),
+    ]
+    with pytest.raises(RuntimeError, match="first"):
+        run_experts()
+
+
+def test_no_enabled_experts(enabled_experts):
+    with pytest.raises(ValueError):
+        run_experts()
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import pytest
+
+from comprendo.extraction import local_consolidation
+from comprendo.extraction.expert_report_parsing import (
+    ExpertReportParsingError,
+    extract_candidate_measurement_descriptions,
+    parse_expert_report,
+)
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "expert_reports"
+
+
+def load_report(name: str) -> str:
+    return (FIXTURES_DIR / f"{name}.md").read_text()
+
+
+@pytest.mark.parametrize(
+    "name, order_number, batch_number",
+    [("bullets", "PO-4512", "23-0415"), ("table", "PO 4512", "23 0415")],
+)
+def test_parse_report(name, order_number, batch_number):
+    report = parse_expert_report(load_report(name))
+    assert report.order_number == order_number
+    assert [(batch.batch_number, batch.expiration_date) for batch in report.batches] == [(batch_number, "2026-04-14")]
+    results = [(r.description, r.value, r.accept) for r in report.batches[0].results]
+    assert [description for description, _, _ in results] == [
+        "Moisture",
+        "Total aerobic count",
+        "Appearance",
+        "Salmonella",
+    ]
+    assert results[2][1:] == ("White powder", True)
+    assert results[3][1:] == ("Absent", True)
+
+
+@pytest.mark.parametrize(
+    "name, error",
+    [("malformed", "without a result column"), ("missing_status", "No accept / reject status")],
+)
+def test_malformed_report_raises(name, error):
+    with pytest.raises(ExpertReportParsingError, match=error):
+        parse_expert_report(load_report(name))
+
+
+def test_candidate_descriptions_skip_identification_fields():
+    assert extract_candidate_measurement_descriptions([load_report("bullets"), load_report("table")]) == [
+        "Appearance",
+        "Moisture",
+        "Salmonella",
+        "Total aerobic count",
+    ]
+
+
+def test_agreeing_reports_are_consolidated_locally():
+    report = local_consolidation.consolidate_expert_reports_locally([load_report("bullets"), load_report("table")])
+    assert report is not None
+    assert (report.order_number, report.batches[0].batch_number) == ("PO-4512", "23-0415")
+    assert not any(result.flag_disagreement for result in report.batches[0].results)
+
+
+def test_disagreeing_reports_need_the_model():
+    assert local_consolidation.consolidate_expert_reports_locally(
+        [load_report("bullets"), load_report("disagreeing")]
+    ) is None
+
+
+def test_disagreements_within_the_limit_are_flagged(monkeypatch):
+    monkeypatch.setattr(local_consolidation, "local_consolidation_max_disagreements", 1)
+    report = local_consolidation.consolidate_expert_reports_locally(
+        [load_report("bullets"), load_report("disagreeing")]
+    )
+    assert [result.description for result in report.batches[0].results if result.flag_disagreement] == ["Moisture"]
+
+
+def test_malformed_report_needs_the_model():
+    assert local_consolidation.consolidate_expert_reports_locally(
+        [load_report("bullets"), load_report("malformed")]
+    ) is None
+
+
+def test_single_expert_report_is_used_as_parsed(monkeypatch):
+    report = local_consolidation.consolidate_expert_reports_locally([load_report("bullets")])
+    assert report.batches[0].results[0].description == "Moisture"
+
+    monkeypatch.setattr(local_consolidation, "local_consolidation_single_expert", False)
+    assert local_consolidation.consolidate_expert_reports_locally([load_report("bullets")]) is None
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from comprendo.extraction.expert_report_parsing import parse_expert_report
+from comprendo.extraction.experts import experts
+from comprendo.types.expert_result import ExpertResult
+from comprendo.types.text_artifact import TextArtifact
+
+
+def create_pages(source: str, pages: int) -> list[TextArtifact]:
+    return [TextArtifact(f"{source} page {page}", source=source, page=page) for page in range(1, pages + 1)]
+
+
+def get_shard_pages(shards) -> list[list[tuple[str, int]]]:
+    return [[(artifact.source, artifact.page) for artifact in shard] for shard in shards]
+
+
+@pytest.fixture
+def sharding(monkeypatch):
+    def set_sharding(mode: str, shard_pages: int = 2):
+        monkeypatch.setattr(experts, "expert_sharding_mode", mode)
+        monkeypatch.setattr(experts, "expert_shard_pages", shard_pages)
+
+    return set_sharding
+
+
+def test_no_sharding_keeps_one_shard(sharding):
+    sharding("none")
+    document_artifacts = create_pages("a.pdf", 3) + create_pages("b.pdf", 1)
+    assert experts.split_expert_shards(document_artifacts) == [document_artifacts]
+
+
+def test_document_sharding(sharding):
+    sharding("document")
+    shards = experts.split_expert_shards(create_pages("a.pdf", 3) + create_pages("b.pdf", 1))
+    assert get_shard_pages(shards) == [[("a.pdf", 1), ("a.pdf", 2), ("a.pdf", 3)], [("b.pdf", 1)]]
+
+
+def test_page_sharding_keeps_page_artifacts_together(sharding):
+    sharding("pages", shard_pages=2)
+    # Page 2 is sent as its text and its image
+    document_artifacts = create_pages("a.pdf", 3)
+    document_artifacts.insert(2, TextArtifact("a.pdf page 2 image", source="a.pdf", page=2))
+    shards = experts.split_expert_shards(document_artifacts + create_pages("b.pdf", 1))
+    assert get_shard_pages(shards) == [
+        [("a.pdf", 1), ("a.pdf", 2), ("a.pdf", 2)],
+        [("a.pdf", 3)],
+        [("b.pdf", 1)],
+    ]
+
+
+def test_merged_shard_report_parses_a_batch_spanning_shards(sharding):
+    sharding("pages", shard_pages=1)
+    shards = experts.split_expert_shards(create_pages("a.pdf", 2))
+    shard_results = [
+        ExpertResult(expert="claude", content="## Batch no.: B1\n- Moisture: 0.5 %, Accept", time=2),
+        ExpertResult(expert="claude", content="## Batch no.: B1\n- Ash: 0.1 %, Accept", time=3, cached=True),
+    ]
+    merged = experts.merge_expert_shard_results(shard_results, shards)
+    assert merged.content.startswith("# Pages 1-1 of document 1\n\n")
+    assert "# Pages 2-2 of document 1" in merged.content
+    assert (merged.time, merged.cached) == (3, False)
+
+    report = parse_expert_report(merged.content)
+    assert [(b.batch_number, [r.description for r in b.results]) for b in report.batches] == [
+        ("B1", ["Moisture", "Ash"])
+    ]
+
+
+def test_failed_shard_cancels_the_other_shards(sharding, monkeypatch):
+    sharding("pages", shard_pages=1)
+    monkeypatch.setattr(experts, "expert_shard_concurrency", 0)
+    cancelled_pages = []
+
+    async def extract_from_images_using_expert(expert_llm, task, document_shard, image_optimizer):
+        page = document_shard[0].page
+        try:
+            await asyncio.sleep(0.01 if page == 1 else 5)
+        except asyncio.CancelledError:
+            cancelled_pages.append(page)
+            raise
+        raise RuntimeError("shard failed")
+
+    monkeypatch.setattr(experts, "extract_from_images_using_expert", extract_from_images_using_expert)
+    shards = experts.split_expert_shards(create_pages("a.pdf", 3))
+    expert_llm = SimpleNamespace(config={"model": "claude-test"})
+    with pytest.raises(RuntimeError, match="shard failed"):
+        asyncio.run(experts.extract_from_shards_using_expert(expert_llm, None, shards, [None] * len(shards)))
+    assert sorted(cancelled_pages) == [2, 3]
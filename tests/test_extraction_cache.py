@@ -0,0 +1,97 @@
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+from comprendo.caching import cache as cache_module
+from comprendo.caching.cache import ContentAddressedCache, content_hash
+from comprendo.extraction import caching
+
+
+def test_content_hash_is_length_prefixed():
+    assert content_hash("ab", "c") != content_hash("a", "bc")
+    assert content_hash("ab", "c") == content_hash(b"ab", b"c")
+
+
+def test_cache_round_trip_and_counters(tmp_path):
+    cache = ContentAddressedCache(str(tmp_path), max_size_bytes=1024)
+    assert cache.get("a" * 64, namespace="expert") is None
+    cache.put("a" * 64, "report")
+    assert cache.get("a" * 64, namespace="expert") == "report"
+    stats = cache.stats()
+    assert stats["expert.hit"] == 1
+    assert stats["expert.miss"] == 1
+    assert stats["entries"] == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ContentAddressedCache(str(tmp_path), max_size_bytes=10)
+    cache.put("a" * 64, "12345")
+    cache.put("b" * 64, "12345")
+    # Touch "a" - "b" becomes the least recently used
+    assert cache.get("a" * 64) == "12345"
+    cache.put("c" * 64, "12345")
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) == "12345"
+    assert cache.get("c" * 64) == "12345"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_skips_entries_larger_than_the_cap(tmp_path):
+    cache = ContentAddressedCache(str(tmp_path), max_size_bytes=4)
+    cache.put("a" * 64, "12345")
+    assert cache.get("a" * 64) is None
+
+
+def test_cache_index_is_reloaded_in_lru_order(tmp_path):
+    cache = ContentAddressedCache(str(tmp_path), max_size_bytes=1024)
+    cache.put("a" * 64, "old")
+    cache.put("b" * 64, "new")
+    os.utime(cache._get_content_path("a" * 64), (1, 1))
+    reloaded = ContentAddressedCache(str(tmp_path), max_size_bytes=1024)
+    assert list(reloaded._entries) == ["a" * 64, "b" * 64]
+
+
+def test_cache_dir_created_on_first_write(tmp_path):
+    cache_dir = tmp_path / "extraction_cache"
+    cache = ContentAddressedCache(cache_dir, max_size_bytes=1024)
+    assert cache.get("a" * 64) is None
+    assert not cache_dir.exists()
+    cache.put("a" * 64, "report")
+    assert cache.get("a" * 64) == "report"
+
+
+def test_relative_cache_dirs_under_cache_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_module, "cache_root_dir", str(tmp_path))
+    assert cache_module.get_cache_dir("extraction_cache") == tmp_path / "extraction_cache"
+    assert cache_module.get_cache_dir("/var/cache/comprendo") == Path("/var/cache/comprendo")
+
+
+def test_stage_cache_io_runs_off_the_event_loop(tmp_path, monkeypatch):
+    io_threads = []
+
+    class RecordingCache(ContentAddressedCache):
+        def get(self, key, namespace="default"):
+            io_threads.append(threading.get_ident())
+            return super().get(key, namespace)
+
+        def put(self, key, content):
+            io_threads.append(threading.get_ident())
+            super().put(key, content)
+
+    monkeypatch.setattr(caching, "extraction_cache", RecordingCache(str(tmp_path), max_size_bytes=1024))
+
+    async def run():
+        await caching.put_cached_stage_output("a" * 64, "report")
+        return await caching.get_cached_stage_output("expert", "a" * 64), threading.get_ident()
+
+    cached, loop_thread = asyncio.run(run())
+    assert cached == "report"
+    assert len(io_threads) == 2
+    assert loop_thread not in io_threads
+
+
+def test_stage_cache_disabled(monkeypatch):
+    monkeypatch.setattr(caching, "extraction_cache", None)
+    assert asyncio.run(caching.get_cached_stage_output("expert", "a" * 64)) is None
+    asyncio.run(caching.put_cached_stage_output("a" * 64, "report"))
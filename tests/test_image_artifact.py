@@ -0,0 +1,46 @@
+import base64
+import pickle
+
+from PIL import Image
+
+from comprendo.types.image_artifact import ImageArtifact
+
+
+def create_image() -> ImageArtifact:
+    return ImageArtifact.from_pil_image(Image.effect_noise((64, 64), 40), dpi=200)
+
+
+def test_base64_is_encoded_once_in_memory():
+    image_artifact = create_image()
+    assert image_artifact.base64 is image_artifact.base64
+
+
+def test_spilled_image_keeps_no_base64():
+    image_artifact = create_image()
+    image_bytes = image_artifact.to_bytes()
+    image_artifact.base64
+    image_artifact.spill()
+
+    assert image_artifact.is_spilled
+    assert image_artifact._base64 is None
+    assert base64.b64decode(image_artifact.base64) == image_bytes
+    assert image_artifact._base64 is None
+
+
+def test_spilled_image_pickles_its_bytes():
+    image_artifact = create_image()
+    image_artifact.page = 3
+    image_artifact.spill()
+    unpickled = pickle.loads(pickle.dumps(image_artifact))
+    assert (unpickled.to_bytes(), unpickled.page, unpickled.is_spilled) == (image_artifact.to_bytes(), 3, False)
+
+
+def test_images_compared_by_content():
+    image_artifact = create_image()
+    other_image_artifact = create_image()
+    # Same metadata, different pixels
+    assert image_artifact != other_image_artifact
+
+    same_image_artifact = ImageArtifact(image_artifact.to_bytes(), format="png", width=64, height=64, dpi=200)
+    same_image_artifact.spill()
+    assert image_artifact == same_image_artifact
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+from PIL import Image
+
+from comprendo.preprocess import optimize
+from comprendo.preprocess.optimize import ImageOptimizationProfile, ProviderImageOptimizer
+from comprendo.types.image_artifact import ImageArtifact
+from comprendo.types.text_artifact import TextArtifact
+
+
+def create_page_image(width: int, height: int, page: int) -> ImageArtifact:
+    image_artifact = ImageArtifact.from_pil_image(Image.new("RGB", (width, height), "white"), dpi=200)
+    image_artifact.source = "coa.pdf"
+    image_artifact.page = page
+    return image_artifact
+
+
+def test_optimization_is_opt_in():
+    assert optimize.get_image_optimization_profile("anthropic") is None
+
+
+def test_fitting_image_passes_through():
+    image_artifact = create_page_image(800, 1000, page=1)
+    assert optimize.optimize_image(image_artifact, ImageOptimizationProfile(max_long_edge=1568)) is image_artifact
+
+
+def test_downscale_keeps_the_image_format():
+    profile = ImageOptimizationProfile(max_long_edge=450)
+    optimized = optimize.optimize_image(create_page_image(600, 900, page=1), profile)
+    assert (optimized.format, optimized.width, optimized.height, optimized.dpi) == ("png", 300, 450, 100)
+
+
+def test_profile_format_re_encodes():
+    profile = ImageOptimizationProfile(max_long_edge=450, format="jpeg", quality=70)
+    optimized = optimize.optimize_image(create_page_image(600, 900, page=1), profile)
+    assert optimized.format == "jpeg"
+    assert optimized.to_bytes()[:2] == b"\xff\xd8"
+
+
+def test_report_uses_document_page_numbers():
+    text_artifact = TextArtifact("Page 3 text", source="coa.pdf", page=3)
+    original_images = [text_artifact, create_page_image(600, 900, page=4), create_page_image(300, 400, page=7)]
+    optimized_images = optimize.optimize_images(original_images, ImageOptimizationProfile(max_long_edge=450))
+    report = optimize.get_image_optimization_report("anthropic", original_images, optimized_images)
+    assert [(r["source"], r["page"]) for r in report] == [("coa.pdf", 4), ("coa.pdf", 7)]
+    assert report[0]["tokens_saved"] >= 0 and report[1]["bytes_saved"] == 0
+
+
+@pytest.fixture
+def slow_optimization(monkeypatch):
+    runs = {"started": 0, "cancelled": 0}
+
+    async def run_job(fn, *args):
+        runs["started"] += 1
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            runs["cancelled"] += 1
+            raise
+        return fn(*args)
+
+    monkeypatch.setattr(optimize, "image_optimization_enabled", True)
+    monkeypatch.setattr(optimize.rasterization_engine, "run_job", run_job)
+    return runs
+
+
+def test_optimization_is_shared_by_the_experts(slow_optimization):
+    image_optimizer = ProviderImageOptimizer([create_page_image(100, 100, page=1)])
+
+    async def get_images():
+        return await asyncio.gather(image_optimizer.get_images("anthropic"), image_optimizer.get_images("anthropic"))
+
+    first_images, second_images = asyncio.run(get_images())
+    assert first_images is second_images
+    assert slow_optimization["started"] == 1
+
+
+def test_optimization_cancelled_once_no_expert_waits(slow_optimization):
+    image_optimizer = ProviderImageOptimizer([create_page_image(100, 100, page=1)])
+
+    async def cancel_experts():
+        expert_tasks = [asyncio.ensure_future(image_optimizer.get_images("anthropic")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        expert_tasks[0].cancel()
+        await asyncio.sleep(0)
+        # Another expert still waits
+        assert slow_optimization["cancelled"] == 0
+        expert_tasks[1].cancel()
+        await asyncio.gather(*expert_tasks, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(cancel_experts())
+    assert slow_optimization["cancelled"] == 1
+    assert image_optimizer._optimizations == {}
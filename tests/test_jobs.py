@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import socket
+import time
+
+import httpx
+import pytest
+
+from comprendo.server import jobs
+from comprendo.server.types.extract_coa_output import COAResponse
+from comprendo.server.types.job import Job, JobStatus
+
+
+def create_job(job_id: str = "job-1", **fields) -> Job:
+    return Job(job_id=job_id, request_id="request-1", client_id="client-1", created_at=time.time(), **fields)
+
+
+def create_job_queue(tmp_path, queue_depth: int = 2) -> jobs.JobQueue:
+    store = jobs.JobStore(str(tmp_path), result_ttl_seconds=60)
+    return jobs.JobQueue(store, workers=1, queue_depth=queue_depth, maintenance_interval_seconds=10)
+
+
+def test_job_runs_and_succeeds(tmp_path):
+    job_queue = create_job_queue(tmp_path)
+
+    async def run(job: Job) -> COAResponse:
+        return COAResponse(
+            request_id=job.request_id, order_number="PO-1", identification_warning=False, estimated_cost=0, batches=[]
+        )
+
+    async def submit_and_wait() -> Job:
+        await job_queue.start()
+        await job_queue.submit(create_job(), run)
+        await job_queue._queue.join()
+        await job_queue.stop()
+        return job_queue.get("job-1")
+
+    job = asyncio.run(submit_and_wait())
+    assert job.status == JobStatus.succeeded
+    assert job.result.request_id == "request-1"
+    assert job.worker_id == job_queue.worker_id
+
+
+def test_submit_raises_when_the_queue_is_full(tmp_path):
+    job_queue = create_job_queue(tmp_path, queue_depth=1)
+
+    async def run(job: Job) -> COAResponse:
+        await asyncio.sleep(10)
+
+    async def submit_two():
+        # No workers - jobs stay queued
+        job_queue._queue = asyncio.Queue(maxsize=1)
+        await job_queue.submit(create_job("job-1"), run)
+        with pytest.raises(asyncio.QueueFull):
+            await job_queue.submit(create_job("job-2"), run)
+
+    asyncio.run(submit_two())
+    assert job_queue.get("job-1").status == JobStatus.queued
+    assert job_queue.get("job-2") is None
+
+
+def test_stop_fails_running_and_queued_jobs(tmp_path):
+    job_queue = create_job_queue(tmp_path)
+    started = asyncio.Event()
+
+    async def run(job: Job) -> COAResponse:
+        started.set()
+        await asyncio.sleep(10)
+
+    async def submit_and_stop():
+        await job_queue.start()
+        await job_queue.submit(create_job("job-1"), run)
+        await job_queue.submit(create_job("job-2"), run)
+        await started.wait()
+        await job_queue.stop()
+
+    asyncio.run(submit_and_stop())
+    for job_id in ("job-1", "job-2"):
+        job = job_queue.get(job_id)
+        assert job.status == JobStatus.failed
+        assert "shut down" in job.error
+
+
+def test_start_fails_jobs_of_a_previous_run(tmp_path):
+    job_queue = create_job_queue(tmp_path)
+    job_queue.store.save(create_job("job-1", status=JobStatus.running, worker_id=job_queue.worker_id))
+    # Another live process on this host
+    job_queue.store.save(create_job("job-2", status=JobStatus.queued, worker_id=f"{socket.gethostname()}:1"))
+
+    async def start_and_stop():
+        await job_queue.start()
+        await job_queue.stop()
+
+    asyncio.run(start_and_stop())
+    assert job_queue.get("job-1").status == JobStatus.failed
+    assert job_queue.get("job-2").status == JobStatus.queued
+
+
+def test_fail_abandoned_fails_stale_jobs_only(tmp_path):
+    store = jobs.JobStore(str(tmp_path), result_ttl_seconds=60)
+    store.save(create_job("stale", status=JobStatus.running, worker_id="other-host:1"))
+    store.save(create_job("fresh", status=JobStatus.running, worker_id="other-host:1"))
+    store.save(create_job("done", status=JobStatus.succeeded, worker_id="other-host:1"))
+    os.utime(tmp_path / "stale.json", (time.time() - 100, time.time() - 100))
+    os.utime(tmp_path / "done.json", (time.time() - 100, time.time() - 100))
+
+    assert store.fail_abandoned(stale_after_seconds=30) == 1
+    assert store.load("stale").status == JobStatus.failed
+    assert store.load("fresh").status == JobStatus.running
+    assert store.load("done").status == JobStatus.succeeded
+
+
+def test_remove_expired(tmp_path):
+    store = jobs.JobStore(str(tmp_path), result_ttl_seconds=60)
+    store.save(create_job("old"))
+    store.save(create_job("new"))
+    os.utime(tmp_path / "old.json", (time.time() - 100, time.time() - 100))
+    store.remove_expired()
+    assert store.load("old") is None
+    assert store.load("new") is not None
+
+
+@pytest.mark.parametrize(
+    "callback_url",
+    [
+        "ftp://93.184.216.34/hook",
+        "http://127.0.0.1/hook",
+        "http://localhost:8080/hook",
+        "http://10.0.0.5/hook",
+        "http://169.254.169.254/latest/meta-data",
+        "http://[::1]/hook",
+        "http://[::ffff:192.168.0.1]/hook",
+    ],
+)
+def test_check_webhook_url_blocks_non_public_hosts(callback_url):
+    with pytest.raises(ValueError):
+        asyncio.run(jobs.check_webhook_url(callback_url))
+
+
+def test_check_webhook_url_allows_public_and_allowed_hosts(monkeypatch):
+    asyncio.run(jobs.check_webhook_url("https://93.184.216.34/hook"))
+    monkeypatch.setattr(jobs, "jobs_webhook_allowed_hosts", {"localhost"})
+    asyncio.run(jobs.check_webhook_url("http://localhost:8080/hook"))
+    with pytest.raises(ValueError):
+        asyncio.run(jobs.check_webhook_url("https://93.184.216.34/hook"))
+
+
+def test_notify_job_webhook_signs_the_body(monkeypatch):
+    requests = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200)
+
+    class MockAsyncClient(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            super().__init__(transport=httpx.MockTransport(handle), **kwargs)
+
+    monkeypatch.setattr(jobs.httpx, "AsyncClient", MockAsyncClient)
+    monkeypatch.setattr(jobs, "jobs_webhook_secret", "shared-secret")
+    job = create_job(status=JobStatus.succeeded, callback_url="https://93.184.216.34/hook")
+    asyncio.run(jobs.notify_job_webhook(job))
+
+    request = requests[0]
+    timestamp = request.headers["x-comprendo-timestamp"]
+    expected_signature = hmac.new(
+        b"shared-secret", f"{timestamp}.".encode() + request.content, hashlib.sha256
+    ).hexdigest()
+    assert request.headers["x-comprendo-signature"] == f"sha256={expected_signature}"
+    assert request.headers["x-comprendo-job-id"] == "job-1"
+    assert b"callback_url" not in request.content
+
+
+def test_notify_job_webhook_skips_blocked_hosts(monkeypatch):
+    requests = []
+
+    class MockAsyncClient(httpx.AsyncClient):
+        def __init__(self, **kwargs):
+            super().__init__(transport=httpx.MockTransport(lambda request: requests.append(request)), **kwargs)
+
+    monkeypatch.setattr(jobs.httpx, "AsyncClient", MockAsyncClient)
+    asyncio.run(jobs.notify_job_webhook(create_job(callback_url="http://127.0.0.1/hook")))
+    assert requests == []
@@ -0,0 +1,56 @@
+import contextvars
+import gzip
+
+import pytest
+
+from comprendo import log_payloads
+from comprendo.app_logging import ctx_task
+from comprendo.log_payloads import PayloadBlobStore, format_log_payload
+from comprendo.server.types.extract_coa_input import COARequest
+from comprendo.types.task import Task
+
+
+@pytest.fixture
+def payload_mode(monkeypatch):
+    def set_payload_mode(mode: str, max_chars: int = 10, sample_rate: float = 1.0):
+        monkeypatch.setattr(log_payloads, "log_payload_mode", mode)
+        monkeypatch.setattr(log_payloads, "log_payload_max_chars", max_chars)
+        monkeypatch.setattr(log_payloads, "log_payload_sample_rate", sample_rate)
+
+    return set_payload_mode
+
+
+def test_full_mode_logs_the_payload(payload_mode):
+    payload_mode("full")
+    assert format_log_payload(lambda: "x" * 20) == "x" * 20
+
+
+def test_truncate_mode_cuts_long_payloads(payload_mode):
+    payload_mode("truncate")
+    assert format_log_payload(lambda: "short") == "short"
+    assert format_log_payload(lambda: "x" * 20) == "xxxxxxxxxx...<truncated chars=20>"
+
+
+def test_blob_mode_stores_long_payloads(payload_mode, monkeypatch, tmp_path):
+    payload_mode("blob")
+    blob_store = PayloadBlobStore(str(tmp_path))
+    monkeypatch.setattr(log_payloads, "payload_blob_store", blob_store)
+
+    log_text = format_log_payload(lambda: "x" * 20)
+    blob_store._writer.shutdown(wait=True)
+    digest = log_text.removeprefix("<blob sha256=").split(" ")[0]
+    assert log_text == f"<blob sha256={digest} chars=20>"
+    assert gzip.decompress(blob_store.get_blob_path(digest).read_bytes()) == b"x" * 20
+
+
+def test_unsampled_request_skips_the_serialization(payload_mode):
+    payload_mode("full", sample_rate=0.0)
+
+    def get_payload():
+        raise AssertionError("Serialized although not logged")
+
+    def format_request_payload():
+        ctx_task.set(Task.model_construct(request=COARequest.model_construct(id="request-1")))
+        return format_log_payload(get_payload)
+
+    assert contextvars.copy_context().run(format_request_payload) == "<not sampled>"
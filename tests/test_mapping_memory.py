@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+from comprendo.extraction import mapping_memory as mapping_memory_module
+from comprendo.extraction.mapping_memory import MappingMemory
+from comprendo.server.types.extract_coa_input import RequestMeasurement
+
+CANONICALS = [
+    RequestMeasurement(id="1", name="Moisture", qualitative=False),
+    RequestMeasurement(id="2", name="Total aerobic count", qualitative=False),
+]
+
+
+@pytest.fixture
+def memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(mapping_memory_module, "mapping_memory_min_confirmations", 2)
+    memory = MappingMemory(str(tmp_path / "mapping_memory.sqlite3"))
+    yield memory
+    memory.close()
+
+
+def test_mapping_is_reused_once_confirmed(memory):
+    memory.remember("client", {"Water content": "1"}, CANONICALS)
+    assert memory.recall("client", ["Water content"], CANONICALS) == {}
+
+    memory.remember("client", {"water content": "1"}, CANONICALS)
+    assert memory.recall("client", ["Water Content", "Ash"], CANONICALS) == {"Water Content": "1"}
+
+
+def test_different_answer_starts_over(memory):
+    memory.remember("client", {"TPC": "2"}, CANONICALS)
+    memory.remember("client", {"TPC": "1"}, CANONICALS)
+    assert memory.recall("client", ["TPC"], CANONICALS) == {}
+
+    memory.remember("client", {"TPC": "1"}, CANONICALS)
+    assert memory.recall("client", ["TPC"], CANONICALS) == {"TPC": "1"}
+
+
+def test_mappings_are_kept_per_client(memory):
+    for _ in range(2):
+        memory.remember("client", {"Water content": "1"}, CANONICALS)
+    assert memory.recall("other-client", ["Water content"], CANONICALS) == {}
+
+
+def test_reused_canonical_id_invalidates_the_mapping(memory):
+    for _ in range(2):
+        memory.remember("client", {"Water content": "1"}, CANONICALS)
+    renamed_canonicals = [RequestMeasurement(id="1", name="Ash", qualitative=False)]
+    assert memory.recall("client", ["Water content"], renamed_canonicals) == {}
+    # Dropped - the old name is not valid again later
+    assert memory.recall("client", ["Water content"], CANONICALS) == {}
+
+
+def test_forget_removes_the_client_mappings(memory):
+    for _ in range(2):
+        memory.remember("client", {"Water content": "1"}, CANONICALS)
+        memory.remember("other-client", {"Water content": "1"}, CANONICALS)
+    assert memory.forget("client") == 1
+    assert memory.recall("client", ["Water content"], CANONICALS) == {}
+    assert memory.recall("other-client", ["Water content"], CANONICALS) == {"Water content": "1"}
+
+
+def test_expired_mappings_are_evicted(memory, monkeypatch):
+    for _ in range(2):
+        memory.remember("client", {"Water content": "1"}, CANONICALS)
+    # Last confirmed a day in the future of the max age
+    monkeypatch.setattr(mapping_memory_module, "mapping_memory_max_age_days", -1)
+    assert memory.recall("client", ["Water content"], CANONICALS) == {}
+
+
+def test_mappings_without_confirmations_are_dropped(tmp_path):
+    path = tmp_path / "mapping_memory.sqlite3"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE measurement_mappings (client_id TEXT, normalized_description TEXT, canonical_id TEXT, "
+        "canonical_name TEXT, updated_at REAL, PRIMARY KEY (client_id, normalized_description))"
+    )
+    connection.execute("INSERT INTO measurement_mappings VALUES ('client', 'water content', '1', 'Moisture', 0)")
+    connection.commit()
+    connection.close()
+
+    memory = MappingMemory(str(path))
+    assert memory.recall("client", ["Water content"], CANONICALS) == {}
+    memory.close()
@@ -0,0 +1,83 @@
+import pytest
+
+from comprendo.extraction import measurement_matching
+from comprendo.extraction.measurement_matching import (
+    get_description_similarity,
+    match_measurement_descriptions,
+    normalize_measurement_description,
+    parse_measurement_description,
+)
+from comprendo.server.types.extract_coa_input import RequestMeasurement
+
+
+def get_similarity(description_a: str, description_b: str) -> float:
+    return get_description_similarity(
+        parse_measurement_description(description_a), parse_measurement_description(description_b)
+    )
+
+
+@pytest.mark.parametrize(
+    "description_a, description_b",
+    [
+        ("Total aerobic count", "Total anaerobic count"),
+        ("Soluble solids", "Insoluble solids"),
+        ("Volatile matter", "Non-volatile matter"),
+        ("Moisture (min)", "Moisture (max)"),
+        ("Particle size cm", "Particle size (mm)"),
+        ("Vitamin B1", "Vitamin B12"),
+        ("Total fat", "Total fiber"),
+        ("Lead", "Lead content"),
+    ],
+)
+def test_near_misses_do_not_match(description_a, description_b):
+    assert get_similarity(description_a, description_b) < measurement_matching.measurement_matching_threshold
+
+
+@pytest.mark.parametrize(
+    "description_a, description_b",
+    [
+        ("Total Aerobic Count", "total aerobic count"),
+        ("Total aerobic count", "Total aerobic counts"),
+        ("Count, total aerobic", "Total aerobic count"),
+        ("Yeast and mould", "Yeasts and molds"),
+        ("Lead (ppm)", "Lead mg/kg"),
+        ("Viscosity", "Viscosity (cP)"),
+    ],
+)
+def test_variants_match(description_a, description_b):
+    assert get_similarity(description_a, description_b) >= measurement_matching.measurement_matching_threshold
+
+
+def test_normalized_key_keeps_units_apart():
+    assert normalize_measurement_description("Particle Size (mm)") == "particle size [mm]"
+    assert normalize_measurement_description("Lead, mg/kg") == normalize_measurement_description("lead ppm")
+    assert normalize_measurement_description("Moisture") == "moisture"
+
+
+def create_canonicals(*names: str) -> list[RequestMeasurement]:
+    return [RequestMeasurement(id=str(idx), name=name, qualitative=False) for idx, name in enumerate(names)]
+
+
+def test_match_resolves_close_descriptions():
+    canonicals = create_canonicals("Total aerobic count", "Moisture", "Particle size (mm)")
+    matches, unresolved = match_measurement_descriptions(
+        ["Total aerobic counts", "Particle size mm", "Total anaerobic count", "Particle size cm"], canonicals
+    )
+    assert [(m.raw_description, m.canonical_id) for m in matches] == [
+        ("Total aerobic counts", "0"),
+        ("Particle size mm", "2"),
+    ]
+    assert unresolved == ["Total anaerobic count", "Particle size cm"]
+
+
+def test_description_close_to_two_canonicals_is_unresolved():
+    canonicals = create_canonicals("Particle size (mm)", "Particle size (cm)")
+    matches, unresolved = match_measurement_descriptions(["Particle size"], canonicals)
+    assert (matches, unresolved) == ([], ["Particle size"])
+
+
+def test_same_canonical_listed_twice_is_not_ambiguous():
+    canonicals = create_canonicals("Count, total aerobic", "Total aerobic count")
+    canonicals[1].id = "0"
+    matches, _ = match_measurement_descriptions(["Total aerobic count"], canonicals)
+    assert [(m.canonical_name, m.score) for m in matches] == [("Total aerobic count", 1.0)]
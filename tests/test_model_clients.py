@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from functools import cached_property
+
+import pytest
+
+from comprendo.extraction import model_clients
+from comprendo.extraction.experts import coa_claude
+
+
+def test_anthropic_expert_uses_the_shared_http_client(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    monkeypatch.setattr(model_clients, "_shared_http_clients", {})
+    expert_llm = coa_claude.create_anthropic_expert_llm(coa_claude.anthropic_expert_model_name)
+    assert expert_llm.bound._async_client._client is model_clients.get_shared_async_http_client("anthropic")
+
+
+def test_changed_chat_anthropic_attributes_raise():
+    class ChangedChatAnthropic:
+        @cached_property
+        def _client_params(self) -> dict:
+            return {}
+
+        def _get_async_client(self):
+            pass
+
+    with pytest.raises(RuntimeError, match="_async_client"):
+        coa_claude.check_chat_anthropic_client_attributes(ChangedChatAnthropic)
+
+
+def test_default_startup_does_not_create_model_clients():
+    # A fresh process - the provider SDKs may already be imported by other tests
+    code = (
+        "import asyncio, sys\n"
+        "from comprendo.extraction import model_clients\n"
+        "asyncio.run(model_clients.open_model_clients())\n"
+        "print(sorted(model_clients._shared_http_clients))\n"
+        "print([m for m in ('openai', 'langchain_openai', 'anthropic', 'langchain_anthropic') if m in sys.modules])\n"
+    )
+    env = {**os.environ, "OPENAI_API_KEY": "test-key", "MODEL_CLIENTS_WARMUP_ENABLED": "false"}
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+    assert completed.stdout.splitlines() == ["['anthropic', 'openai']", "[]"]
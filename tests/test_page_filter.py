@@ -0,0 +1,111 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw
+
+from comprendo.preprocess import page_filter
+from comprendo.types.image_artifact import ImageArtifact
+from comprendo.types.text_artifact import TextArtifact
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "pages"
+
+
+def load_text_page(name: str, page: int = 1) -> TextArtifact:
+    return TextArtifact((FIXTURES_DIR / f"{name}.txt").read_text(), source="coa.pdf", page=page)
+
+
+def create_scan(draw_fn=None, noise: bool = False) -> ImageArtifact:
+    # An A4 page at 150 DPI
+    pil_image = Image.new("L", (1240, 1754), 250)
+    if noise:
+        # Paper grain and scanner noise - a few levels around the paper level
+        pil_image = Image.effect_noise((1240, 1754), 20).point(lambda level: 244 + level // 20)
+    if draw_fn is not None:
+        draw_fn(ImageDraw.Draw(pil_image))
+    return ImageArtifact.from_pil_image(pil_image, dpi=150)
+
+
+@pytest.mark.parametrize(
+    "name, relevant, reason",
+    [
+        ("coa_results", True, "keywords"),
+        ("coa_results_terms_footer", True, "keywords"),
+        ("cover_letter", False, "terms_or_letter"),
+        ("terms_and_conditions", False, "terms_or_letter"),
+        ("pilot_plant_letter", False, "terms_or_letter"),
+    ],
+)
+def test_classify_text_pages(name, relevant, reason):
+    classification = page_filter.classify_page(load_text_page(name), None)
+    assert (classification.relevant, classification.reason) == (relevant, reason)
+
+
+def test_keywords_match_whole_words():
+    text = "The latest pilot study has no limitation. " * 5
+    assert page_filter.relevant_keywords_re.findall(text) == []
+    assert len(page_filter.relevant_keywords_re.findall("lot 12, tests and limits")) == 3
+
+
+def test_blank_scan_with_paper_noise():
+    assert page_filter.is_blank_image(create_scan(noise=True))
+
+
+def test_signature_only_page_is_not_blank():
+    def draw_signature(draw: ImageDraw.ImageDraw):
+        draw.line([(800, 1500), (850, 1460), (900, 1520), (960, 1470), (1020, 1510)], fill=30, width=3)
+
+    assert not page_filter.is_blank_image(create_scan(draw_signature, noise=True))
+
+
+def test_stamp_only_page_is_not_blank():
+    def draw_stamp(draw: ImageDraw.ImageDraw):
+        draw.ellipse([(900, 1400), (1100, 1600)], outline=60, width=4)
+
+    assert not page_filter.is_blank_image(create_scan(draw_stamp))
+
+
+@pytest.fixture
+def inline_jobs(monkeypatch):
+    async def run_job(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(page_filter.rasterization_engine, "run_job", run_job)
+
+
+def filter_pages(document_artifacts):
+    return asyncio.run(page_filter.filter_document_pages([], document_artifacts))
+
+
+def create_document() -> list[TextArtifact]:
+    return [
+        load_text_page("cover_letter", page=1),
+        load_text_page("coa_results", page=2),
+        load_text_page("terms_and_conditions", page=3),
+    ]
+
+
+def test_deprioritize_reports_the_moved_pages(inline_jobs, monkeypatch):
+    monkeypatch.setattr(page_filter, "page_filter_mode", "deprioritize")
+    result = filter_pages(create_document())
+    assert [artifact.page for artifact in result.document_artifacts] == [2, 1, 3]
+    assert (result.filtered_pages, result.deprioritized_pages) == (0, 2)
+
+
+def test_drop_reports_the_dropped_pages(inline_jobs, monkeypatch):
+    monkeypatch.setattr(page_filter, "page_filter_mode", "drop")
+    result = filter_pages(create_document())
+    assert [artifact.page for artifact in result.document_artifacts] == [2]
+    assert (result.filtered_pages, result.deprioritized_pages) == (2, 0)
+
+
+def test_never_filters_down_to_no_pages(inline_jobs, monkeypatch):
+    monkeypatch.setattr(page_filter, "page_filter_mode", "drop")
+    document_artifacts = [load_text_page("cover_letter", page=1), load_text_page("terms_and_conditions", page=2)]
+    result = filter_pages(document_artifacts)
+    assert result.document_artifacts == document_artifacts
+    assert result.filtered_pages == 0
+
+
+def test_default_mode_is_deprioritize():
+    assert page_filter.page_filter_mode == "deprioritize"
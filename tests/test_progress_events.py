@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+from fastapi import HTTPException
+
+from comprendo import progress
+from comprendo.server import events
+from comprendo.server.types.extract_coa_output import COAResponse
+
+
+def parse_sse(lines: list[str]) -> list[tuple[str, dict | None]]:
+    parsed_events = []
+    for line in lines:
+        if line.startswith(":"):
+            parsed_events.append(("keepalive", None))
+            continue
+        event_line, data_line = line.strip().split("\n")
+        parsed_events.append((event_line.removeprefix("event: "), json.loads(data_line.removeprefix("data: "))))
+    return parsed_events
+
+
+def stream_progress(run) -> list[tuple[str, dict | None]]:
+    async def collect():
+        return [line async for line in events.stream_task_progress("request-1", run)]
+
+    return parse_sse(asyncio.run(collect()))
+
+
+def test_stage_events_then_the_result():
+    async def run() -> COAResponse:
+        progress.report_progress("experts_done", answered=2)
+        # Tasks created by the extraction report to the same stream
+        await asyncio.create_task(asyncio.sleep(0, progress.report_progress("consolidation_done", local=True)))
+        return COAResponse.model_construct(request_id="request-1")
+
+    streamed_events = stream_progress(run)
+    assert [event for event, _ in streamed_events] == ["started", "experts_done", "consolidation_done", "result"]
+    assert streamed_events[1][1] == {"answered": 2}
+    assert streamed_events[-1][1]["request_id"] == "request-1"
+
+
+def test_failed_extraction_ends_with_an_error_event():
+    async def run() -> COAResponse:
+        raise HTTPException(status_code=413, detail="Too many pages")
+
+    assert stream_progress(run)[-1] == ("error", {"request_id": "request-1", "detail": "Too many pages"})
+
+
+def test_idle_stream_sends_keepalives(monkeypatch):
+    monkeypatch.setattr(events, "progress_heartbeat_seconds", 0.01)
+
+    async def run() -> COAResponse:
+        await asyncio.sleep(0.05)
+        return COAResponse.model_construct()
+
+    assert ("keepalive", None) in stream_progress(run)
+
+
+def test_closed_stream_cancels_the_extraction():
+    cancelled = asyncio.Event()
+
+    async def run() -> COAResponse:
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def read_started():
+        stream = events.stream_task_progress("request-1", run)
+        await anext(stream)
+        # The extraction is running
+        await asyncio.sleep(0.01)
+        await stream.aclose()
+        return cancelled.is_set()
+
+    assert asyncio.run(read_started())
+
+
+def test_progress_without_listener_is_a_no_op():
+    progress.report_progress("experts_done")
+    assert progress.get_progress_delta_reporter("expert_delta") is None
+
+
+def test_failing_listener_does_not_fail_the_extraction():
+    def listener(event: str, data: dict):
+        raise RuntimeError("client gone")
+
+    with progress.listen_progress(listener):
+        progress.report_progress("experts_done")
+
+
+def test_delta_reporter_streams_text(monkeypatch):
+    reported = []
+    monkeypatch.setattr(progress, "progress_stream_tokens", True)
+    with progress.listen_progress(lambda event, data: reported.append((event, data))):
+        report_delta = progress.get_progress_delta_reporter("expert_delta", expert="claude")
+        report_delta("Moisture")
+    assert reported == [("expert_delta", {"text": "Moisture", "expert": "claude"})]
+
+    monkeypatch.setattr(progress, "progress_stream_tokens", False)
+    with progress.listen_progress(lambda event, data: None):
+        assert progress.get_progress_delta_reporter("expert_delta") is None
@@ -0,0 +1,53 @@
+import hashlib
+
+import pytest
+
+from comprendo.caching.cache import ContentAddressedCache
+from comprendo.preprocess import caching
+from comprendo.types.image_artifact import ImageArtifact
+
+
+@pytest.fixture
+def raster_cache(tmp_path, monkeypatch):
+    raster_cache = ContentAddressedCache(str(tmp_path), max_size_bytes=1024 * 1024)
+    monkeypatch.setattr(caching, "raster_cache", raster_cache)
+    return raster_cache
+
+
+def create_pages() -> list[ImageArtifact]:
+    return [ImageArtifact(f"page {idx}".encode(), format="png", width=100, height=140, dpi=200) for idx in range(3)]
+
+
+def test_hash_document_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(caching, "hash_read_chunk_size", 3)
+    document_path = tmp_path / "coa.pdf"
+    document_path.write_bytes(b"%PDF-1.7 content")
+    assert caching.hash_document_file(document_path) == hashlib.sha256(b"%PDF-1.7 content").hexdigest()
+
+
+def test_pages_round_trip(raster_cache):
+    caching.store_cached_pdf_images("doc-hash", 200, "png", create_pages())
+    cached_pages = caching.load_cached_pdf_images("doc-hash", 200, "png")
+    assert [page.to_bytes() for page in cached_pages] == [page.to_bytes() for page in create_pages()]
+    assert all((page.width, page.height, page.dpi, page.format) == (100, 140, 200, "png") for page in cached_pages)
+
+
+def test_render_parameters_are_part_of_the_key(raster_cache):
+    caching.store_cached_pdf_images("doc-hash", 200, "png", create_pages())
+    assert caching.load_cached_pdf_images("doc-hash", 150, "png") == []
+    assert caching.load_cached_pdf_images("doc-hash", 200, "jpeg") == []
+    assert caching.load_cached_pdf_images("other-hash", 200, "png") == []
+
+
+def test_evicted_page_misses_the_document(raster_cache):
+    caching.store_cached_pdf_images("doc-hash", 200, "png", create_pages())
+    document_cache_key = caching.get_raster_cache_key("doc-hash", 200, "png")
+    raster_cache._get_content_path(caching.get_raster_page_cache_key(document_cache_key, 1)).unlink()
+    assert caching.load_cached_pdf_images("doc-hash", 200, "png") == []
+
+
+def test_disabled_cache(monkeypatch):
+    monkeypatch.setattr(caching, "raster_cache", None)
+    caching.store_cached_pdf_images("doc-hash", 200, "png", create_pages())
+    assert caching.load_cached_pdf_images("doc-hash", 200, "png") == []
+    assert caching.get_raster_cache_stats() == {}
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+
+from comprendo.preprocess import rasterize
+from comprendo.preprocess.rasterize import RasterizationEngine
+from comprendo.types.image_artifact import ImageArtifact
+
+
+def get_engine(**overrides) -> RasterizationEngine:
+    # Pool size 0 - jobs run on the loop default thread pool
+    engine_params = {"pool_size": 0, "queue_depth": 2, "pages_per_job": 2, "start_method": "fork"} | overrides
+    return RasterizationEngine(**engine_params, use_raster_cache=False)
+
+
+def test_jobs_bounded_by_queue_depth():
+    engine = get_engine(queue_depth=2)
+    running_jobs = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def job():
+        with lock:
+            running_jobs["now"] += 1
+            running_jobs["max"] = max(running_jobs["max"], running_jobs["now"])
+        time.sleep(0.02)
+        with lock:
+            running_jobs["now"] -= 1
+
+    async def run_jobs():
+        await asyncio.gather(*[engine.run_job(job) for _ in range(6)])
+
+    asyncio.run(run_jobs())
+    assert running_jobs["max"] == 2
+
+
+def test_queue_slots_rebound_to_new_loop():
+    engine = get_engine()
+    # Repeated asyncio.run calls (CLI / benchmarks) share the engine
+    assert asyncio.run(engine.run_job(sum, [1, 2])) == 3
+    assert asyncio.run(engine.run_job(sum, [3, 4])) == 7
+
+
+class BrokenExecutor(ThreadPoolExecutor):
+    def submit(self, fn, *args, **kwargs):
+        raise BrokenProcessPool("A worker died")
+
+
+def test_broken_pool_restarted_on_next_job(monkeypatch):
+    engine = get_engine(pool_size=1)
+    broken_executor = BrokenExecutor(max_workers=1)
+    engine._executor = broken_executor
+    monkeypatch.setattr(rasterize, "ProcessPoolExecutor", lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+
+    with pytest.raises(BrokenProcessPool):
+        asyncio.run(engine.run_job(sum, [1, 2]))
+    assert engine._executor is None
+
+    assert asyncio.run(engine.run_job(sum, [1, 2])) == 3
+    assert engine._executor is not broken_executor
+    engine.shutdown()
+
+
+def get_page_image(dpi: int) -> ImageArtifact:
+    return ImageArtifact(b"png", format="png", width=1, height=1, dpi=dpi)
+
+
+def test_page_list_merges_scans_and_renderings(monkeypatch):
+    rendered_ranges = []
+
+    def render_pdf_pages(document_location, first_page, last_page, dpi):
+        rendered_ranges.append((first_page, last_page))
+        return [get_page_image(dpi) for _ in range(first_page, last_page + 1)]
+
+    monkeypatch.setattr(rasterize, "render_pdf_pages", render_pdf_pages)
+    monkeypatch.setattr(
+        rasterize, "load_pdf_embedded_scans", lambda document_location, pages: {2: get_page_image(300)}
+    )
+
+    engine = get_engine(pages_per_job=2)
+    images = asyncio.run(engine.render_pdf_page_list(Path("coa.pdf"), [5, 1, 2, 3, 4], 200, use_embedded_scans=True))
+    assert [(image.page, image.dpi) for image in images] == [(1, 200), (2, 300), (3, 200), (4, 200), (5, 200)]
+    assert all(image.source == "coa.pdf" for image in images)
+    assert sorted(rendered_ranges) == [(1, 1), (3, 4), (5, 5)]
+
+
+def test_cached_document_images_get_source_and_spilled(monkeypatch):
+    monkeypatch.setattr(rasterize, "detect_file_type", lambda document_location: "application/pdf")
+    cached_images = [ImageArtifact(b"0" * 2048, format="png", width=1, height=1, dpi=200) for _ in range(2)]
+    monkeypatch.setattr(rasterize, "load_cached_pdf_images", lambda *args: cached_images)
+    monkeypatch.setattr(rasterize, "image_spill_min_kb", 1)
+
+    engine = RasterizationEngine(pool_size=0, queue_depth=1, pages_per_job=1, start_method="fork")
+    images = asyncio.run(engine.render_document(Path("coa.pdf"), document_hash="hash"))
+    assert [(image.source, image.page) for image in images] == [("coa.pdf", 1), ("coa.pdf", 2)]
+    assert all(image.is_spilled for image in images)
@@ -0,0 +1,194 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from comprendo.extraction import rate_limits
+from comprendo.extraction.rate_limits import LimitScope, LLMLimiter, TokenBucket
+from comprendo.telemetry import render_prometheus_metrics
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: str):
+        super().__init__("rate limited")
+        self.response = httpx.Response(429, headers={"retry-after": retry_after})
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+class FakeLLM:
+    def __init__(self, errors: list[Exception], model: str = "claude-test"):
+        self.config = {"model": model}
+        self.errors = errors
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return AIMessage(content="ok", usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15})
+
+
+class FakeStreamingLLM(FakeLLM):
+    def __init__(self, errors: list[Exception], fail_after_chunks: int):
+        super().__init__(errors)
+        self.fail_after_chunks = fail_after_chunks
+
+    async def astream(self, prompt):
+        self.calls += 1
+        for chunk_idx, text in enumerate(["Batch ", "results"]):
+            if self.errors and chunk_idx == self.fail_after_chunks:
+                raise self.errors.pop(0)
+            yield AIMessageChunk(content=text)
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = LLMLimiter({})
+    monkeypatch.setattr(rate_limits, "llm_limiter", limiter)
+    monkeypatch.setattr(rate_limits, "llm_transient_error_backoff_seconds", 0.01)
+    return limiter
+
+
+def test_token_bucket_waits_for_refill():
+    # 100 tokens per second
+    bucket = TokenBucket(6000)
+
+    async def acquire() -> float:
+        await bucket.acquire(6000)
+        start_time = time.monotonic()
+        await bucket.acquire(10)
+        return time.monotonic() - start_time
+
+    assert 0.05 < asyncio.run(acquire()) < 0.5
+
+
+def test_token_bucket_caps_amounts_at_capacity():
+    bucket = TokenBucket(60)
+    asyncio.run(bucket.acquire(1000))
+    assert bucket.available < 1
+
+
+def test_token_bucket_adjust_delays_next_callers():
+    bucket = TokenBucket(60)
+    bucket.adjust(100)
+    assert bucket.available < 0
+
+
+def test_limit_scope_primitives_follow_the_event_loop():
+    scope = LimitScope("anthropic", concurrency=1, rpm=6000)
+    running = []
+
+    async def call():
+        async with scope.slot(estimated_tokens=1):
+            running.append(1)
+            assert len(running) == 1
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def calls():
+        await asyncio.gather(call(), call(), call())
+
+    # A new loop per run - primitives bound to the previous loop must not be reused
+    asyncio.run(calls())
+    asyncio.run(calls())
+
+
+def test_limiter_scopes_per_provider_and_model():
+    limiter = LLMLimiter({"anthropic": {"concurrency": 2}, "anthropic/claude-test": {"tpm": 1000}})
+    provider_scope, model_scope = limiter.get_scopes("anthropic", "claude-test")
+    assert provider_scope.concurrency == 2 and provider_scope.tokens_bucket is None
+    assert model_scope.concurrency is None and model_scope.tokens_bucket.capacity == 1000
+
+
+def test_estimate_prompt_tokens_counts_text_and_images():
+    prompt = [
+        HumanMessage(
+            content=[
+                {"type": "text", "text": "x" * 400},
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64,"}},
+            ]
+        )
+    ]
+    assert rate_limits.estimate_prompt_tokens(prompt) == 100 + rate_limits.ESTIMATED_TOKENS_PER_IMAGE
+
+
+def test_limited_ainvoke_retries_rate_limits_after_retry_after(limiter):
+    llm = FakeLLM([RateLimitError(retry_after="0.05")])
+
+    async def invoke() -> float:
+        start_time = time.monotonic()
+        await rate_limits.limited_ainvoke(llm, [HumanMessage(content="hi")], stage="expert")
+        return time.monotonic() - start_time
+
+    assert asyncio.run(invoke()) >= 0.05
+    assert llm.calls == 2
+    # The whole provider waits, not just this caller
+    assert limiter.get_scope("anthropic").blocked_until > 0
+
+
+def test_limited_ainvoke_retries_transient_errors(limiter):
+    llm = FakeLLM([ServerError(), httpx.ConnectError("refused")])
+    response = asyncio.run(rate_limits.limited_ainvoke(llm, [HumanMessage(content="hi")], stage="expert"))
+    assert response.content == "ok"
+    assert llm.calls == 3
+    assert limiter.get_scope("anthropic").blocked_until == 0
+
+
+def test_limited_ainvoke_raises_other_errors_at_once(limiter):
+    llm = FakeLLM([BadRequestError()])
+    with pytest.raises(BadRequestError):
+        asyncio.run(rate_limits.limited_ainvoke(llm, [HumanMessage(content="hi")], stage="expert"))
+    assert llm.calls == 1
+
+
+def test_limited_ainvoke_gives_up_after_max_attempts(limiter):
+    llm = FakeLLM([ServerError(), ServerError(), ServerError()])
+    with pytest.raises(ServerError):
+        asyncio.run(rate_limits.limited_ainvoke(llm, [HumanMessage(content="hi")], stage="expert"))
+    assert llm.calls == rate_limits.llm_rate_limit_max_attempts
+
+
+def test_limited_ainvoke_retries_stream_failing_before_deltas(limiter):
+    llm = FakeStreamingLLM([ServerError()], fail_after_chunks=0)
+    deltas = []
+    response = asyncio.run(
+        rate_limits.limited_ainvoke(llm, [HumanMessage(content="hi")], stage="expert", on_delta=deltas.append)
+    )
+    assert response.content == "Batch results"
+    assert deltas == ["Batch ", "results"]
+    assert llm.calls == 2
+
+
+def test_limited_ainvoke_does_not_retry_stream_after_deltas(limiter):
+    llm = FakeStreamingLLM([ServerError()], fail_after_chunks=1)
+    deltas = []
+    with pytest.raises(ServerError):
+        asyncio.run(
+            rate_limits.limited_ainvoke(llm, [HumanMessage(content="hi")], stage="expert", on_delta=deltas.append)
+        )
+    # A retry would report "Batch " again
+    assert deltas == ["Batch "]
+    assert llm.calls == 1
+
+
+def test_limited_ainvoke_records_queue_wait_and_adjusts_tokens(monkeypatch):
+    limiter = LLMLimiter({"anthropic/claude-metrics": {"tpm": 6000}})
+    monkeypatch.setattr(rate_limits, "llm_limiter", limiter)
+    llm = FakeLLM([], model="claude-metrics")
+    asyncio.run(rate_limits.limited_ainvoke(llm, [HumanMessage(content="x" * 400)], stage="expert"))
+
+    # Estimated 100 tokens, used 15
+    assert limiter.get_scope("anthropic/claude-metrics").tokens_bucket.available > 6000 - 100
+    queue_wait_labels = 'stage="expert",provider="anthropic",model="claude-metrics"'
+    assert f"comprendo_model_queue_wait_seconds_count{{{queue_wait_labels}}} 1" in render_prometheus_metrics()
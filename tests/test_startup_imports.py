@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+# Provider SDKs are imported with their model clients, on first use
+PROVIDER_SDK_MODULES = [
+    "openai",
+    "langchain_openai",
+    "anthropic",
+    "langchain_anthropic",
+    "google.genai",
+    "langchain_google_genai",
+]
+
+
+def test_server_startup_does_not_import_provider_sdks():
+    # A fresh process, the app started with its lifespan - with the provider credentials of a deployment
+    code = (
+        "import sys\n"
+        "from fastapi.testclient import TestClient\n"
+        "from server import app\n"
+        "with TestClient(app) as client:\n"
+        "    client.get('/ping')\n"
+        f"    print(','.join(m for m in {PROVIDER_SDK_MODULES!r} if m in sys.modules))\n"
+    )
+    env = {**os.environ, "OPENAI_API_KEY": "test-key", "ANTHROPIC_API_KEY": "test-key"}
+    completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, env=env)
+    assert completed.stdout.strip() == ""
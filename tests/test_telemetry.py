@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from comprendo import telemetry
+from comprendo.telemetry import record_model_tokens, render_prometheus_metrics, stage_span
+
+
+def get_metric_lines(prefix: str) -> list[str]:
+    # Metrics are kept for the whole process - each test uses its own stage names
+    return [line for line in render_prometheus_metrics().splitlines() if line.startswith(prefix)]
+
+
+def test_stage_duration_histogram():
+    with stage_span("test_histogram", kind="pdf", model=None):
+        pass
+    with stage_span("test_histogram", kind="pdf"):
+        pass
+
+    labels = 'stage="test_histogram",kind="pdf",outcome="ok"'
+    assert f"comprendo_stage_duration_seconds_count{{{labels}}} 2" in get_metric_lines(
+        "comprendo_stage_duration_seconds_count"
+    )
+    bucket_lines = get_metric_lines(f"comprendo_stage_duration_seconds_bucket{{{labels}")
+    assert len(bucket_lines) == len(telemetry.metrics_duration_buckets) + 1
+    # Cumulative buckets - the last one holds all the samples
+    assert bucket_lines[-1] == f'comprendo_stage_duration_seconds_bucket{{{labels},le="+Inf"}} 2'
+    bucket_counts = [int(line.rsplit(" ", 1)[1]) for line in bucket_lines]
+    assert bucket_counts == sorted(bucket_counts)
+
+
+@pytest.mark.parametrize(
+    "error,outcome",
+    [(ValueError("failed"), "error"), (asyncio.CancelledError(), "cancelled")],
+)
+def test_stage_outcome_and_in_flight(error, outcome):
+    stage = f"test_{outcome}"
+    with pytest.raises(type(error)):
+        with stage_span(stage):
+            assert get_metric_lines(f'comprendo_stage_in_flight{{stage="{stage}"}}') == [
+                f'comprendo_stage_in_flight{{stage="{stage}"}} 1'
+            ]
+            raise error
+
+    assert get_metric_lines(f'comprendo_stage_in_flight{{stage="{stage}"}}') == [
+        f'comprendo_stage_in_flight{{stage="{stage}"}} 0'
+    ]
+    assert get_metric_lines(f'comprendo_stage_duration_seconds_count{{stage="{stage}",outcome="{outcome}"}}') == [
+        f'comprendo_stage_duration_seconds_count{{stage="{stage}",outcome="{outcome}"}} 1'
+    ]
+
+
+def test_model_tokens_counter():
+    message = AIMessage(
+        content="", usage_metadata={"input_tokens": 1200, "output_tokens": 300, "total_tokens": 1500}
+    )
+    record_model_tokens("test_tokens", "openai", "gpt-4o", {"raw": message, "parsed": None})
+    # No usage reported - nothing recorded
+    record_model_tokens("test_tokens", "openai", "gpt-4o", AIMessage(content=""))
+
+    labels = 'stage="test_tokens",provider="openai",model="gpt-4o"'
+    assert "# TYPE comprendo_model_tokens_total counter" in render_prometheus_metrics().splitlines()
+    assert sorted(get_metric_lines(f"comprendo_model_tokens_total{{{labels}")) == [
+        f'comprendo_model_tokens_total{{{labels},direction="input"}} 1200',
+        f'comprendo_model_tokens_total{{{labels},direction="output"}} 300',
+    ]
+
+
+def test_prometheus_label_escaping():
+    assert telemetry.format_prometheus_labels({"service.name": 'a "b"\\\n'}) == '{service_name="a \\"b\\"\\\\\\n"}'
+    assert telemetry.format_prometheus_labels({}) == ""
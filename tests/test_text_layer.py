@@ -0,0 +1,84 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from comprendo.preprocess import text_layer
+from comprendo.types.image_artifact import ImageArtifact
+from comprendo.types.text_artifact import TextArtifact
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "pages"
+COA_RESULTS_TEXT = (FIXTURES_DIR / "coa_results.txt").read_text()
+
+
+def test_generated_results_page_is_usable():
+    assert text_layer.is_usable_text_layer(COA_RESULTS_TEXT)
+
+
+@pytest.mark.parametrize(
+    "page_text",
+    [
+        "",
+        "Page 1 of 2",
+        # Unmapped glyphs of a broken font encoding
+        "(cid:12)(cid:34)(cid:56) " * 20,
+        "Moisture ��� " * 20,
+        # Garbled symbols
+        "#$@ !~^ &&| }{~ " * 20,
+    ],
+)
+def test_unusable_text_layers(page_text):
+    assert not text_layer.is_usable_text_layer(page_text)
+
+
+@pytest.fixture
+def pdf_pages(monkeypatch):
+    rendered = {"documents": [], "page_lists": []}
+
+    def use_text_pages(text_pages: list[str], mode: str = "text"):
+        monkeypatch.setattr(text_layer, "preprocess_mode", mode)
+        monkeypatch.setattr(text_layer, "get_pdf_text_pages", lambda document_location: text_pages)
+
+    async def render_document(document_location, document_hash=None):
+        rendered["documents"].append(document_location)
+        return []
+
+    async def render_pdf_page_list(document_location, pages, dpi, use_embedded_scans=False):
+        rendered["page_lists"].append((pages, dpi, use_embedded_scans))
+        images = [ImageArtifact(b"png", format="png", width=1, height=1, dpi=dpi) for _ in pages]
+        for page, image in zip(pages, images):
+            image.source, image.page = str(document_location), page
+        return images
+
+    monkeypatch.setattr(text_layer.rasterization_engine, "render_document", render_document)
+    monkeypatch.setattr(text_layer.rasterization_engine, "render_pdf_page_list", render_pdf_page_list)
+    return use_text_pages, rendered
+
+
+def load_artifacts() -> list:
+    return asyncio.run(text_layer.load_pdf_artifacts(Path("coa.pdf")))
+
+
+def describe_artifacts(artifacts) -> list[tuple[str, int]]:
+    return [("text" if isinstance(a, TextArtifact) else f"image@{a.dpi}", a.page) for a in artifacts]
+
+
+def test_text_pages_replace_images_in_page_order(pdf_pages):
+    use_text_pages, rendered = pdf_pages
+    use_text_pages([COA_RESULTS_TEXT, "", COA_RESULTS_TEXT])
+    assert describe_artifacts(load_artifacts()) == [("text", 1), ("image@200", 2), ("text", 3)]
+    # The page without text is looked up as an embedded scan first
+    assert rendered["page_lists"][0] == ([2], text_layer.rasterize_dpi, True)
+
+
+def test_text_image_mode_adds_low_resolution_images(pdf_pages):
+    use_text_pages, _ = pdf_pages
+    use_text_pages([COA_RESULTS_TEXT], mode="text_image")
+    assert describe_artifacts(load_artifacts()) == [("text", 1), (f"image@{text_layer.text_layer_image_dpi}", 1)]
+
+
+def test_document_without_text_layer_is_rendered(pdf_pages):
+    use_text_pages, rendered = pdf_pages
+    use_text_pages(["", ""])
+    assert load_artifacts() == []
+    assert rendered["documents"] == [Path("coa.pdf")]
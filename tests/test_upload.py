@@ -0,0 +1,47 @@
+import asyncio
+import hashlib
+from io import BytesIO
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from pdf2image.exceptions import PDFPageCountError
+
+from comprendo.server import upload
+
+
+def create_upload_file(content: bytes, filename: str) -> UploadFile:
+    return UploadFile(file=BytesIO(content), filename=filename)
+
+
+def test_store_upload_file_copies_and_hashes(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "upload_chunk_size", 4)
+    content = b"Certificate of analysis\n" * 10
+    stored_document = asyncio.run(upload.store_upload_file(create_upload_file(content, "coa.txt"), tmp_path, 1024))
+    assert stored_document.path.read_bytes() == content
+    assert stored_document.sha256 == hashlib.sha256(content).hexdigest()
+    assert stored_document.size == len(content)
+    assert stored_document.page_count == 1
+
+
+def test_store_upload_file_rejects_oversized_uploads(tmp_path):
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(upload.store_upload_file(create_upload_file(b"x" * 100, "coa.txt"), tmp_path, 10))
+    assert exc_info.value.status_code == 413
+
+
+def test_store_upload_file_rejects_unreadable_pdfs(tmp_path, monkeypatch):
+    def get_pdf_page_count(document_location):
+        raise PDFPageCountError("Unable to get page count. Command Line Error: Incorrect password")
+
+    monkeypatch.setattr(upload, "get_pdf_page_count", get_pdf_page_count)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(upload.store_upload_file(create_upload_file(b"%PDF-1.7\n%broken", "coa.pdf"), tmp_path, 1024))
+    assert exc_info.value.status_code == 422
+
+
+def test_store_upload_files_limits_request_pages(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload, "upload_max_request_pages", 1)
+    files = [create_upload_file(b"first", "first.txt"), create_upload_file(b"second", "second.txt")]
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(upload.store_upload_files(files, tmp_path))
+    assert exc_info.value.status_code == 413